@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Время core.analytics.timeseries за год по всем привычкам
+для построчного хранения и битовых карт.
+
+Запуск:
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --habits 100000 --storage bitmap
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from core import analytics
+from core.database import Database
+from core.storage import STORAGE_BITMAP, STORAGE_ROWS, YEAR_BYTES
+
+
+def populate(db: Database, habits_count: int, year: int):
+    """Случайные выполнения (примерно 2 дня из 3) за год year"""
+    rng = np.random.default_rng(1)
+    days = (datetime.date(year, 12, 31) - datetime.date(year, 1, 1)).days + 1
+    start = datetime.date(year, 1, 1).toordinal()
+    with db.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, '', 365, ?, 'active')",
+            ((i, f"Привычка {i}", f"{year}-01-01") for i in range(1, habits_count + 1))
+        )
+        for first in range(1, habits_count + 1, 10000):
+            ids = range(first, min(first + 10000, habits_count + 1))
+            matrix = rng.random((len(ids), YEAR_BYTES * 8)) < 2 / 3
+            matrix[:, days:] = False
+            if db.storage == STORAGE_BITMAP:
+                bits = np.packbits(matrix, axis=1, bitorder="little")
+                conn.executemany(
+                    "INSERT INTO completion_bitmaps (habit_id, year, bits) VALUES (?, ?, ?)",
+                    ((habit_id, year, row.tobytes()) for habit_id, row in zip(ids, bits))
+                )
+            else:
+                habit_index, day_index = np.nonzero(matrix)
+                conn.executemany(
+                    "INSERT INTO completions (habit_id, date) VALUES (?, ?)",
+                    ((ids[h], datetime.date.fromordinal(start + d).isoformat())
+                     for h, d in zip(habit_index.tolist(), day_index.tolist()))
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=100000)
+    parser.add_argument('--storage', choices=[STORAGE_ROWS, STORAGE_BITMAP], nargs='+',
+                        default=[STORAGE_BITMAP, STORAGE_ROWS])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    year = datetime.date.today().year - 1
+    start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+
+    for storage in args.storage:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "bench.db"), storage=storage)
+            prepare_start = time.perf_counter()
+            populate(db, args.habits, year)
+            print(f"{storage}: {args.habits} привычек, подготовка "
+                  f"{time.perf_counter() - prepare_start:.1f} с")
+
+            for bucket in analytics.BUCKETS:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    began = time.perf_counter()
+                    result = analytics.timeseries(db, start, end, bucket)
+                    best = min(best, time.perf_counter() - began)
+                print(f"  {bucket:<6} {len(result['series']):>4} интервалов, "
+                      f"{result['total']} выполнений: {best * 1000:8.1f} мс")
+
+            ids = list(range(1, args.habits + 1, 100))
+            began = time.perf_counter()
+            analytics.timeseries(db, start, end, "week", habit_ids=ids)
+            print(f"  week, {len(ids)} выбранных привычек: "
+                  f"{(time.perf_counter() - began) * 1000:8.1f} мс")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
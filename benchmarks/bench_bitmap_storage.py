@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Сравнение хранения выполнений строками (rows) и битовыми картами (bitmap):
+размер файла БД, время перевода и основных операций.
+
+Запуск:
+    python benchmarks/bench_bitmap_storage.py
+    python benchmarks/bench_bitmap_storage.py --habits 5000 --years 10
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import Database
+from core.storage import STORAGE_BITMAP, STORAGE_ROWS
+
+
+def populate(db: Database, habits_count: int, days: int):
+    """Заполняет БД через хранилище: каждая привычка выполнялась 2 дня из 3"""
+    today = datetime.date.today().toordinal()
+    ordinals = [today - d for d in range(days) if d % 3]
+    with db.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, '', 365, ?, 'active')",
+            ((i, f"Привычка {i}", datetime.date.today().isoformat())
+             for i in range(1, habits_count + 1))
+        )
+        for habit_id in range(1, habits_count + 1):
+            db.store.add(conn, habit_id, ordinals)
+    db.recompute_aggregates()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def report(db: Database, habits_count: int):
+    size = os.path.getsize(db.db_path)
+    _, load_time = timed(db.load_habits)
+    _, page_time = timed(lambda: db.load_habits(limit=100))
+    _, stats_time = timed(db.get_summary_stats)
+    _, habit_stats_time = timed(db.get_stats_for, range(1, min(habits_count, 100) + 1))
+
+    today = datetime.date.today()
+    start = time.perf_counter()
+    for habit_id in range(1, min(habits_count, 1000) + 1):
+        db.remove_completion(habit_id, today)
+        db.add_completion(habit_id, today)
+    toggle_time = (time.perf_counter() - start) / min(habits_count, 1000) / 2
+
+    print(f"  размер БД:                   {size / 1024 / 1024:8.2f} МиБ")
+    print(f"  load_habits (все):           {load_time:8.3f} с")
+    print(f"  load_habits (100):           {page_time * 1000:8.2f} мс")
+    print(f"  get_summary_stats:           {stats_time * 1000:8.2f} мс")
+    print(f"  get_stats_for (100 привычек): {habit_stats_time * 1000:7.2f} мс")
+    print(f"  add/remove_completion:       {toggle_time * 1e6:8.1f} мкс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+    days = args.years * 365
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"), storage=STORAGE_ROWS)
+        populate(db, args.habits, days)
+        with db.pool.connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        total = db.get_summary_stats()["total_completions"]
+        print(f"Привычек: {args.habits}, лет истории: {args.years}, выполнений: {total}\n")
+
+        print("rows:")
+        report(db, args.habits)
+
+        moved, convert_time = timed(db.convert_storage, STORAGE_BITMAP)
+        print(f"\nПеревод rows -> bitmap: {moved} выполнений за {convert_time:.2f} с\n")
+
+        print("bitmap:")
+        report(db, args.habits)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
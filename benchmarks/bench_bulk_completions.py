@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Пакетная отметка выполнений Database.add_completions против отметки
+по одной (add_completion): выполнений в секунду для каждого хранилища.
+
+Запуск:
+    python benchmarks/bench_bulk_completions.py
+    python benchmarks/bench_bulk_completions.py --habits 1000 --days 100 --batch 10000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import Database
+from core.models import Habit
+from core.storage import STORAGE_BITMAP, STORAGE_ROWS
+
+
+def run(storage: str, habits_count: int, days: int, batch: int, single: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"), storage=storage)
+        ids = [db.save_habit(Habit(name=f"Привычка {i}")) for i in range(habits_count)]
+        today = datetime.date.today()
+        # Синхронизация с устройства: по дню на все привычки, от старых дат к новым
+        pairs = [(habit_id, today - datetime.timedelta(days=day))
+                 for day in range(days - 1, -1, -1) for habit_id in ids]
+
+        start = time.perf_counter()
+        for offset in range(0, len(pairs), batch):
+            db.add_completions(pairs[offset:offset + batch])
+        bulk_time = time.perf_counter() - start
+
+        # Повтор тех же пар: все дубликаты
+        start = time.perf_counter()
+        for offset in range(0, len(pairs), batch):
+            db.add_completions(pairs[offset:offset + batch])
+        duplicate_time = time.perf_counter() - start
+
+        sample = [(habit_id, date - datetime.timedelta(days=days)) for habit_id, date in pairs[:single]]
+        start = time.perf_counter()
+        for habit_id, date in sample:
+            db.add_completion(habit_id, date)
+        single_time = time.perf_counter() - start
+        db.close()
+
+    print(f"{storage}:")
+    print(f"  add_completions, новые:     {len(pairs) / bulk_time:10.0f} в секунду")
+    print(f"  add_completions, дубликаты: {len(pairs) / duplicate_time:10.0f} в секунду")
+    print(f"  add_completion по одной:    {single / single_time:10.0f} в секунду")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=500)
+    parser.add_argument('--days', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--single', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"Привычек: {args.habits}, дней: {args.days}, пар: {args.habits * args.days}, "
+          f"пар в запросе: {args.batch}\n")
+    for storage in (STORAGE_ROWS, STORAGE_BITMAP):
+        run(storage, args.habits, args.days, args.batch, args.single)
+
+
+if __name__ == "__main__":
+    main()
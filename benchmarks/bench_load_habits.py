@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк Database.load_habits: число SQL-запросов и время загрузки
+до (запрос выполнений на каждую привычку) и после (один проход по completions).
+
+Запуск:
+    python benchmarks/bench_load_habits.py
+    python benchmarks/bench_load_habits.py --sizes 1000 10000 --completions 30
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import Database
+from core.models import Habit, HabitStatus
+
+
+class QueryCounter:
+    """Подсчитывает SQL-запросы всех соединений через trace callback"""
+
+    def __init__(self):
+        self.count = 0
+        self._connect = sqlite3.connect
+
+    def __enter__(self):
+        def connect(*args, **kwargs):
+            conn = self._connect(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+        sqlite3.connect = connect
+        return self
+
+    def __exit__(self, *exc):
+        sqlite3.connect = self._connect
+
+    def _trace(self, statement: str):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.count += 1
+
+
+def load_habits_n_plus_one(db_path: str):
+    """Прежняя реализация load_habits: отдельный запрос на каждую привычку"""
+    habits = []
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM habits ORDER BY id")
+        for row in cursor.fetchall():
+            cursor.execute(
+                "SELECT date FROM completions WHERE habit_id=? ORDER BY date",
+                (row['id'],)
+            )
+            completions = [
+                datetime.date.fromisoformat(date_row[0])
+                for date_row in cursor.fetchall()
+            ]
+            habits.append(Habit(
+                id=row['id'],
+                name=row['name'],
+                description=row['description'] or "",
+                target_days=row['target_days'],
+                creation_date=datetime.date.fromisoformat(row['creation_date']),
+                status=HabitStatus(row['status']),
+                completions=completions
+            ))
+    return habits
+
+
+def populate(db_path: str, habits_count: int, completions_per_habit: int):
+    """Заполняет БД напрямую, минуя save_habit, чтобы подготовка была быстрой"""
+    today = datetime.date.today()
+    dates = [
+        (today - datetime.timedelta(days=i)).isoformat()
+        for i in range(completions_per_habit)
+    ]
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, '', 30, ?, 'active')",
+            ((i, f"Привычка {i}", today.isoformat()) for i in range(1, habits_count + 1))
+        )
+        conn.executemany(
+            "INSERT INTO completions (habit_id, date) VALUES (?, ?)",
+            ((i, d) for i in range(1, habits_count + 1) for d in dates)
+        )
+
+
+def measure(counter: QueryCounter, func, *args):
+    counter.count = 0
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    return len(result), counter.count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--completions', type=int, default=10,
+                        help='Выполнений на одну привычку')
+    args = parser.parse_args()
+
+    print(f"{'habits':>8} | {'variant':<12} | {'queries':>8} | {'time, s':>8}")
+    print("-" * 46)
+    # Счетчик ставится до создания Database, чтобы попасть в соединения пула
+    with QueryCounter() as counter:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, "bench.db")
+                db = Database(db_path)
+                populate(db_path, size, args.completions)
+
+                for name, func, arg in (
+                    ("n+1 (до)", load_habits_n_plus_one, db_path),
+                    ("bulk (после)", lambda _: db.load_habits(), None),
+                ):
+                    loaded, queries, elapsed = measure(counter, func, arg)
+                    assert loaded == size
+                    print(f"{size:>8} | {name:<12} | {queries:>8} | {elapsed:>8.3f}")
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки Habit: mark_completed, get_streak и to_dict
+для прежней модели (список дат) и CompletionSet.
+
+Запуск:
+    python benchmarks/bench_models.py
+    python benchmarks/bench_models.py --completions 10000 --repeat 20
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.models import Habit
+
+
+@dataclass
+class ListHabit:
+    """Прежняя реализация: выполнения в обычном списке"""
+    target_days: int = 7
+    completions: List[datetime.date] = field(default_factory=list)
+
+    def mark_completed(self, date: Optional[datetime.date] = None) -> bool:
+        if date is None:
+            date = datetime.date.today()
+        if date not in self.completions:
+            self.completions.append(date)
+            return True
+        return False
+
+    def get_completion_rate(self) -> float:
+        if self.target_days == 0:
+            return 0.0
+        return min(len(self.completions) / self.target_days, 1.0)
+
+    def get_streak(self) -> int:
+        if not self.completions:
+            return 0
+        dates = sorted(self.completions, reverse=True)
+        streak = 0
+        current_date = datetime.date.today()
+        for i in range(len(dates)):
+            if dates[i] == current_date - datetime.timedelta(days=i):
+                streak += 1
+            else:
+                break
+        return streak
+
+    def to_dict(self) -> dict:
+        return {
+            "completions": [d.isoformat() for d in self.completions],
+            "completion_rate": self.get_completion_rate(),
+            "streak": self.get_streak()
+        }
+
+
+def run(label: str, stmt, repeat: int, number: int) -> float:
+    best = min(timeit.repeat(stmt, repeat=repeat, number=number)) / number
+    print(f"  {label:<38} {best * 1e6:>12.1f} мкс")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--completions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    # Через день, чтобы после сегодняшней отметки серия была 1
+    dates = [today - datetime.timedelta(days=2 * i + 1) for i in range(args.completions)]
+    # Ровно по дням до сегодня включительно: длинная текущая серия
+    streak_dates = [today - datetime.timedelta(days=i) for i in range(args.completions)]
+    probe = today - datetime.timedelta(days=args.completions)
+
+    print(f"Выполнений: {args.completions}")
+    for name, factory in (("list", lambda d: ListHabit(completions=list(d))),
+                          ("CompletionSet", lambda d: Habit(completions=list(d)))):
+        print(f"{name}:")
+        habit = factory(reversed(dates))
+        run("mark_completed (уже отмечено)", lambda: habit.mark_completed(probe),
+            args.repeat, 200)
+        # Вставка дат в промежутки существующей истории
+        gaps = [today - datetime.timedelta(days=2 * i + 2) for i in range(1000)]
+        target = factory(reversed(dates))
+        start = timeit.default_timer()
+        for date in gaps:
+            target.mark_completed(date)
+        per_call = (timeit.default_timer() - start) / len(gaps)
+        print(f"  {'mark_completed (новая дата)':<38} {per_call * 1e6:>12.1f} мкс")
+        streak_habit = factory(streak_dates)
+        run("get_streak (серия = все выполнения)", streak_habit.get_streak, args.repeat, 20)
+        run("get_streak (серия = 0)", habit.get_streak, args.repeat, 20)
+        run("to_dict", habit.to_dict, args.repeat, 20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Время построения графика прогресса: новая фигура на каждый вызов
+и постоянная фигура с обновлением данных (HabitPlotter(persistent=True)).
+
+Запуск:
+    python benchmarks/bench_plotter.py
+    python benchmarks/bench_plotter.py --completions 5000 --repeat 50
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from core.models import CompletionSet, Habit
+from core.plotter import HabitPlotter
+
+
+def measure(plotter: HabitPlotter, habits: list) -> float:
+    start = time.perf_counter()
+    for habit in habits:
+        fig = plotter.plot_habit_progress(habit)
+        if not isinstance(fig.canvas, FigureCanvasAgg):
+            FigureCanvasAgg(fig)
+        fig.canvas.draw()
+    return (time.perf_counter() - start) / len(habits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--completions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    today = datetime.date.today().toordinal()
+    habits = [
+        Habit(name=f"Привычка {i}", target_days=365,
+              completions=CompletionSet.from_ordinals(range(today - args.completions - i, today - i)))
+        for i in range(args.repeat)
+    ]
+
+    # Первый график загружает шрифты, его в замеры не включаем
+    measure(HabitPlotter(), habits[:1])
+
+    print(f"Выполнений на привычку: {args.completions}, графиков: {args.repeat}")
+    for label, plotter in (("новая фигура", HabitPlotter()),
+                           ("постоянная фигура", HabitPlotter(persistent=True)),
+                           ("без прореживания", HabitPlotter(max_points=10 ** 9))):
+        print(f"  {label:<20} {measure(plotter, habits) * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк планов запросов до и после миграции 2 (индексы и completions WITHOUT ROWID).
+
+Для каждого запроса печатается EXPLAIN QUERY PLAN и среднее время выполнения
+на схеме версии 1 и на последней версии схемы.
+
+Запуск:
+    python benchmarks/bench_query_plans.py
+    python benchmarks/bench_query_plans.py --habits 20000 --days 365
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.migrations import LATEST_VERSION, migrate
+
+TODAY = datetime.date.today()
+
+QUERIES = [
+    ("выполнения за дату",
+     "SELECT habit_id FROM completions WHERE date = ?",
+     (TODAY.isoformat(),)),
+    ("число выполнений за диапазон дат",
+     "SELECT COUNT(*) FROM completions WHERE date BETWEEN ? AND ?",
+     ((TODAY - datetime.timedelta(days=7)).isoformat(), TODAY.isoformat())),
+    ("активные привычки",
+     "SELECT id FROM habits WHERE status = 'active' ORDER BY id",
+     ()),
+    ("история одной привычки",
+     "SELECT date FROM completions WHERE habit_id = ? ORDER BY date",
+     (1,)),
+]
+
+
+def populate(conn: sqlite3.Connection, habits_count: int, days: int):
+    statuses = ("active", "completed", "archived")
+    conn.executemany(
+        "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+        "VALUES (?, ?, '', 30, ?, ?)",
+        ((i, f"Привычка {i}", TODAY.isoformat(), statuses[i % 3])
+         for i in range(1, habits_count + 1))
+    )
+    # Каждая привычка выполняется через день со своим сдвигом
+    conn.executemany(
+        "INSERT INTO completions (habit_id, date) VALUES (?, ?)",
+        ((i, (TODAY - datetime.timedelta(days=d)).isoformat())
+         for i in range(1, habits_count + 1)
+         for d in range(i % 2, days, 2))
+    )
+    conn.commit()
+
+
+def report(conn: sqlite3.Connection, repeat: int):
+    for title, sql, params in QUERIES:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"  {title}: {elapsed * 1000:.2f} мс")
+        for step in plan:
+            print(f"      {step}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        migrate(conn, target_version=1)
+        populate(conn, args.habits, args.days)
+
+        print("Схема версии 1:")
+        report(conn, args.repeat)
+
+        start = time.perf_counter()
+        migrate(conn)
+        print(f"\nМиграция до версии {LATEST_VERSION}: {time.perf_counter() - start:.2f} с")
+        conn.execute("ANALYZE")
+
+        print(f"\nСхема версии {LATEST_VERSION}:")
+        report(conn, args.repeat)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
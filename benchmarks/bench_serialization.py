@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Ответ /api/habits для 1000 привычек с годом выполнений: время сериализации
+(проверка моделью pydantic + json против orjson без проверки) и объем
+ответа без сжатия, с gzip и с Brotli (если установлен пакет brotli).
+
+Запуск:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --habits 5000 --days 730
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from core.database import Database
+from web import compression
+from web.serialization import orjson
+
+
+def populate(db: Database, habits_count: int, days: int):
+    """Каждая привычка выполнялась через день последние days дней"""
+    today = datetime.date.today().toordinal()
+    ordinals = list(range(today - days + 1, today + 1, 2))
+    with db.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, 'Описание привычки', 365, ?, 'active')",
+            ((i, f"Привычка {i}", datetime.date.today().isoformat())
+             for i in range(1, habits_count + 1))
+        )
+        db.store.bulk_insert(conn, ((i, ordinals) for i in range(1, habits_count + 1)))
+    db.recompute_aggregates()
+
+
+def best_of(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def serialization(rows: list, repeat: int):
+    """Пути ответа FastAPI: (название, секунды, байт)"""
+    from web.main import HabitListItem
+    adapter = TypeAdapter(List[HabitListItem])
+
+    def validated_json():
+        # response_model + JSONResponse: проверка, дамп моделей, json.dumps
+        content = adapter.dump_python(adapter.validate_python(rows), mode="json", exclude_unset=True)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    paths = [("response_model + json", validated_json)]
+    if orjson is not None:
+        paths.append(("jsonable_encoder + orjson", lambda: orjson.dumps(jsonable_encoder(rows))))
+        paths.append(("orjson без проверки", lambda: orjson.dumps(rows)))
+    return [(name, best_of(func, repeat), len(func())) for name, func in paths]
+
+
+def encodings(body: bytes, repeat: int):
+    """Объем после сжатия: (кодировка, секунды, байт)"""
+    encoders = [("gzip 1", lambda: compression.GzipEncoder(1)),
+                (f"gzip {compression.GZIP_LEVEL}", compression.GzipEncoder),
+                ("gzip 9", lambda: compression.GzipEncoder(9))]
+    if compression.brotli is not None:
+        encoders += [(f"br {compression.BROTLI_QUALITY}", compression.BrotliEncoder),
+                     ("br 11", lambda: compression.BrotliEncoder(11))]
+    results = [("identity", 0.0, len(body))]
+    for name, make in encoders:
+        seconds = best_of(lambda: make().compress(body, final=True), repeat)
+        results.append((name, seconds, len(make().compress(body, final=True))))
+    return results
+
+
+async def request(app, accept_encoding: str):
+    """GET /api/habits напрямую через ASGI: (секунды, байт на проводе, Content-Encoding)"""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/habits", "raw_path": b"/api/habits", "root_path": "",
+        "query_string": b"", "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    size = 0
+    encoding = "identity"
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size, encoding
+        if message["type"] == "http.response.start":
+            headers = dict(message["headers"])
+            encoding = headers.get(b"content-encoding", b"identity").decode()
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - start, size, encoding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from web.main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        populate(db, args.habits, args.days)
+        rows = [habit.to_dict() for habit in db.load_habits()]
+        print(f"{args.habits} привычек, {args.days // 2 + 1} выполнений у каждой\n")
+
+        print(f"{'сериализация':<28} {'мс':>8} {'МиБ':>8}")
+        for name, seconds, size in serialization(rows, args.repeat):
+            print(f"{name:<28} {seconds * 1000:>8.1f} {size / 2**20:>8.2f}")
+
+        body = orjson.dumps(rows) if orjson is not None else json.dumps(rows).encode()
+        print(f"\n{'сжатие':<28} {'мс':>8} {'КиБ':>8} {'доля':>6}")
+        for name, seconds, size in encodings(body, args.repeat):
+            print(f"{name:<28} {seconds * 1000:>8.1f} {size / 1024:>8.1f} {size / len(body):>6.1%}")
+
+        app.state.db = db
+        print(f"\n{'GET /api/habits, Accept-Encoding':<34} {'мс':>8} {'КиБ':>8}")
+        for accept in ("identity", "gzip", "br, gzip"):
+            seconds = min(asyncio.run(request(app, accept))[0] for _ in range(args.repeat))
+            _, size, encoding = asyncio.run(request(app, accept))
+            print(f"{accept + ' -> ' + encoding:<34} {seconds * 1000:>8.1f} {size / 1024:>8.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Список привычек /api/habits целиком и потоком (stream=ndjson): время
+до первого байта, общее время и пик памяти Python (tracemalloc).
+
+Запуск:
+    python benchmarks/bench_streaming.py
+    python benchmarks/bench_streaming.py --sizes 1000 10000 50000 --days 60
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import Database
+
+
+def populate(db: Database, habits_count: int, days: int):
+    """Каждая привычка выполнялась каждый день последние days дней"""
+    today = datetime.date.today().toordinal()
+    ordinals = list(range(today - days + 1, today + 1))
+    with db.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, '', 30, ?, 'active')",
+            ((i, f"Привычка {i}", datetime.date.today().isoformat())
+             for i in range(1, habits_count + 1))
+        )
+        db.store.bulk_insert(conn, ((i, ordinals) for i in range(1, habits_count + 1)))
+    db.recompute_aggregates()
+
+
+async def request(app, query: str):
+    """Вызов ASGI-приложения напрямую: (время до первого байта, общее время, байт)"""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/habits", "raw_path": b"/api/habits", "root_path": "",
+        "query_string": query.encode(), "headers": [], "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    first_byte = None
+    size = 0
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        # Тело запроса пустое; дальше клиент "не отключается" до конца ответа
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            if first_byte is None:
+                first_byte = time.perf_counter()
+            size += len(message["body"])
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return first_byte - start, time.perf_counter() - start, size
+
+
+def measure(app, query: str):
+    tracemalloc.start()
+    ttfb, total, size = asyncio.run(request(app, query))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ttfb, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    from web.main import app
+
+    print(f"{'привычек':>9} {'режим':>8} {'TTFB, мс':>9} {'всего, с':>9} {'МиБ ответа':>11} {'пик, МиБ':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "bench.db"))
+            populate(db, size, args.days)
+            app.state.db = db
+            for mode, query in (("list", ""), ("ndjson", "stream=ndjson"), ("json", "stream=json")):
+                ttfb, total, length, peak = measure(app, query)
+                print(f"{size:>9} {mode:>8} {ttfb * 1000:>9.1f} {total:>9.2f} "
+                      f"{length / 2**20:>11.1f} {peak / 2**20:>9.1f}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест API: N параллельных клиентов, перцентили задержки и RPS.
+
+Без --url поднимает uvicorn с web.main:app в этом же процессе на временной
+БД с тестовыми данными. Чтобы сравнить "до" и "после", запустите скрипт
+на соответствующих коммитах.
+
+Запуск:
+    python benchmarks/load_test_api.py
+    python benchmarks/load_test_api.py --clients 200 --requests 20 --habits 2000
+    python benchmarks/load_test_api.py --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+PATHS = ["/api/stats", "/api/habits/{id}", "/health"]
+
+
+def seed(db_path: str, habits_count: int, days: int):
+    today = datetime.date.today()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO habits (id, name, description, target_days, creation_date, status) "
+            "VALUES (?, ?, '', 30, ?, 'active')",
+            ((i, f"Привычка {i}", today.isoformat()) for i in range(1, habits_count + 1))
+        )
+        conn.executemany(
+            "INSERT INTO completions (habit_id, date) VALUES (?, ?)",
+            ((i, (today - datetime.timedelta(days=d)).isoformat())
+             for i in range(1, habits_count + 1) for d in range(days))
+        )
+
+
+def start_server(habits_count: int, days: int) -> str:
+    import uvicorn
+    from core.database import Database
+    from web.main import app
+
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "load.db")
+    app.state.db = Database(db_path)
+    seed(db_path, habits_count, days)
+    app.state.db.recompute_aggregates()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def client_worker(client: httpx.AsyncClient, worker: int, requests: int,
+                        habits_count: int, latencies: list, errors: list):
+    for i in range(requests):
+        path = PATHS[(worker + i) % len(PATHS)].format(id=(worker * requests + i) % habits_count + 1)
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_load(url: str, clients: int, requests: int, habits_count: int):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_worker(client, worker, requests, habits_count, latencies, errors)
+            for worker in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Адрес уже запущенного сервера')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=10, help='Запросов на клиента')
+    parser.add_argument('--habits', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    url = args.url or start_server(args.habits, args.days)
+    latencies, errors, elapsed = asyncio.run(
+        run_load(url, args.clients, args.requests, args.habits)
+    )
+
+    print(f"Клиентов: {args.clients}, запросов: {len(latencies)}, ошибок: {len(errors)}")
+    print(f"RPS: {len(latencies) / elapsed:.1f}")
+    print(f"p50: {percentile(latencies, 50) * 1000:.1f} мс")
+    print(f"p95: {percentile(latencies, 95) * 1000:.1f} мс")
+    print(f"p99: {percentile(latencies, 99) * 1000:.1f} мс")
+    print(f"mean: {statistics.mean(latencies) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
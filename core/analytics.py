@@ -0,0 +1,232 @@
+"""
+Аналитика выполнений по диапазону дат на NumPy.
+
+Выполнения выбираются из хранилища как номера дней (date.toordinal()),
+складываются в массив счетчиков по дням, а затем группируются
+в недели или месяцы через np.searchsorted + np.bincount.
+Для тепловых карт строится плотная булева матрица привычки x дни.
+"""
+import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.database import MAX_QUERY_PARAMS, Database
+from core.storage import STORAGE_BITMAP, STORAGE_ROWS, YEAR_BYTES
+
+BUCKETS = ("day", "week", "month")
+
+# julianday(date) - JULIAN_OFFSET == date.toordinal()
+JULIAN_OFFSET = 1721424.5
+
+def _id_filters(habit_ids: Optional[List[int]], column: str = "habit_id") -> List[Tuple[str, list]]:
+    """Условие по id привычки и его параметры, по MAX_QUERY_PARAMS id на запрос"""
+    if habit_ids is None:
+        return [("", [])]
+    return [
+        (f" AND {column} IN ({', '.join('?' * len(chunk))})", chunk)
+        for chunk in (habit_ids[i:i + MAX_QUERY_PARAMS]
+                      for i in range(0, len(habit_ids), MAX_QUERY_PARAMS))
+    ]
+
+def _day_counts_rows(conn, start: int, end: int, habit_ids: Optional[List[int]]) -> np.ndarray:
+    counts = np.zeros(end - start + 1, dtype=np.int64)
+    first = datetime.date.fromordinal(start).isoformat()
+    last = datetime.date.fromordinal(end).isoformat()
+    for condition, params in _id_filters(habit_ids):
+        # Группировка по дате идет по индексу idx_completions_date
+        rows = conn.execute(
+            f"SELECT CAST(julianday(date) - {JULIAN_OFFSET} AS INTEGER), COUNT(*) "
+            f"FROM completions WHERE date BETWEEN ? AND ?{condition} GROUP BY date",
+            [first, last, *params]
+        ).fetchall()
+        if rows:
+            days = np.array(rows, dtype=np.int64)
+            counts += np.bincount(days[:, 0] - start, weights=days[:, 1],
+                                  minlength=len(counts)).astype(np.int64)
+    return counts
+
+def _day_counts_bitmap(conn, start: int, end: int, habit_ids: Optional[List[int]]) -> np.ndarray:
+    counts = np.zeros(end - start + 1, dtype=np.int64)
+    first_year = datetime.date.fromordinal(start).year
+    last_year = datetime.date.fromordinal(end).year
+    for condition, params in _id_filters(habit_ids):
+        for year in range(first_year, last_year + 1):
+            blobs = [bits for bits, in conn.execute(
+                f"SELECT bits FROM completion_bitmaps WHERE year = ?{condition}",
+                [year, *params]
+            )]
+            if not blobs:
+                continue
+            # Привычки x байты года -> привычки x дни, сумма по столбцам
+            matrix = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), YEAR_BYTES)
+            per_day = np.unpackbits(matrix, axis=1, bitorder="little").sum(axis=0, dtype=np.int64)
+
+            year_start = datetime.date(year, 1, 1).toordinal()
+            lo = max(start, year_start)
+            hi = min(end, datetime.date(year, 12, 31).toordinal())
+            counts[lo - start:hi - start + 1] += per_day[lo - year_start:hi - year_start + 1]
+    return counts
+
+DAY_COUNTS = {
+    STORAGE_ROWS: _day_counts_rows,
+    STORAGE_BITMAP: _day_counts_bitmap,
+}
+
+def day_counts(db: Database, start: datetime.date, end: datetime.date,
+               habit_ids: Optional[Iterable[int]] = None) -> np.ndarray:
+    """Число выполнений за каждый день [start, end] по всем или выбранным привычкам"""
+    if end < start:
+        raise ValueError("Конец периода раньше начала")
+    ids = list(dict.fromkeys(habit_ids)) if habit_ids is not None else None
+    with db.pool.connection() as conn:
+        return DAY_COUNTS[db.storage](conn, start.toordinal(), end.toordinal(), ids)
+
+def bucket_starts(start: datetime.date, end: datetime.date, bucket: str) -> np.ndarray:
+    """Номера дней, с которых начинаются интервалы; первый всегда start.
+    Недели начинаются с понедельника, месяцы - с первого числа.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Неизвестный интервал: {bucket}. Доступны: {', '.join(BUCKETS)}")
+    days = np.arange(start.toordinal(), end.toordinal() + 1)
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        # date.fromordinal(1) - понедельник
+        return days[(days % 7 == 1) | (days == days[0])]
+
+    starts = [start.toordinal()]
+    month = datetime.date(start.year, start.month, 1)
+    while True:
+        month = datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        if month > end:
+            break
+        starts.append(month.toordinal())
+    return np.array(starts)
+
+def timeseries(db: Database, start: datetime.date, end: datetime.date,
+               bucket: str = "day", habit_ids: Optional[Iterable[int]] = None) -> dict:
+    """Число выполнений по дням, неделям или месяцам за период [start, end]"""
+    counts = day_counts(db, start, end, habit_ids)
+    starts = bucket_starts(start, end, bucket)
+
+    days = np.arange(start.toordinal(), end.toordinal() + 1)
+    index = np.searchsorted(starts, days, side="right") - 1
+    totals = np.bincount(index, weights=counts, minlength=len(starts)).astype(np.int64)
+    ends = np.append(starts[1:] - 1, end.toordinal())
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "total": int(totals.sum()),
+        "series": [
+            {
+                "start": datetime.date.fromordinal(int(first)).isoformat(),
+                "end": datetime.date.fromordinal(int(last)).isoformat(),
+                "days": int(last - first + 1),
+                "count": int(count)
+            }
+            for first, last, count in zip(starts, ends, totals)
+        ]
+    }
+
+def _cells_rows(conn, start: int, end: int, habit_ids: Optional[List[int]]):
+    """(habit_id, номер дня) каждого выполнения в [start, end]"""
+    first = datetime.date.fromordinal(start).isoformat()
+    last = datetime.date.fromordinal(end).isoformat()
+    for condition, params in _id_filters(habit_ids):
+        rows = conn.execute(
+            f"SELECT habit_id, CAST(julianday(date) - {JULIAN_OFFSET} AS INTEGER) "
+            f"FROM completions WHERE date BETWEEN ? AND ?{condition}",
+            [first, last, *params]
+        ).fetchall()
+        if rows:
+            cells = np.array(rows, dtype=np.int64)
+            yield cells[:, 0], cells[:, 1] - start
+
+def _cells_bitmap(conn, start: int, end: int, habit_ids: Optional[List[int]]):
+    first_year = datetime.date.fromordinal(start).year
+    last_year = datetime.date.fromordinal(end).year
+    for condition, params in _id_filters(habit_ids):
+        for year in range(first_year, last_year + 1):
+            rows = conn.execute(
+                f"SELECT habit_id, bits FROM completion_bitmaps WHERE year = ?{condition}",
+                [year, *params]
+            ).fetchall()
+            if not rows:
+                continue
+            ids = np.fromiter((habit_id for habit_id, _ in rows), dtype=np.int64, count=len(rows))
+            matrix = np.frombuffer(b"".join(bits for _, bits in rows), dtype=np.uint8)
+            bits = np.unpackbits(matrix.reshape(len(rows), YEAR_BYTES), axis=1, bitorder="little")
+
+            year_start = datetime.date(year, 1, 1).toordinal()
+            lo = max(start, year_start) - year_start
+            hi = min(end, datetime.date(year, 12, 31).toordinal()) - year_start
+            habit_index, day_index = np.nonzero(bits[:, lo:hi + 1])
+            yield ids[habit_index], day_index + lo + year_start - start
+
+CELLS = {
+    STORAGE_ROWS: _cells_rows,
+    STORAGE_BITMAP: _cells_bitmap,
+}
+
+def completion_matrix(db: Database, start: datetime.date, end: datetime.date,
+                      habit_ids: Optional[Iterable[int]] = None,
+                      after: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[int], np.ndarray]:
+    """id привычек и булева матрица len(ids) x дни [start, end]:
+    True - привычка выполнена в этот день. Без habit_ids - все привычки
+    в порядке id (after/limit - keyset-пагинация по ним); несуществующие
+    id пропускаются.
+    """
+    if end < start:
+        raise ValueError("Конец периода раньше начала")
+    requested = list(dict.fromkeys(habit_ids)) if habit_ids is not None else None
+    with db.pool.connection() as conn:
+        if requested is None:
+            ids = [habit_id for habit_id, in conn.execute(
+                "SELECT id FROM habits WHERE id > ? ORDER BY id LIMIT ?",
+                (after if after is not None else -1, limit if limit is not None else -1)
+            )]
+            if after is not None or limit is not None:
+                # Выполнения читаются только для привычек страницы
+                requested = ids
+        else:
+            existing = set()
+            for condition, params in _id_filters(requested, column="id"):
+                existing.update(habit_id for habit_id, in conn.execute(
+                    f"SELECT id FROM habits WHERE 1{condition}", params
+                ))
+            ids = [habit_id for habit_id in requested if habit_id in existing]
+
+        matrix = np.zeros((len(ids), end.toordinal() - start.toordinal() + 1), dtype=bool)
+        if not ids:
+            return ids, matrix
+
+        # habit_id -> номер строки через бинарный поиск по отсортированным id
+        id_array = np.array(ids, dtype=np.int64)
+        order = np.argsort(id_array)
+        sorted_ids = id_array[order]
+        for habit_col, day_col in CELLS[db.storage](conn, start.toordinal(), end.toordinal(), requested):
+            position = np.minimum(np.searchsorted(sorted_ids, habit_col), len(ids) - 1)
+            known = sorted_ids[position] == habit_col
+            matrix[order[position[known]], day_col[known]] = True
+    return ids, matrix
+
+def completion_row(ordinals: Iterable[int], start: datetime.date, end: datetime.date) -> np.ndarray:
+    """Булев массив дней [start, end] по номерам дней выполнений одной привычки"""
+    row = np.zeros(end.toordinal() - start.toordinal() + 1, dtype=bool)
+    days = np.fromiter(ordinals, dtype=np.int64) - start.toordinal()
+    row[days[(days >= 0) & (days < len(row))]] = True
+    return row
+
+def calendar_grid(row: np.ndarray, start: datetime.date) -> np.ndarray:
+    """Календарь в стиле GitHub: 7 строк (пн..вс) x недели.
+    1 - выполнено, 0 - нет, -1 - день вне периода.
+    """
+    offset = start.weekday()
+    weeks = -(-(offset + len(row)) // 7)
+    cells = np.full(weeks * 7, -1, dtype=np.int8)
+    cells[offset:offset + len(row)] = row
+    return cells.reshape(weeks, 7).T
@@ -0,0 +1,63 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from core.database import Database, POOL_SIZE
+
+# Размер пула соединений -> пул потоков того же размера
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+def get_executor(size: int = POOL_SIZE) -> ThreadPoolExecutor:
+    """Общий пул потоков для обращений к БД с пулом из size соединений.
+
+    Потоков столько же, сколько соединений, поэтому поток не простаивает
+    в ожидании свободного соединения.
+    """
+    with _executor_lock:
+        executor = _executors.get(size)
+        if executor is None:
+            executor = _executors[size] = ThreadPoolExecutor(
+                max_workers=size,
+                thread_name_prefix="habits-db"
+            )
+        return executor
+
+class AsyncDatabase:
+    """Асинхронный интерфейс к Database для обработчиков FastAPI.
+
+    Любой метод Database доступен как корутина с теми же аргументами:
+    вызов уходит в пул потоков БД, а цикл событий в это время
+    обслуживает другие запросы.
+
+        habit = await AsyncDatabase(db).get_habit(habit_id)
+    """
+
+    def __init__(self, db: Database, executor: Optional[ThreadPoolExecutor] = None):
+        self.db = db
+        self._executor = executor or get_executor(db.pool.size)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(attr, *args, **kwargs)
+            )
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        """Вызвать func(db, *args, **kwargs) в пуле потоков БД - для функций
+        модулей core, которые работают с Database (например, core.analytics)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, self.db, *args, **kwargs)
+        )
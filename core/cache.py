@@ -0,0 +1,251 @@
+"""
+Кеш привычек в памяти процесса перед Database.
+
+LRU объектов Habit и запомненные производные значения (статистика,
+список привычек для таблицы). Сохранение и удаление через кеш сразу
+обновляют его (write-through); записи через тот же Database в обход
+кеша приходят через Database.subscribe и сбрасывают затронутые привычки.
+
+Каждое изменение увеличивает счетчик version. Записи других процессов
+и других объектов Database (desktop и web в режиме --mode both)
+замечаются по PRAGMA data_version отдельного соединения: при его
+изменении кеш сбрасывается целиком, а подписчики Database (в том числе
+ReadModel) получают notify_change(None). Свои записи пул соединений
+фиксирует через commit(): data_version после них запоминается под той
+же блокировкой, что и в check(), поэтому check() из другого потока
+не примет их за чужие.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.models import Habit
+
+# Число привычек в кеше
+HABIT_CACHE_SIZE = int(os.environ.get("HABIT_CACHE_SIZE", "1024"))
+
+class HabitCache:
+    def __init__(self, db, max_entries: int = HABIT_CACHE_SIZE):
+        self.db = db
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._habits: "OrderedDict[int, Habit]" = OrderedDict()
+        # (имя, id привычки или None, сегодняшняя дата) -> значение
+        self._derived: Dict[Tuple, object] = {}
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.external_changes = 0
+
+        # У :memory: других писателей быть не может
+        self._watcher: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        if db.db_path != ":memory:":
+            self._watcher = sqlite3.connect(db.db_path, check_same_thread=False)
+            self._data_version = self._read_data_version()
+        db.subscribe(self.invalidate)
+        # Записи этого процесса фиксируются через commit(); несколько
+        # кешей одной БД образуют цепочку
+        self._next_commit = db.pool.on_commit
+        db.pool.on_commit = self.commit
+
+    def close(self):
+        with self._lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+    @property
+    def version(self) -> int:
+        """Версия данных: растет при каждом изменении, известном кешу"""
+        with self._lock:
+            return self._version
+
+    def _read_data_version(self) -> Optional[int]:
+        if self._watcher is None:
+            return None
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def commit(self, conn: sqlite3.Connection):
+        """ConnectionPool.on_commit: зафиксировать запись этого процесса"""
+        with self._lock:
+            # Чужая запись до нашей уже изменила data_version - тогда
+            # не запоминаем новое значение, и check() сбросит кеш
+            external = self._read_data_version() != self._data_version
+            if self._next_commit is not None:
+                self._next_commit(conn)
+            else:
+                conn.commit()
+            if not external:
+                self._data_version = self._read_data_version()
+
+    def check(self) -> bool:
+        """Проверить, не писал ли в БД кто-то еще. Если писал - сбросить
+        кеш и оповестить подписчиков Database. Возвращает True при сбросе
+        """
+        with self._lock:
+            current = self._read_data_version()
+            if current == self._data_version:
+                return False
+            self._data_version = current
+            self.external_changes += 1
+        self.db.notify_change()
+        return True
+
+    def invalidate(self, habit_ids: Optional[Iterable[int]] = None):
+        """Сбросить привычки и зависящие от них значения; None - все.
+        Подписан на Database.notify_change.
+        """
+        with self._lock:
+            self._version += 1
+            if habit_ids is None:
+                self._habits.clear()
+                self._derived.clear()
+                return
+            ids = set(habit_ids)
+            for habit_id in ids:
+                self._habits.pop(habit_id, None)
+            self._derived = {
+                key: value for key, value in self._derived.items()
+                if key[1] is not None and key[1] not in ids
+            }
+
+    def _put(self, habit: Habit):
+        """Вызывается под self._lock"""
+        self._habits[habit.id] = habit
+        self._habits.move_to_end(habit.id)
+        while len(self._habits) > self.max_entries:
+            self._habits.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, habit_id: int) -> Tuple[Optional[Habit], int]:
+        """(привычка из кеша или None, версия на момент промаха)"""
+        self.check()
+        with self._lock:
+            habit = self._habits.get(habit_id)
+            if habit is None:
+                self.misses += 1
+                return None, self._version
+            self._habits.move_to_end(habit_id)
+            self.hits += 1
+            return habit, self._version
+
+    def get_habit(self, habit_id: int) -> Optional[Habit]:
+        """Привычка по id. Возвращается копия: ее можно менять и сохранять"""
+        habit, version = self._lookup(habit_id)
+        if habit is None:
+            habit = self.db.get_habit(habit_id)
+            if habit is None:
+                return None
+            with self._lock:
+                # Если данные изменились во время чтения, прочитанное
+                # могло устареть - такое в кеш не кладем
+                if self._version == version:
+                    self._put(habit)
+        return habit.copy()
+
+    def save_habit(self, habit: Habit) -> int:
+        """Database.save_habit с записью сохраненной привычки в кеш.
+        habit должна быть загружена со всеми выполнениями
+        """
+        # Чужие записи, сделанные до нашей, должны сбросить кеш
+        self.check()
+        with self._lock:
+            version = self._version
+        habit_id = self.db.save_habit(habit)
+        with self._lock:
+            # Версию увеличила только эта запись - привычка в БД совпадает с habit
+            if self._version == version + 1:
+                self._put(habit.copy())
+        return habit_id
+
+    def delete_habit(self, habit_id: int):
+        self.check()
+        self.db.delete_habit(habit_id)
+
+    def _memo(self, name: str, habit_id: Optional[int], compute: Callable[[], object]):
+        """Запомненное значение; habit_id=None - зависит от всех привычек.
+        В ключ входит дата: серии считаются от сегодняшнего дня
+        """
+        self.check()
+        key = (name, habit_id, datetime.date.today())
+        with self._lock:
+            if key in self._derived:
+                self.hits += 1
+                return self._derived[key]
+            self.misses += 1
+            version = self._version
+        value = compute()
+        with self._lock:
+            if self._version == version:
+                self._derived[key] = value
+        return value
+
+    def summary_stats(self) -> dict:
+        """Database.get_summary_stats. Результат общий - не изменяйте его"""
+        return self._memo("summary_stats", None, self.db.get_summary_stats)
+
+    def habit_stats(self, habit_id: int) -> dict:
+        """Database.get_habit_stats. Результат общий - не изменяйте его"""
+        return self._memo("habit_stats", habit_id, lambda: self.db.get_habit_stats(habit_id))
+
+    def habit_summaries(self) -> List[dict]:
+        """Database.load_habit_summaries по всем привычкам. Результат общий -
+        не изменяйте его
+        """
+        return self._memo("habit_summaries", None, self.db.load_habit_summaries)
+
+    def data_version(self) -> str:
+        """Database.habits_version: отпечаток всех данных, одинаковый
+        во всех процессах и после перезапуска
+        """
+        return self._memo("data_version", None, self.db.habits_version)
+
+    def habit_revision(self, habit_id: int) -> Optional[int]:
+        """Database.get_revision; None, если привычки нет"""
+        return self._memo("revision", habit_id, lambda: self.db.get_revision(habit_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._habits),
+                "max_entries": self.max_entries,
+                "derived": len(self._derived),
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "external_changes": self.external_changes
+            }
+
+# Функции для AsyncDatabase.run: await db.run(cache.get_habit, habit_id)
+def get_habit(db, habit_id: int) -> Optional[Habit]:
+    return db.cache.get_habit(habit_id)
+
+def save_habit(db, habit: Habit) -> int:
+    return db.cache.save_habit(habit)
+
+def delete_habit(db, habit_id: int):
+    db.cache.delete_habit(habit_id)
+
+def summary_stats(db) -> dict:
+    return db.cache.summary_stats()
+
+def habit_stats(db, habit_id: int) -> dict:
+    return db.cache.habit_stats(habit_id)
+
+def habit_summaries(db) -> List[dict]:
+    return db.cache.habit_summaries()
+
+def data_version(db) -> str:
+    return db.cache.data_version()
+
+def habit_revision(db, habit_id: int) -> Optional[int]:
+    return db.cache.habit_revision(habit_id)
+
+def stats(db) -> dict:
+    return db.cache.stats()
@@ -0,0 +1,245 @@
+"""
+Отрисовка графиков HabitPlotter в отдельных процессах, кеш готовых
+картинок и пакетный экспорт графиков всех привычек.
+
+Процессы рендеринга используют бэкенд Agg и получают только компактные
+данные (название, цель, номера дней выполнений), а не объекты Habit.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# Число процессов рендеринга и число картинок в кеше
+RENDER_WORKERS = int(os.environ.get("CHART_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "256"))
+
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _to_bytes(fig, fmt: str, width: int, height: int, dpi: int) -> bytes:
+    fig.set_size_inches(width / dpi, height / dpi)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
+
+def render_habit(name: str, target_days: int, ordinals: List[int],
+                 fmt: str = "png", width: int = 1000, height: int = 400, dpi: int = 100) -> bytes:
+    """График прогресса одной привычки (HabitPlotter.plot_habit_progress)"""
+    from core.models import CompletionSet, Habit
+    from core.plotter import HabitPlotter
+    habit = Habit(name=name, target_days=target_days,
+                  completions=CompletionSet.from_ordinals(ordinals))
+    return _to_bytes(HabitPlotter().plot_habit_progress(habit), fmt, width, height, dpi)
+
+def render_overview(names: List[str], completed: List[int], targets: List[int],
+                    fmt: str = "png", width: int = 1000, height: int = 600, dpi: int = 100) -> bytes:
+    """Сравнение всех привычек (HabitPlotter.plot_habit_totals)"""
+    from core.plotter import HabitPlotter
+    plotter = HabitPlotter()
+    if names:
+        fig = plotter.plot_habit_totals(names, completed, targets)
+    else:
+        fig = plotter.plot_all_habits([])
+    return _to_bytes(fig, fmt, width, height, dpi)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов рендеринга. Процессы запускаются через spawn:
+    fork процесса с потоками пула БД и цикла событий небезопасен.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _pool
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def chart_etag(key: Tuple) -> str:
+    """Сильный ETag по ключу картинки: считается без рендеринга"""
+    return '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+
+class ChartCache:
+    """LRU готовых картинок. В ключ входит версия данных, поэтому
+    устаревшие картинки не удаляются явно, а вытесняются новыми.
+    """
+
+    def __init__(self, max_entries: int = CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def put(self, key: Tuple, content: bytes):
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(len(content) for content in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Пакетный экспорт: (id, названия, цели, смещения, номера дней подряд)
+Batch = Tuple[array, List[str], array, array, array]
+
+# Постоянный плоттер процесса экспорта: фигура создается один раз
+_worker_plotter = None
+# Открытый PDF процесса, который рисует общий PDF-отчет
+_worker_pdf = None
+
+def pack_batch(habits) -> Batch:
+    """Привычки -> компактные массивы для передачи в процесс рендеринга"""
+    ids, targets, offsets, ordinals = array("i"), array("i"), array("i", [0]), array("i")
+    names = []
+    for habit in habits:
+        ids.append(habit.id)
+        names.append(habit.name)
+        targets.append(habit.target_days)
+        ordinals.extend(habit.completions.ordinals)
+        offsets.append(len(ordinals))
+    return ids, names, targets, offsets, ordinals
+
+def _iter_figures(batch: Batch):
+    global _worker_plotter
+    from core.models import CompletionSet, Habit
+    from core.plotter import HabitPlotter
+    if _worker_plotter is None:
+        _worker_plotter = HabitPlotter(persistent=True)
+    
+    ids, names, targets, offsets, ordinals = batch
+    for i, habit_id in enumerate(ids):
+        habit = Habit(id=habit_id, name=names[i], target_days=targets[i],
+                      completions=CompletionSet.from_ordinals(ordinals[offsets[i]:offsets[i + 1]]))
+        yield habit_id, _worker_plotter.plot_habit_progress(habit)
+
+def _render_batch(directory: str, fmt: str, dpi: int, batch: Batch) -> list:
+    """Нарисовать графики пачки привычек в файлы каталога directory,
+    возвращает пути
+    """
+    results = []
+    for habit_id, fig in _iter_figures(batch):
+        path = os.path.join(directory, f"habit_{habit_id}.{fmt}")
+        _worker_plotter.save_plot(fig, path, dpi)
+        results.append(path)
+    return results
+
+def _render_pdf_batch(output: str, batch: Batch) -> int:
+    """Дописать графики пачки привычек векторными страницами в PDF,
+    открытый в этом процессе; возвращает число страниц
+    """
+    global _worker_pdf
+    if _worker_pdf is None:
+        from matplotlib.backends.backend_pdf import PdfPages
+        _worker_pdf = PdfPages(output)
+    pages = 0
+    for _, fig in _iter_figures(batch):
+        _worker_pdf.savefig(fig, bbox_inches='tight')
+        pages += 1
+    return pages
+
+def _close_pdf():
+    global _worker_pdf
+    if _worker_pdf is not None:
+        _worker_pdf.close()
+        _worker_pdf = None
+
+def export_charts(db, output: str, fmt: str = "png", dpi: int = 300,
+                  workers: int = RENDER_WORKERS, batch_size: int = 50,
+                  progress: Optional[Callable[[int], None]] = None) -> dict:
+    """Графики прогресса всех привычек в каталог output (по файлу на привычку
+    в формате fmt) или, если output оканчивается на .pdf, в один PDF.
+    
+    Привычки читаются страницами по batch_size и раздаются процессам;
+    в работе одновременно не больше 2 * workers пачек, поэтому память
+    не растет с числом привычек. Общий PDF пишет один процесс: страницы
+    остаются векторными и идут по id привычек. Возвращает отчет
+    с пропускной способностью.
+    """
+    single_pdf = output.lower().endswith(".pdf")
+    if single_pdf:
+        workers = 1
+    else:
+        if fmt not in FORMATS and fmt != "pdf":
+            raise ValueError(f"Неизвестный формат: {fmt}. Доступны: png, svg, pdf")
+        os.makedirs(output, exist_ok=True)
+    
+    start = time.perf_counter()
+    done = 0
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker)
+    try:
+        pending = deque()
+        after = None
+        while True:
+            habits = db.load_habits(after=after, limit=batch_size)
+            if habits:
+                after = habits[-1].id
+                if single_pdf:
+                    pending.append(pool.submit(_render_pdf_batch, output, pack_batch(habits)))
+                else:
+                    pending.append(pool.submit(_render_batch, output, fmt, dpi, pack_batch(habits)))
+            while pending and (len(pending) >= 2 * workers or not habits):
+                result = pending.popleft().result()
+                done += result if single_pdf else len(result)
+                if progress is not None:
+                    progress(done)
+            if not habits:
+                break
+        if single_pdf:
+            pool.submit(_close_pdf).result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+    
+    elapsed = time.perf_counter() - start
+    return {
+        "habits": done,
+        "seconds": elapsed,
+        "per_second": done / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+        "output": output
+    }
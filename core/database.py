@@ -1,116 +1,563 @@
+import os
 import sqlite3
 import datetime
-from typing import List
-from core.models import Habit, HabitStatus
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.cache import HabitCache
+from core.models import CompletionSet, Habit, HabitStatus
+from core.migrations import migrate
+from core.pool import ConnectionPool
+from core.read_model import ReadModel
+from core.storage import STORAGE_ROWS, aggregate, get_store, register_functions
+
+# Размер пула и время ожидания свободного соединения (секунды)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# Сколько id передавать в одном IN (...): старые сборки SQLite
+# ограничивают число параметров запроса 999
+MAX_QUERY_PARAMS = 450
+
+# Привычек на одно обращение к БД в iter_habits
+ITER_BATCH = 200
+
+# Статусы пар в Database.add_completions
+COMPLETION_INSERTED = "inserted"
+COMPLETION_DUPLICATE = "duplicate"
+COMPLETION_NOT_FOUND = "not_found"
+
+# Типы событий для Database.subscribe_events
+HABIT_CREATED = "habit_created"
+HABIT_UPDATED = "habit_updated"
+HABIT_DELETED = "habit_deleted"
+COMPLETION_ADDED = "completion_added"
+COMPLETION_REMOVED = "completion_removed"
+# Изменилось неизвестно что (импорт, запись другого процесса)
+DATA_RELOADED = "reload"
+
+def _completion_event(event_type: str, habit_id: int, ordinals: Iterable[int]) -> dict:
+    dates = [datetime.date.fromordinal(ordinal).isoformat() for ordinal in sorted(ordinals)]
+    return {"type": event_type, "habit_id": habit_id, "dates": dates}
 
 class Database:
-    def __init__(self, db_path: str = "habits.db"):
+    def __init__(self, db_path: str = "habits.db",
+                 pool_size: int = POOL_SIZE, pool_timeout: float = POOL_TIMEOUT,
+                 storage: Optional[str] = None):
+        """storage - способ хранения выполнений для новой БД: "rows" или "bitmap".
+        У существующей БД он уже записан в settings; чтобы сменить его,
+        используйте convert_storage.
+        """
         self.db_path = db_path
-        self.init_db()
-    
-    def init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS habits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    target_days INTEGER DEFAULT 7,
-                    creation_date TEXT,
-                    status TEXT DEFAULT 'active'
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS completions (
-                    habit_id INTEGER,
-                    date TEXT,
-                    FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE,
-                    UNIQUE(habit_id, date)
+        self.pool = ConnectionPool(db_path, size=pool_size, timeout=pool_timeout,
+                                   on_connect=register_functions)
+        self._listeners: List[Callable[[Optional[List[int]]], None]] = []
+        self._event_listeners: List[Callable[[List[dict]], None]] = []
+        self.init_db(storage)
+        # Индексы привычек в памяти для чтения; строятся при первом обращении
+        self.read_model = ReadModel(self)
+        # LRU привычек и запомненная статистика; замечает чужие записи
+        self.cache = HabitCache(self)
+    
+    def close(self):
+        self.cache.close()
+        self.pool.close()
+    
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
+    
+    def subscribe(self, listener: Callable[[Optional[List[int]]], None]):
+        """listener(habit_ids) вызывается после каждой записи через этот объект
+        с id измененных привычек; None - изменилось неизвестно что (импорт)
+        """
+        self._listeners.append(listener)
+    
+    def subscribe_events(self, listener: Callable[[List[dict]], None]):
+        """listener(events) вызывается после записи, вслед за subscribe,
+        со списком событий {"type": HABIT_CREATED, "habit_id": ...};
+        у событий выполнений есть "dates" - даты в формате YYYY-MM-DD
+        """
+        self._event_listeners.append(listener)
+    
+    def notify_change(self, habit_ids: Optional[Iterable[int]] = None,
+                      events: Optional[List[dict]] = None):
+        """Сообщить подписчикам о записи; вызывается после commit.
+        Без events подписчики событий получают HABIT_UPDATED по каждому id
+        или DATA_RELOADED, если id неизвестны.
+        """
+        ids = list(habit_ids) if habit_ids is not None else None
+        if ids == []:
+            return
+        for listener in self._listeners:
+            listener(ids)
+        if not self._event_listeners:
+            return
+        if events is None:
+            if ids is None:
+                events = [{"type": DATA_RELOADED}]
+            else:
+                events = [{"type": HABIT_UPDATED, "habit_id": habit_id} for habit_id in ids]
+        for listener in self._event_listeners:
+            listener(events)
+    
+    def init_db(self, storage: Optional[str] = None):
+        with self.pool.connection() as conn:
+            migrate(conn)
+            row = conn.execute(
+                "SELECT value FROM settings WHERE key='completion_storage'"
+            ).fetchone()
+            if row is None:
+                current = storage or STORAGE_ROWS
+                get_store(current)
+                conn.execute(
+                    "INSERT INTO settings (key, value) VALUES ('completion_storage', ?)",
+                    (current,)
                 )
-            """)
+            else:
+                current = row[0]
+                if storage is not None and storage != current:
+                    raise ValueError(
+                        f"Выполнения в {self.db_path} хранятся как '{current}', "
+                        f"а не '{storage}'. Для перевода: python run.py --mode convert-storage "
+                        f"--storage {storage}"
+                    )
+            aggregates_dirty = conn.execute(
+                "SELECT 1 FROM settings WHERE key='aggregates_dirty'"
+            ).fetchone() is not None
+        self.store = get_store(current)
+        
+        if aggregates_dirty:
+            self.recompute_aggregates()
+            with self.pool.connection() as conn:
+                conn.execute("DELETE FROM settings WHERE key='aggregates_dirty'")
+    
+    @property
+    def storage(self) -> str:
+        return self.store.name
+    
+    def convert_storage(self, target: str, vacuum: bool = True) -> int:
+        """Перенести все выполнения в другой способ хранения одной транзакцией.
+        Возвращает число перенесенных выполнений. Другие процессы, работающие
+        с этой БД, на время перевода нужно остановить.
+        """
+        target_store = get_store(target)
+        if target_store.name == self.store.name:
+            return 0
+        
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            moved = 0
+            for habit_id, ordinals in self.store.load(conn).items():
+                moved += target_store.add(conn, habit_id, ordinals)
+            conn.execute(f"DELETE FROM {self.store.table}")
+            conn.execute(
+                "UPDATE settings SET value=? WHERE key='completion_storage'",
+                (target_store.name,)
+            )
+        self.store = target_store
+        
+        if vacuum:
+            with self.pool.connection() as conn:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return moved
     
     def save_habit(self, habit: Habit) -> int:
-        with sqlite3.connect(self.db_path) as conn:
+        created = habit.id is None
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             
-            if habit.id is None:
+            if created:
                 cursor.execute("""
                     INSERT INTO habits (name, description, target_days, creation_date, status)
                     VALUES (?, ?, ?, ?, ?)
                 """, (habit.name, habit.description, habit.target_days,
                       habit.creation_date.isoformat(), habit.status.value))
                 habit.id = cursor.lastrowid
+                added, removed = habit.completions.ordinals, []
             else:
                 cursor.execute("""
                     UPDATE habits 
-                    SET name=?, description=?, target_days=?, status=?
+                    SET name=?, description=?, target_days=?, status=?, revision=revision + 1
                     WHERE id=?
                 """, (habit.name, habit.description, habit.target_days,
                       habit.status.value, habit.id))
+                added_dates, removed_dates = habit.get_completion_changes()
+                added = [date.toordinal() for date in added_dates]
+                removed = [date.toordinal() for date in removed_dates]
             
-            cursor.execute("DELETE FROM completions WHERE habit_id=?", (habit.id,))
-            for date in habit.completions:
-                cursor.execute(
-                    "INSERT OR IGNORE INTO completions (habit_id, date) VALUES (?, ?)",
-                    (habit.id, date.isoformat())
-                )
+            # Записываем только изменившиеся даты, а не весь список выполнений
+            removed_count = self.store.remove(conn, habit.id, removed) if removed else 0
+            inserted_count = self.store.add(conn, habit.id, added) if added else 0
+            self._update_aggregates(conn, habit.id, added, inserted_count, removed_count)
             
-            conn.commit()
-            return habit.id
+            habit.clear_completion_changes()
+        
+        events = [{"type": HABIT_CREATED if created else HABIT_UPDATED, "habit_id": habit.id}]
+        if inserted_count:
+            events.append(_completion_event(COMPLETION_ADDED, habit.id, added))
+        if removed_count:
+            events.append(_completion_event(COMPLETION_REMOVED, habit.id, removed))
+        self.notify_change([habit.id], events)
+        return habit.id
     
-    def load_habits(self) -> List[Habit]:
-        habits = []
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+    def add_completion(self, habit_id: int, date: datetime.date) -> bool:
+        """Добавить одно выполнение. Возвращает False, если оно уже было"""
+        with self.pool.connection() as conn:
+            ordinals = [date.toordinal()]
+            inserted = self.store.add(conn, habit_id, ordinals)
+            self._update_aggregates(conn, habit_id, ordinals, inserted, 0)
+        if inserted:
+            self.notify_change([habit_id], [_completion_event(COMPLETION_ADDED, habit_id, ordinals)])
+        return inserted == 1
+    
+    def remove_completion(self, habit_id: int, date: datetime.date) -> bool:
+        """Удалить одно выполнение. Возвращает False, если его не было"""
+        with self.pool.connection() as conn:
+            removed = self.store.remove(conn, habit_id, [date.toordinal()])
+            self._update_aggregates(conn, habit_id, [], 0, removed)
+        if removed:
+            self.notify_change([habit_id], [
+                _completion_event(COMPLETION_REMOVED, habit_id, [date.toordinal()])
+            ])
+        return removed == 1
+    
+    def add_completions(self, items: Iterable[Tuple[int, datetime.date]]) -> List[str]:
+        """Добавить много выполнений (habit_id, дата) одной транзакцией.
+        
+        Возвращает статус каждой пары в исходном порядке: COMPLETION_INSERTED,
+        COMPLETION_DUPLICATE (уже было или повтор в запросе) или
+        COMPLETION_NOT_FOUND (нет такой привычки).
+        """
+        pairs = [(habit_id, date.toordinal()) for habit_id, date in items]
+        if not pairs:
+            return []
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = list(dict.fromkeys(habit_id for habit_id, _ in pairs))
+            known = set()
+            for start in range(0, len(ids), MAX_QUERY_PARAMS):
+                chunk = ids[start:start + MAX_QUERY_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                known.update(row[0] for row in conn.execute(
+                    f"SELECT id FROM habits WHERE id IN ({placeholders})", chunk
+                ))
             
-            cursor.execute("SELECT * FROM habits ORDER BY id")
-            for row in cursor.fetchall():
-                cursor.execute(
-                    "SELECT date FROM completions WHERE habit_id=? ORDER BY date",
-                    (row['id'],)
-                )
-                completions = [
-                    datetime.date.fromisoformat(date_row[0]) 
-                    for date_row in cursor.fetchall()
-                ]
+            ordinals = [ordinal for habit_id, ordinal in pairs if habit_id in known]
+            seen = self.store.existing(
+                conn, list(known), min(ordinals), max(ordinals), MAX_QUERY_PARAMS
+            ) if ordinals else set()
+            
+            statuses = []
+            added: Dict[int, List[int]] = defaultdict(list)
+            for pair in pairs:
+                if pair[0] not in known:
+                    statuses.append(COMPLETION_NOT_FOUND)
+                elif pair in seen:
+                    statuses.append(COMPLETION_DUPLICATE)
+                else:
+                    seen.add(pair)
+                    added[pair[0]].append(pair[1])
+                    statuses.append(COMPLETION_INSERTED)
+            
+            self.store.bulk_insert(conn, added.items(), MAX_QUERY_PARAMS)
+            for habit_id, habit_added in added.items():
+                self._update_aggregates(conn, habit_id, habit_added, len(habit_added), 0)
+        self.notify_change(added, [
+            _completion_event(COMPLETION_ADDED, habit_id, habit_added)
+            for habit_id, habit_added in added.items()
+        ])
+        return statuses
+    
+    def _update_aggregates(self, conn: sqlite3.Connection, habit_id: int,
+                           added: List[int], inserted: int, removed: int):
+        """Обновить completion_count, серии и last_completed после изменения выполнений.
+        
+        Отметки после последнего выполнения (обычный случай - "сегодня")
+        учитываются инкрементально; удаление или отметка задним числом
+        пересчитывает значения по выполнениям одной привычки.
+        """
+        if not inserted and not removed:
+            return
+        row = conn.execute(
+            "SELECT completion_count, current_streak, longest_streak, last_completed "
+            "FROM habits WHERE id=?", (habit_id,)
+        ).fetchone()
+        if row is None:
+            return
+        
+        count, current, longest, last_completed = row
+        last = datetime.date.fromisoformat(last_completed).toordinal() if last_completed else None
+        added = sorted(added)
+        
+        if not removed and inserted == len(added) and (last is None or added[0] > last):
+            for ordinal in added:
+                current = current + 1 if last is not None and ordinal == last + 1 else 1
+                longest = max(longest, current)
+                last = ordinal
+            count += inserted
+        else:
+            ordinals = self.store.load_one(conn, habit_id)
+            count, current, longest, last = aggregate(ordinals) if ordinals else (0, 0, 0, None)
+        
+        conn.execute(
+            "UPDATE habits SET completion_count=?, current_streak=?, longest_streak=?, "
+            "last_completed=?, revision=revision + 1 WHERE id=?",
+            (count, current, longest,
+             datetime.date.fromordinal(last).isoformat() if last else None, habit_id)
+        )
+    
+    def recompute_aggregates(self, habit_ids: Optional[Iterable[int]] = None) -> int:
+        """Пересчитать кешированные счетчики и серии по выполнениям.
+        Возвращает число привычек, у которых значения расходились.
+        """
+        fixed = []
+        with self.pool.connection() as conn:
+            if habit_ids is None:
+                ids = [row[0] for row in conn.execute("SELECT id FROM habits ORDER BY id")]
+            else:
+                ids = list(dict.fromkeys(habit_ids))
+            
+            for start in range(0, len(ids), MAX_QUERY_PARAMS):
+                chunk = ids[start:start + MAX_QUERY_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                aggregates = self.store.aggregates_for(conn, chunk, MAX_QUERY_PARAMS)
+                
+                updates = []
+                for habit_id, *stored in conn.execute(
+                    f"SELECT id, completion_count, current_streak, longest_streak, last_completed "
+                    f"FROM habits WHERE id IN ({placeholders})", chunk
+                ):
+                    count, current, longest, last = aggregates.get(habit_id, (0, 0, 0, None))
+                    expected = [count, current, longest,
+                                datetime.date.fromordinal(last).isoformat() if last else None]
+                    if stored != expected:
+                        updates.append((*expected, habit_id))
                 
-                habit = Habit(
-                    id=row['id'],
-                    name=row['name'],
-                    description=row['description'] or "",
-                    target_days=row['target_days'],
-                    creation_date=datetime.date.fromisoformat(row['creation_date']),
-                    status=HabitStatus(row['status']),
-                    completions=completions
+                conn.executemany(
+                    "UPDATE habits SET completion_count=?, current_streak=?, longest_streak=?, "
+                    "last_completed=?, revision=revision + 1 WHERE id=?", updates
                 )
-                habits.append(habit)
+                fixed.extend(update[-1] for update in updates)
+        self.notify_change(fixed)
+        return len(fixed)
+    
+    def load_habits(self, after: Optional[int] = None, limit: Optional[int] = None,
+                    with_completions: bool = True,
+                    completions_since: Optional[datetime.date] = None) -> List[Habit]:
+        """Загрузить привычки в порядке id.
         
-        return habits
+        after/limit - keyset-пагинация: привычки с id > after, не больше limit.
+        with_completions=False не читает выполнения вовсе,
+        completions_since оставляет только выполнения начиная с этой даты.
+        """
+        with self.pool.connection() as conn:
+            rows, completions = self._habit_rows(conn, after, limit, with_completions,
+                                                 completions_since)
+        return [self._habit_from_row(row, completions.get(row['id'], [])) for row in rows]
     
-    def delete_habit(self, habit_id: int):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM habits WHERE id=?", (habit_id,))
+    def _habit_rows(self, conn: sqlite3.Connection, after: Optional[int], limit: Optional[int],
+                    with_completions: bool, completions_since: Optional[datetime.date]
+                    ) -> Tuple[List[sqlite3.Row], Dict[int, List[int]]]:
+        """Строки habits страницы и номера дней выполнений по id привычки"""
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(
+            "SELECT * FROM habits WHERE id > ? ORDER BY id LIMIT ?",
+            (after if after is not None else -1, limit if limit is not None else -1)
+        )
+        rows = cursor.fetchall()
+        if not rows or not with_completions:
+            return rows, {}
+        
+        # Все выполнения страницы читаются одним упорядоченным проходом
+        # и группируются по habit_id, вместо запроса на каждую привычку
+        completions = self.store.load(
+            conn,
+            first_id=rows[0]['id'] if after is not None else None,
+            last_id=rows[-1]['id'] if limit is not None else None,
+            since=completions_since
+        )
+        return rows, completions
     
-    def get_habit_stats(self, habit_id: int) -> dict:
-        with sqlite3.connect(self.db_path) as conn:
+    def iter_habits(self, after: Optional[int] = None, limit: Optional[int] = None,
+                    with_completions: bool = True,
+                    completions_since: Optional[datetime.date] = None,
+                    batch_size: int = ITER_BATCH) -> Iterator[dict]:
+        """Привычки по одной в порядке id для потоковой выдачи: словари
+        как Habit.to_dict(), без выполнений - как load_habit_summaries.
+        
+        Привычки читаются keyset-страницами по batch_size, соединение
+        берется из пула на одну страницу. Между страницами генератор
+        не держит ни соединения, ни транзакции чтения, поэтому медленный
+        получатель не занимает пул и не мешает контрольным точкам WAL.
+        """
+        today = datetime.date.today().isoformat()
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            with self.pool.connection() as conn:
+                rows, completions = self._habit_rows(conn, after, size, with_completions,
+                                                     completions_since)
+            for row in rows:
+                summary = self._summary_from_row(row, today)
+                if not with_completions:
+                    yield summary
+                    continue
+                data = self._habit_from_row(row, completions.get(row['id'], [])).to_dict()
+                # Процент и серия - по всей истории, даже при completions_since
+                data["completion_rate"] = summary["completion_rate"]
+                data["streak"] = summary["streak"]
+                yield data
+            if len(rows) < size:
+                return
+            after = rows[-1]['id']
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def get_habit(self, habit_id: int) -> Optional[Habit]:
+        """Загрузить одну привычку по первичному ключу"""
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM habits WHERE id=?", (habit_id,))
-            habit_row = cursor.fetchone()
-            
-            if not habit_row:
-                return {}
-            
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute("SELECT * FROM habits WHERE id=?", (habit_id,)).fetchone()
+            if row is None:
+                return None
+            return self._habit_from_row(row, self.store.load_one(conn, habit_id))
+    
+    def get_revision(self, habit_id: int) -> Optional[int]:
+        """Версия привычки; None, если привычки нет"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT revision FROM habits WHERE id=?", (habit_id,)).fetchone()
+        return row[0] if row else None
+    
+    def habits_version(self) -> str:
+        """Отпечаток состояния всех привычек: меняется при создании,
+        удалении и любом изменении привычки или ее выполнений
+        """
+        with self.pool.connection() as conn:
+            count, max_id, revisions = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(revision), 0) FROM habits"
+            ).fetchone()
+        return f"{count}-{max_id}-{revisions}"
+    
+    def load_habit_summaries(self, after: Optional[int] = None,
+                             limit: Optional[int] = None) -> List[dict]:
+        """Привычки без списка выполнений: процент и серия берутся
+        из кешированных полей, таблица выполнений не читается.
+        """
+        today = datetime.date.today().isoformat()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute(
-                "SELECT COUNT(*) FROM completions WHERE habit_id=?",
-                (habit_id,)
+                "SELECT * FROM habits WHERE id > ? ORDER BY id LIMIT ?",
+                (after if after is not None else -1, limit if limit is not None else -1)
             )
-            completions_count = cursor.fetchone()[0]
-            
-            return {
-                "id": habit_id,
-                "completions_count": completions_count,
-                "target_days": habit_row[3],
-                "completion_rate": completions_count / habit_row[3] if habit_row[3] > 0 else 0
-            }
\ No newline at end of file
+            return [self._summary_from_row(row, today) for row in cursor]
+    
+    def get_habit_summaries(self, habit_ids: Iterable[int]) -> Dict[int, dict]:
+        """Сводки (как load_habit_summaries) выбранных привычек по id;
+        привычки, которых нет в БД, пропускаются
+        """
+        today = datetime.date.today().isoformat()
+        ids = list(dict.fromkeys(habit_ids))
+        summaries = {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            for start in range(0, len(ids), MAX_QUERY_PARAMS):
+                chunk = ids[start:start + MAX_QUERY_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in cursor.execute(f"SELECT * FROM habits WHERE id IN ({placeholders})", chunk):
+                    summaries[row['id']] = self._summary_from_row(row, today)
+        return summaries
+    
+    @staticmethod
+    def _summary_from_row(row: sqlite3.Row, today: str) -> dict:
+        count, target_days = row['completion_count'], row['target_days']
+        return {
+            "id": row['id'],
+            "name": row['name'],
+            "description": row['description'] or "",
+            "target_days": target_days,
+            "creation_date": row['creation_date'],
+            "status": row['status'],
+            "completions_count": count,
+            "completion_rate": min(count / target_days, 1.0) if target_days != 0 else 0.0,
+            "streak": row['current_streak'] if row['last_completed'] == today else 0,
+            "longest_streak": row['longest_streak'],
+            "last_completed": row['last_completed']
+        }
+    
+    @staticmethod
+    def _habit_from_row(row: sqlite3.Row, ordinals: List[int]) -> Habit:
+        return Habit(
+            id=row['id'],
+            name=row['name'],
+            description=row['description'] or "",
+            target_days=row['target_days'],
+            creation_date=datetime.date.fromisoformat(row['creation_date']),
+            status=HabitStatus(row['status']),
+            completions=CompletionSet.from_ordinals(ordinals)
+        )
+    
+    def delete_habit(self, habit_id: int):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM habits WHERE id=?", (habit_id,))
+        self.notify_change([habit_id], [{"type": HABIT_DELETED, "habit_id": habit_id}])
+    
+    def get_summary_stats(self) -> dict:
+        """Общая статистика по всем привычкам одним агрегирующим запросом
+        по кешированным счетчикам, без чтения выполнений"""
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                WITH per_habit AS (
+                    SELECT id, name, status, target_days, completion_count AS cnt
+                    FROM habits
+                )
+                SELECT COUNT(*),
+                       COALESCE(SUM(status = 'active'), 0),
+                       COALESCE(SUM(cnt), 0),
+                       AVG(CASE WHEN target_days = 0 THEN 0.0
+                                ELSE MIN(CAST(cnt AS REAL) / target_days, 1.0) END),
+                       (SELECT name FROM per_habit ORDER BY cnt DESC, id LIMIT 1)
+                FROM per_habit
+            """).fetchone()
+        
+        total_habits, active_habits, total_completions, avg_rate, most_completed = row
+        return {
+            "total_habits": total_habits,
+            "active_habits": active_habits,
+            "total_completions": total_completions,
+            "average_completion_rate": round(avg_rate, 2) if total_habits else 0,
+            "most_completed_habit": most_completed
+        }
+    
+    def get_habit_stats(self, habit_id: int) -> dict:
+        return self.get_stats_for([habit_id]).get(habit_id, {})
+    
+    def get_stats_for(self, habit_ids: Iterable[int]) -> Dict[int, dict]:
+        """Статистика нескольких привычек: число выполнений, цель, процент,
+        текущая и самая длинная серия. Привычки, которых нет в БД, пропускаются.
+        """
+        today = datetime.date.today().isoformat()
+        ids = list(dict.fromkeys(habit_ids))
+        stats = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(ids), MAX_QUERY_PARAMS):
+                chunk = ids[start:start + MAX_QUERY_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                for habit_id, target_days, count, current, longest, last in conn.execute(
+                    f"SELECT id, target_days, completion_count, current_streak, "
+                    f"longest_streak, last_completed FROM habits WHERE id IN ({placeholders})",
+                    chunk
+                ):
+                    stats[habit_id] = {
+                        "id": habit_id,
+                        "completions_count": count,
+                        "target_days": target_days,
+                        "completion_rate": count / target_days if target_days > 0 else 0,
+                        "current_streak": current if last == today else 0,
+                        "longest_streak": longest
+                    }
+        return stats
\ No newline at end of file
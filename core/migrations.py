@@ -0,0 +1,142 @@
+import sqlite3
+from dataclasses import dataclass
+from typing import List, Optional
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: List[str]
+
+# Версия схемы хранится в PRAGMA user_version.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Исходная схема", [
+        """
+        CREATE TABLE IF NOT EXISTS habits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            target_days INTEGER DEFAULT 7,
+            creation_date TEXT,
+            status TEXT DEFAULT 'active'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS completions (
+            habit_id INTEGER,
+            date TEXT,
+            FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE,
+            UNIQUE(habit_id, date)
+        )
+        """,
+    ]),
+    Migration(2, "completions WITHOUT ROWID и вторичные индексы", [
+        """
+        CREATE TABLE completions_new (
+            habit_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (habit_id, date),
+            FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """,
+        # Раньше внешние ключи не проверялись, поэтому переносим только
+        # выполнения существующих привычек
+        """
+        INSERT OR IGNORE INTO completions_new (habit_id, date)
+        SELECT habit_id, date FROM completions
+        WHERE date IS NOT NULL AND habit_id IN (SELECT id FROM habits)
+        """,
+        "DROP TABLE completions",
+        "ALTER TABLE completions_new RENAME TO completions",
+        # Выполнения за дату и за диапазон дат; habit_id входит в индекс,
+        # так что обращаться к самой таблице не нужно
+        "CREATE INDEX idx_completions_date ON completions(date, habit_id)",
+        # Выборка привычек по статусу в порядке id
+        "CREATE INDEX idx_habits_status ON habits(status, id)",
+    ]),
+    Migration(3, "Настройки БД и хранение выполнений битовыми картами", [
+        """
+        CREATE TABLE settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE completion_bitmaps (
+            habit_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            bits BLOB NOT NULL,
+            PRIMARY KEY (habit_id, year),
+            FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """,
+        # Для уже заполненной БД фиксируем построчное хранение;
+        # в новой БД способ хранения выбирает Database
+        """
+        INSERT INTO settings (key, value)
+        SELECT 'completion_storage', 'rows' WHERE EXISTS (SELECT 1 FROM completions)
+        """,
+    ]),
+    Migration(4, "Кешированные счетчики и серии в habits", [
+        "ALTER TABLE habits ADD COLUMN completion_count INTEGER NOT NULL DEFAULT 0",
+        # Серия подряд идущих дней, заканчивающаяся last_completed
+        "ALTER TABLE habits ADD COLUMN current_streak INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE habits ADD COLUMN longest_streak INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE habits ADD COLUMN last_completed TEXT",
+        # Значения для существующих привычек посчитает Database.init_db
+        """
+        INSERT INTO settings (key, value)
+        SELECT 'aggregates_dirty', '1' WHERE EXISTS (SELECT 1 FROM habits)
+        """,
+    ]),
+    Migration(5, "Номер версии привычки", [
+        # Увеличивается при каждом изменении привычки или ее выполнений;
+        # по нему проверяется актуальность закешированных графиков
+        "ALTER TABLE habits ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection, target_version: Optional[int] = None) -> int:
+    """Применить недостающие миграции до target_version (по умолчанию - последней).
+
+    Каждая миграция выполняется в отдельной транзакции вместе с обновлением
+    user_version, поэтому прерванное обновление не оставляет схему
+    в промежуточном состоянии. Транзакция сразу берет блокировку записи,
+    и версия перечитывается под ней: если ту же БД одновременно открывает
+    другой процесс, уже примененная им миграция пропускается.
+    Возвращает итоговую версию схемы.
+    """
+    if target_version is None:
+        target_version = LATEST_VERSION
+
+    current = get_version(conn)
+    if current > LATEST_VERSION:
+        raise RuntimeError(
+            f"Версия схемы БД ({current}) новее поддерживаемой ({LATEST_VERSION})"
+        )
+
+    for migration in MIGRATIONS:
+        if migration.version <= current or migration.version > target_version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = get_version(conn)
+            if migration.version <= current:
+                conn.rollback()
+                continue
+            for statement in migration.statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = migration.version
+
+    return current
@@ -1,6 +1,7 @@
 import datetime
 from dataclasses import dataclass, field
-from typing import List, Optional
+from bisect import bisect_left, insort
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
 from enum import Enum
 
 class HabitStatus(Enum):
@@ -8,7 +9,154 @@ class HabitStatus(Enum):
     COMPLETED = "completed"
     ARCHIVED = "archived"
 
-@dataclass
+class CompletionSet:
+    """Даты выполнений, упорядоченные по возрастанию.
+    
+    Хранит порядковые номера дней (date.toordinal()) в отсортированном списке
+    и в множестве: проверка вхождения за O(1), вставка - бинарный поиск
+    без пересортировки. Снаружи ведет себя как список дат.
+    """
+    __slots__ = ("_ordinals", "_members", "_isoformats", "_changes")
+    
+    def __init__(self, dates: Iterable[datetime.date] = ()):
+        self._members: Set[int] = {date.toordinal() for date in dates}
+        self._ordinals: List[int] = sorted(self._members)
+        self._isoformats: Optional[List[str]] = None
+        # (Habit._added, Habit._removed) привычки-владельца
+        self._changes: Optional[Tuple[Set[datetime.date], Set[datetime.date]]] = None
+    
+    @classmethod
+    def from_ordinals(cls, ordinals: Iterable[int]) -> "CompletionSet":
+        completions = cls()
+        completions._members = set(ordinals)
+        completions._ordinals = sorted(completions._members)
+        return completions
+    
+    def isoformats(self) -> List[str]:
+        """Даты в формате YYYY-MM-DD; список кешируется до следующего изменения"""
+        if self._isoformats is None:
+            self._isoformats = [datetime.date.fromordinal(o).isoformat() for o in self._ordinals]
+        return list(self._isoformats)
+    
+    def copy(self) -> "CompletionSet":
+        """Независимая копия вместе с кешем isoformats"""
+        completions = CompletionSet()
+        completions._members = set(self._members)
+        completions._ordinals = list(self._ordinals)
+        completions._isoformats = self._isoformats
+        return completions
+    
+    @property
+    def ordinals(self) -> List[int]:
+        """Отсортированные номера дней (только для чтения)"""
+        return self._ordinals
+    
+    def add(self, date: datetime.date) -> bool:
+        ordinal = date.toordinal()
+        if ordinal in self._members:
+            return False
+        self._members.add(ordinal)
+        self._isoformats = None
+        if not self._ordinals or ordinal > self._ordinals[-1]:
+            self._ordinals.append(ordinal)
+        else:
+            insort(self._ordinals, ordinal)
+        return True
+    
+    def discard(self, date: datetime.date) -> bool:
+        ordinal = date.toordinal()
+        if ordinal not in self._members:
+            return False
+        self._members.discard(ordinal)
+        self._isoformats = None
+        del self._ordinals[bisect_left(self._ordinals, ordinal)]
+        return True
+    
+    @staticmethod
+    def _coerce(value) -> datetime.date:
+        """Дата из date, datetime или строки YYYY-MM-DD"""
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+        if isinstance(value, str):
+            return datetime.date.fromisoformat(value)
+        raise TypeError(f"Ожидается дата, а не {type(value).__name__}")
+    
+    def _mark(self, date) -> bool:
+        """add с записью изменения для save_habit"""
+        date = self._coerce(date)
+        if not self.add(date):
+            return False
+        if self._changes is not None:
+            added, removed = self._changes
+            if date in removed:
+                removed.discard(date)
+            else:
+                added.add(date)
+        return True
+    
+    def _unmark(self, date) -> bool:
+        """discard с записью изменения для save_habit"""
+        date = self._coerce(date)
+        if not self.discard(date):
+            return False
+        if self._changes is not None:
+            added, removed = self._changes
+            if date in added:
+                added.discard(date)
+            else:
+                removed.add(date)
+        return True
+    
+    # Совместимость со списком дат: изменения учитываются так же,
+    # как через Habit.mark_completed/unmark_completed
+    def append(self, date: datetime.date):
+        self._mark(date)
+    
+    def remove(self, date: datetime.date):
+        if not self._unmark(date):
+            raise ValueError(f"{date} нет среди выполнений")
+    
+    def streak_ending(self, date: datetime.date) -> int:
+        """Длина серии подряд идущих дней, последний из которых - date.
+        Если после date есть выполнения, серия считается прерванной.
+        """
+        ordinal = date.toordinal()
+        if not self._ordinals or self._ordinals[-1] != ordinal:
+            return 0
+        streak = 0
+        for expected, actual in zip(range(ordinal, -1, -1), reversed(self._ordinals)):
+            if actual != expected:
+                break
+            streak += 1
+        return streak
+    
+    def __contains__(self, date) -> bool:
+        return isinstance(date, datetime.date) and date.toordinal() in self._members
+    
+    def __iter__(self) -> Iterator[datetime.date]:
+        return map(datetime.date.fromordinal, self._ordinals)
+    
+    def __len__(self) -> int:
+        return len(self._ordinals)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [datetime.date.fromordinal(o) for o in self._ordinals[index]]
+        return datetime.date.fromordinal(self._ordinals[index])
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CompletionSet):
+            return self._ordinals == other._ordinals
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"CompletionSet({list(self)!r})"
+
+@dataclass(slots=True)
 class Habit:
     id: Optional[int] = None
     name: str = ""
@@ -16,15 +164,37 @@ class Habit:
     target_days: int = 7
     creation_date: datetime.date = field(default_factory=datetime.date.today)
     status: HabitStatus = HabitStatus.ACTIVE
-    completions: List[datetime.date] = field(default_factory=list)
+    completions: CompletionSet = field(default_factory=CompletionSet)
+    # Изменения выполнений с момента последнего сохранения в БД
+    _added: Set[datetime.date] = field(default_factory=set, init=False, repr=False, compare=False)
+    _removed: Set[datetime.date] = field(default_factory=set, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        if not isinstance(self.completions, CompletionSet):
+            self.completions = CompletionSet(self.completions)
+        self.completions._changes = (self._added, self._removed)
     
     def mark_completed(self, date: Optional[datetime.date] = None) -> bool:
         if date is None:
             date = datetime.date.today()
-        if date not in self.completions:
-            self.completions.append(date)
-            return True
-        return False
+        return self.completions._mark(date)
+    
+    def unmark_completed(self, date: datetime.date) -> bool:
+        return self.completions._unmark(date)
+    
+    def copy(self) -> "Habit":
+        """Копия без несохраненных изменений выполнений"""
+        return Habit(id=self.id, name=self.name, description=self.description,
+                     target_days=self.target_days, creation_date=self.creation_date,
+                     status=self.status, completions=self.completions.copy())
+    
+    def get_completion_changes(self) -> Tuple[Set[datetime.date], Set[datetime.date]]:
+        """Возвращает (добавленные, удаленные) даты с момента последнего сохранения"""
+        return set(self._added), set(self._removed)
+    
+    def clear_completion_changes(self):
+        self._added.clear()
+        self._removed.clear()
     
     def get_completion_rate(self) -> float:
         if self.target_days == 0:
@@ -32,19 +202,7 @@ class Habit:
         return min(len(self.completions) / self.target_days, 1.0)
     
     def get_streak(self) -> int:
-        if not self.completions:
-            return 0
-        
-        dates = sorted(self.completions, reverse=True)
-        streak = 0
-        current_date = datetime.date.today()
-        
-        for i in range(len(dates)):
-            if dates[i] == current_date - datetime.timedelta(days=i):
-                streak += 1
-            else:
-                break
-        return streak
+        return self.completions.streak_ending(datetime.date.today())
     
     def to_dict(self) -> dict:
         return {
@@ -54,7 +212,7 @@ class Habit:
             "target_days": self.target_days,
             "creation_date": self.creation_date.isoformat(),
             "status": self.status.value,
-            "completions": [d.isoformat() for d in self.completions],
+            "completions": self.completions.isoformats(),
             "completion_rate": self.get_completion_rate(),
             "streak": self.get_streak()
         }
@@ -1,87 +1,349 @@
-import matplotlib.pyplot as plt
+"""
+Графики привычек на объектном API matplotlib (Figure, без pyplot).
+
+Фигуры не регистрируются в глобальном состоянии pyplot, поэтому их можно
+строить в рабочих потоках и процессах. С persistent=True фигура каждого
+вида создается один раз, а при следующих вызовах у нее обновляются
+данные линий и столбцов (set_data / set_height).
+"""
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.colors import ListedColormap
 from matplotlib.figure import Figure
-from datetime import datetime, timedelta
-from typing import Optional
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional
+from core import analytics
 from core.models import Habit
 from core.database import Database
 
+MONTHS = ['Янв', 'Фев', 'Мар', 'Апр', 'Май', 'Июн',
+          'Июл', 'Авг', 'Сен', 'Окт', 'Ноя', 'Дек']
+
+# -1 - вне периода, 0 - не выполнено, 1 - выполнено
+CALENDAR_CMAP = ListedColormap(['#ffffff', '#ebedf0', '#2e7d32'])
+MATRIX_CMAP = ListedColormap(['#ebedf0', '#2e7d32'])
+
+# Сколько точек линии и столбцов рисовать; остальное прореживается или суммируется
+MAX_POINTS = 1000
+MAX_BARS = 20
+# Подписи значений над столбцами - только пока они не налезают друг на друга
+MAX_BAR_LABELS = 15
+
+# Номер дня 1970-01-01: даты matplotlib - дни от этой даты
+MPL_EPOCH = date(1970, 1, 1).toordinal()
+
+def _month_starts(start: date, end: date) -> List[date]:
+    months = []
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        if month >= start:
+            months.append(month)
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return months
+
+def decimate(ordinals: List[int], max_points: int = MAX_POINTS):
+    """(x, y) накопительного числа выполнений, не больше max_points точек.
+    Линия монотонна, поэтому равномерная выборка с сохранением последней
+    точки не меняет ее вид.
+    """
+    days = np.asarray(ordinals, dtype=np.int64)
+    counts = np.arange(1, len(days) + 1)
+    if len(days) > max_points:
+        index = np.unique(np.linspace(0, len(days) - 1, max_points).round().astype(np.int64))
+        days, counts = days[index], counts[index]
+    return days - MPL_EPOCH, counts
+
+def aggregate_totals(names: List[str], completed: List[int], targets: List[int],
+                     max_bars: int = MAX_BARS):
+    """Не больше max_bars столбцов: привычки с наибольшим числом выполнений,
+    остальные - одним столбцом "Остальные (N)" со средними значениями
+    """
+    if len(names) <= max_bars:
+        return list(names), list(completed), list(targets)
+    order = np.argsort(-np.asarray(completed), kind="stable")
+    top, rest = order[:max_bars - 1], order[max_bars - 1:]
+    return (
+        [names[i] for i in top] + [f'Остальные ({len(rest)})'],
+        [completed[i] for i in top] + [round(float(np.asarray(completed)[rest].mean()))],
+        [targets[i] for i in top] + [round(float(np.asarray(targets)[rest].mean()))]
+    )
+
+class BlitManager:
+    """Перерисовка только изменившихся artists поверх сохраненного фона.
+    
+    Artists помечаются animated и при обычной отрисовке пропускаются;
+    после каждой полной отрисовки (draw_event) фон запоминается заново.
+    """
+    
+    def __init__(self, canvas, artists):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self._background = None
+        for artist in self.artists:
+            artist.set_animated(True)
+        canvas.mpl_connect("draw_event", self._on_draw)
+    
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+    
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+    
+    def update(self):
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+@dataclass
+class _ProgressFigure:
+    figure: Figure
+    line: object
+    bars: object
+    labels: list
+    live: bool = False
+    blit: Optional[BlitManager] = None
+
+@dataclass
+class _TotalsFigure:
+    figure: Figure
+    names: List[str] = field(default_factory=list)
+    completed_bars: object = None
+    target_bars: object = None
+    labels: list = field(default_factory=list)
+    live: bool = False
+    blit: Optional[BlitManager] = None
+
 class HabitPlotter:
-    def __init__(self, db: Optional[Database] = None):
+    def __init__(self, db: Optional[Database] = None, persistent: bool = False,
+                 max_points: int = MAX_POINTS, max_bars: int = MAX_BARS):
+        """persistent - переиспользовать фигуры между вызовами (для окон
+        десктопа и пакетной отрисовки). Такой плоттер используется
+        из одного потока.
+        """
         self.db = db
+        self.persistent = persistent
+        self.max_points = max_points
+        self.max_bars = max_bars
+        self._progress: Optional[_ProgressFigure] = None
+        self._totals: Optional[_TotalsFigure] = None
+    
+    @property
+    def progress_figure(self) -> Optional[Figure]:
+        """Постоянная фигура прогресса (persistent=True), если уже создана"""
+        return self._progress.figure if self._progress else None
+    
+    @property
+    def totals_figure(self) -> Optional[Figure]:
+        return self._totals.figure if self._totals else None
+    
+    def _new_progress_figure(self) -> _ProgressFigure:
+        fig = Figure(figsize=(12, 5), layout='tight')
+        ax1, ax2 = fig.subplots(1, 2, gridspec_kw={'width_ratios': [3, 1]})
+        
+        # Накопительное число выполнений по датам
+        line, = ax1.plot([], [], '-', linewidth=2, color='#1f77b4')
+        ax1.set_xlabel('Дата')
+        ax1.set_ylabel('Выполнено раз')
+        ax1.grid(True, alpha=0.3)
+        locator = mdates.AutoDateLocator()
+        ax1.xaxis.set_major_locator(locator)
+        ax1.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        
+        # Выполнено и цель
+        bars = ax2.bar([0, 1], [0, 0], color=['#4CAF50', '#B0BEC5'])
+        ax2.set_xticks([0, 1])
+        ax2.set_xticklabels(['Выполнено', 'Цель'])
+        labels = [ax2.text(i, 0, '', ha='center', va='bottom') for i in range(2)]
+        return _ProgressFigure(fig, line, bars, labels)
     
     def plot_habit_progress(self, habit: Habit) -> Figure:
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+        progress = self._progress if self.persistent else None
+        if progress is None:
+            progress = self._new_progress_figure()
+            if self.persistent:
+                self._progress = progress
+        ax1, ax2 = progress.figure.axes
+        limits = (ax1.get_xlim(), ax1.get_ylim(), ax2.get_ylim())
         
-        # График выполнения по дням
-        if habit.completions:
-            dates = sorted(habit.completions)
-            date_strings = [d.strftime("%Y-%m-%d") for d in dates]
-            
-            ax1.plot(range(len(dates)), range(1, len(dates) + 1), 'o-', linewidth=2)
-            ax1.set_xlabel('Дни')
-            ax1.set_ylabel('Выполнено раз')
-            ax1.set_title(f'Прогресс: {habit.name}')
-            ax1.grid(True, alpha=0.3)
-            ax1.set_xticks(range(len(dates)))
-            ax1.set_xticklabels(date_strings, rotation=45)
+        x, y = decimate(habit.completions.ordinals, self.max_points)
+        progress.line.set_data(x, y)
+        if len(x):
+            ax1.set_xlim(x[0] - 1, x[-1] + 1)
+            ax1.set_ylim(0, y[-1] * 1.05 + 1)
+        else:
+            today = date.today().toordinal() - MPL_EPOCH
+            ax1.set_xlim(today - 30, today + 1)
+            ax1.set_ylim(0, 1)
+        ax1.set_title(f'Прогресс: {habit.name}')
         
-        # Круговая диаграмма прогресса
         completed = len(habit.completions)
-        remaining = max(0, habit.target_days - completed)
+        for bar, label, value in zip(progress.bars, progress.labels, (completed, habit.target_days)):
+            bar.set_height(value)
+            label.set_position((label.get_position()[0], value))
+            label.set_text(str(value))
+        ax2.set_ylim(0, max(completed, habit.target_days, 1) * 1.15)
+        ax2.set_title(f'{habit.get_completion_rate():.0%}')
         
-        if habit.target_days > 0:
-            labels = ['Выполнено', 'Осталось']
-            sizes = [completed, remaining]
-            colors = ['#4CAF50', '#FF6B6B']
-            
-            ax2.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-            ax2.axis('equal')
-            ax2.set_title(f'Прогресс: {completed}/{habit.target_days}')
-        
-        plt.tight_layout()
-        return fig
+        changed = limits != (ax1.get_xlim(), ax1.get_ylim(), ax2.get_ylim())
+        self._redraw(progress, changed)
+        return progress.figure
     
     def plot_all_habits(self, habits: list) -> Figure:
-        if not habits:
-            fig, ax = plt.subplots(figsize=(8, 4))
-            ax.text(0.5, 0.5, 'Нет данных для отображения', 
-                   ha='center', va='center', fontsize=12)
-            return fig
+        return self.plot_habit_totals(
+            [h.name for h in habits],
+            [len(h.completions) for h in habits],
+            [h.target_days for h in habits]
+        )
+    
+    def plot_habit_totals(self, names: List[str], completed: List[int],
+                          targets: List[int]) -> Figure:
+        """Столбцы "выполнено" и "цель" по привычкам; принимает готовые
+        числа, поэтому подходит и для сводок без списка выполнений
+        """
+        names, completed, targets = aggregate_totals(names, completed, targets, self.max_bars)
+        totals = self._totals if self.persistent else None
+        if totals is None:
+            totals = _TotalsFigure(Figure(figsize=(10, 6), layout='tight'))
+            totals.figure.subplots()
+            if self.persistent:
+                self._totals = totals
+        ax = totals.figure.axes[0]
         
-        names = [h.name for h in habits]
-        completed = [len(h.completions) for h in habits]
-        targets = [h.target_days for h in habits]
+        if not names:
+            ax.clear()
+            totals.names = []
+            ax.text(0.5, 0.5, 'Нет данных для отображения',
+                   ha='center', va='center', fontsize=12)
+            self._redraw(totals, True)
+            return totals.figure
         
-        fig, ax = plt.subplots(figsize=(10, 6))
+        top = max(max(completed), max(targets), 1) * 1.15
+        if names == totals.names:
+            # Те же привычки: меняются только высоты столбцов
+            changed = ax.get_ylim()[1] < top
+            bars = [*totals.completed_bars, *totals.target_bars]
+            for bar, value in zip(bars, completed + targets):
+                bar.set_height(value)
+            for label, value in zip(totals.labels, completed + targets):
+                label.xy = (label.xy[0], value)
+                label.set_text(str(value))
+            if changed:
+                ax.set_ylim(0, top)
+            self._redraw(totals, changed)
+            return totals.figure
         
-        x = range(len(names))
+        ax.clear()
+        x = np.arange(len(names))
         bar_width = 0.35
-        
-        bars1 = ax.bar([i - bar_width/2 for i in x], completed, bar_width, 
-                      label='Выполнено', color='lightblue')
-        bars2 = ax.bar([i + bar_width/2 for i in x], targets, bar_width, 
-                      label='Цель', color='lightgreen', alpha=0.7)
+        totals.completed_bars = ax.bar(x - bar_width/2, completed, bar_width,
+                                       label='Выполнено', color='lightblue')
+        totals.target_bars = ax.bar(x + bar_width/2, targets, bar_width,
+                                    label='Цель', color='lightgreen', alpha=0.7)
+        totals.names = names
+        # Подписи значений одним вызовом на набор столбцов
+        totals.labels = []
+        if len(names) <= MAX_BAR_LABELS:
+            totals.labels = [*ax.bar_label(totals.completed_bars, padding=3),
+                             *ax.bar_label(totals.target_bars, padding=3)]
         
         ax.set_xlabel('Привычки')
         ax.set_ylabel('Дни')
         ax.set_title('Сравнение выполнения привычек')
         ax.set_xticks(x)
         ax.set_xticklabels(names, rotation=45, ha='right')
+        ax.set_ylim(0, top)
         ax.legend()
+        self._redraw(totals, True)
+        return totals.figure
+    
+    def attach_canvas(self, fig: Figure):
+        """Отметить постоянную фигуру как показанную на холсте GUI: после
+        обновлений она перерисовывается сама, а если пределы осей
+        не изменились - только данные, через blitting
+        """
+        for holder in (self._progress, self._totals):
+            if holder is None or holder.figure is not fig:
+                continue
+            holder.live = True
+            # У сравнения привычек состав столбцов меняется вместе со списком
+            # привычек, поэтому оно перерисовывается целиком
+            if isinstance(holder, _ProgressFigure) and fig.canvas.supports_blit:
+                ax1, ax2 = fig.axes
+                holder.blit = BlitManager(fig.canvas, [holder.line, *holder.bars, *holder.labels,
+                                                       ax1.title, ax2.title])
+    
+    def _redraw(self, holder, changed: bool):
+        # Фигуры без холста GUI рисуются при savefig, здесь их не трогаем
+        if not holder.live:
+            return
+        if holder.blit is not None and not changed:
+            holder.blit.update()
+        else:
+            holder.figure.canvas.draw_idle()
+    
+    def plot_habit_heatmap(self, habit: Habit, end: Optional[date] = None,
+                           days: int = 365) -> Figure:
+        """Календарь выполнений за последние days дней: недели по горизонтали,
+        дни недели по вертикали, одна картинка imshow
+        """
+        end = end or date.today()
+        start = end - timedelta(days=days - 1)
+        row = analytics.completion_row(habit.completions.ordinals, start, end)
+        grid = analytics.calendar_grid(row, start)
         
-        # Добавляем значения на столбцы
-        for bars in [bars1, bars2]:
-            for bar in bars:
-                height = bar.get_height()
-                ax.annotate(f'{int(height)}',
-                           xy=(bar.get_x() + bar.get_width() / 2, height),
-                           xytext=(0, 3),
-                           textcoords="offset points",
-                           ha='center', va='bottom')
+        fig = Figure(figsize=(12, 2.5))
+        ax = fig.subplots()
+        ax.imshow(grid, cmap=CALENDAR_CMAP, vmin=-1, vmax=1,
+                  aspect='equal', interpolation='nearest')
+        ax.set_yticks([0, 2, 4])
+        ax.set_yticklabels(['Пн', 'Ср', 'Пт'])
+        months = _month_starts(start, end)
+        ax.set_xticks([(start.weekday() + (m - start).days) // 7 for m in months])
+        ax.set_xticklabels([MONTHS[m.month - 1] for m in months])
+        ax.tick_params(length=0)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        ax.set_title(f'{habit.name}: {int(row.sum())} выполнений за {days} дней')
+        return fig
+    
+    def plot_habits_heatmap(self, start: Optional[date] = None, end: Optional[date] = None,
+                            habit_ids: Optional[List[int]] = None) -> Figure:
+        """Матрица привычки x дни за период (по умолчанию - последний год)"""
+        if self.db is None:
+            raise ValueError("Для матрицы выполнений нужна база данных")
+        end = end or date.today()
+        start = start or end - timedelta(days=364)
+        ids, matrix = analytics.completion_matrix(self.db, start, end, habit_ids)
+        
+        fig = Figure(figsize=(12, max(2.5, min(len(ids), 40) * 0.3 + 1)))
+        ax = fig.subplots()
+        if not ids:
+            ax.text(0.5, 0.5, 'Нет данных для отображения',
+                   ha='center', va='center', fontsize=12)
+            return fig
         
-        plt.tight_layout()
+        ax.imshow(matrix, cmap=MATRIX_CMAP, vmin=0, vmax=1,
+                  aspect='auto', interpolation='nearest')
+        months = _month_starts(start, end)
+        ax.set_xticks([(m - start).days for m in months])
+        ax.set_xticklabels([MONTHS[m.month - 1] for m in months])
+        # Подписи строк - только пока они читаются
+        if len(ids) <= 40:
+            summaries = self.db.get_habit_summaries(ids)
+            ax.set_yticks(range(len(ids)))
+            ax.set_yticklabels([summaries[habit_id]["name"] if habit_id in summaries else str(habit_id)
+                                for habit_id in ids])
+        else:
+            ax.set_ylabel(f'Привычки ({len(ids)})')
+        ax.set_title(f'Выполнения с {start.isoformat()} по {end.isoformat()}')
         return fig
     
-    def save_plot(self, fig: Figure, filename: str = "plot.png"):
-        fig.savefig(filename, dpi=300, bbox_inches='tight')
-        plt.close(fig)
\ No newline at end of file
+    def save_plot(self, fig: Figure, filename: str = "plot.png", dpi: int = 300):
+        fig.savefig(filename, dpi=dpi, bbox_inches='tight')
@@ -0,0 +1,149 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+# Настройки соединения, применяемые один раз при его создании
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16 * 1024,  # в КиБ, т.е. 16 МиБ
+}
+
+class ConnectionPool:
+    """Ограниченный пул постоянных соединений SQLite.
+
+    Соединения создаются лениво (не больше size), настраиваются PRAGMA
+    один раз и переиспользуются между потоками. Если все соединения заняты,
+    acquire ждет до timeout секунд и затем выбрасывает TimeoutError.
+    """
+
+    def __init__(self, db_path: str, size: int = 5, timeout: float = 30.0,
+                 pragmas: Optional[Dict[str, object]] = None,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 on_commit: Optional[Callable[[sqlite3.Connection], None]] = None):
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+        # Каждое соединение с :memory: - отдельная БД, поэтому оно одно
+        self.db_path = db_path
+        self.size = 1 if db_path == ":memory:" else size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.on_connect = on_connect
+        # Если задан, вызывается вместо conn.commit() для соединений с записью
+        self.on_commit = on_commit
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+        # Метрики
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _create_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        conn = None
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Пул соединений закрыт")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        conn = self._create_connection()
+                    except Exception:
+                        self._created -= 1
+                        raise
+
+        if conn is None:
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise TimeoutError(
+                    f"Нет свободного соединения с БД за {self.timeout} с "
+                    f"(размер пула: {self.size})"
+                )
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._in_use -= 1
+            if self._closed:
+                self._created -= 1
+                conn.close()
+                return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдать соединение на время блока: commit при успехе, rollback при ошибке"""
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction and self.on_commit is not None:
+                self.on_commit(conn)
+            else:
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._created -= 1
+                conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "timeout": self.timeout,
+                "connections": self._created,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_time_total": round(self._wait_total, 6),
+                "wait_time_max": round(self._wait_max, 6),
+                "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            }
@@ -0,0 +1,126 @@
+"""
+Модель чтения: привычки в памяти процесса и индексы по ним.
+
+habits    - id -> Habit;
+by_status - статус -> id привычек;
+by_date   - номер дня -> id привычек, выполненных в этот день.
+
+Индексы строятся одним load_habits при первом обращении. Database сообщает
+о каждой записи (Database.subscribe), и измененные привычки перечитываются
+при следующем чтении. Записи в БД в обход этого объекта Database (другой
+процесс, ручная правка) замечает перед каждым чтением HabitCache.check()
+по PRAGMA data_version и сбрасывает модель целиком.
+"""
+import datetime
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from core.models import Habit
+
+# Если изменилось больше привычек, индексы строятся заново целиком
+MAX_PARTIAL_REFRESH = 500
+
+class ReadModel:
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._habits: Optional[Dict[int, Habit]] = None
+        self._by_status: Dict[str, Set[int]] = defaultdict(set)
+        self._by_date: Dict[int, Set[int]] = defaultdict(set)
+        self._stale: Set[int] = set()
+        self.rebuilds = 0
+        self.refreshed = 0
+        db.subscribe(self.invalidate)
+
+    def invalidate(self, habit_ids: Optional[Iterable[int]] = None):
+        """Пометить привычки устаревшими; None - все"""
+        with self._lock:
+            if habit_ids is None:
+                self._habits = None
+                self._stale.clear()
+            elif self._habits is not None:
+                self._stale.update(habit_ids)
+
+    def _index(self, habit: Habit):
+        self._habits[habit.id] = habit
+        self._by_status[habit.status.value].add(habit.id)
+        for ordinal in habit.completions.ordinals:
+            self._by_date[ordinal].add(habit.id)
+
+    def _unindex(self, habit: Habit):
+        del self._habits[habit.id]
+        self._by_status[habit.status.value].discard(habit.id)
+        for ordinal in habit.completions.ordinals:
+            ids = self._by_date[ordinal]
+            ids.discard(habit.id)
+            if not ids:
+                del self._by_date[ordinal]
+
+    def _ensure(self):
+        """Построить или обновить индексы; вызывается под self._lock"""
+        if self._habits is not None and len(self._stale) > MAX_PARTIAL_REFRESH:
+            self._habits = None
+
+        if self._habits is None:
+            self._habits = {}
+            self._by_status.clear()
+            self._by_date.clear()
+            self._stale.clear()
+            for habit in self.db.load_habits():
+                self._index(habit)
+            self.rebuilds += 1
+            return
+
+        for habit_id in self._stale:
+            old = self._habits.get(habit_id)
+            if old is not None:
+                self._unindex(old)
+            habit = self.db.get_habit(habit_id)
+            if habit is not None:
+                self._index(habit)
+        self.refreshed += len(self._stale)
+        self._stale.clear()
+
+    def get(self, habit_id: int) -> Optional[Habit]:
+        """Привычка по id. Возвращаемые объекты общие - не изменяйте их"""
+        self.db.cache.check()
+        with self._lock:
+            self._ensure()
+            return self._habits.get(habit_id)
+
+    def with_status(self, status: str) -> List[Habit]:
+        """Привычки с этим статусом в порядке id"""
+        self.db.cache.check()
+        with self._lock:
+            self._ensure()
+            return [self._habits[habit_id] for habit_id in sorted(self._by_status.get(status, ()))]
+
+    def completed_on(self, date: datetime.date) -> List[Habit]:
+        """Привычки, выполненные в этот день, в порядке id"""
+        self.db.cache.check()
+        with self._lock:
+            self._ensure()
+            ids = self._by_date.get(date.toordinal(), ())
+            return [self._habits[habit_id] for habit_id in sorted(ids)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "built": self._habits is not None,
+                "habits": len(self._habits) if self._habits is not None else 0,
+                "dates": len(self._by_date),
+                "stale": len(self._stale),
+                "rebuilds": self.rebuilds,
+                "refreshed": self.refreshed
+            }
+
+# Функции для AsyncDatabase.run: await db.run(read_model.completed_on, date)
+def habits_with_status(db, status: str) -> List[Habit]:
+    return db.read_model.with_status(status)
+
+def completed_on(db, date: datetime.date) -> List[Habit]:
+    return db.read_model.completed_on(date)
+
+def stats(db) -> dict:
+    return db.read_model.stats()
@@ -0,0 +1,350 @@
+"""
+Способы хранения выполнений привычек.
+
+rows   - строка (habit_id, date) в таблице completions на каждое выполнение;
+bitmap - по одной битовой карте на привычку и год в completion_bitmaps:
+         бит N означает выполнение в (N+1)-й день года, 46 байт на год.
+
+Оба хранилища работают с номерами дней (date.toordinal()) и получают
+соединение снаружи, поэтому транзакциями управляет Database.
+"""
+import datetime
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+STORAGE_ROWS = "rows"
+STORAGE_BITMAP = "bitmap"
+
+# 366 дней високосного года
+YEAR_BYTES = 46
+
+def bitcount(bits: Optional[bytes]) -> int:
+    return int.from_bytes(bits, "little").bit_count() if bits else 0
+
+def register_functions(conn: sqlite3.Connection):
+    """SQL-функции, нужные запросам к битовым картам"""
+    conn.create_function("bitcount", 1, bitcount, deterministic=True)
+
+def compute_streaks(ordinals: List[int], today: int) -> Tuple[int, int]:
+    """(текущая, самая длинная) серия по отсортированным номерам дней.
+    Текущая серия должна заканчиваться сегодня, как в Habit.get_streak.
+    """
+    longest = run = 0
+    previous = None
+    for ordinal in ordinals:
+        run = run + 1 if previous is not None and ordinal == previous + 1 else 1
+        longest = max(longest, run)
+        previous = ordinal
+    current = run if previous == today else 0
+    return current, longest
+
+def aggregate(ordinals: List[int]) -> Tuple[int, int, int, int]:
+    """(число выполнений, серия до последнего выполнения, самая длинная серия,
+    номер дня последнего выполнения) по отсортированным номерам дней
+    """
+    current, longest = compute_streaks(ordinals, ordinals[-1])
+    return len(ordinals), current, longest, ordinals[-1]
+
+def _chunks(ids: List[int], size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def _group_by_year(ordinals: Iterable[int]) -> Dict[int, List[int]]:
+    by_year: Dict[int, List[int]] = defaultdict(list)
+    for ordinal in ordinals:
+        by_year[datetime.date.fromordinal(ordinal).year].append(ordinal)
+    return by_year
+
+def _mask(year: int, ordinals: Iterable[int]) -> int:
+    start = datetime.date(year, 1, 1).toordinal()
+    mask = 0
+    for ordinal in ordinals:
+        mask |= 1 << (ordinal - start)
+    return mask
+
+def _decode(year: int, bits: bytes) -> List[int]:
+    start = datetime.date(year, 1, 1).toordinal()
+    ordinals = []
+    for byte_index, byte in enumerate(bits):
+        while byte:
+            low = byte & -byte
+            ordinals.append(start + byte_index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return ordinals
+
+
+class RowCompletionStore:
+    name = STORAGE_ROWS
+    table = "completions"
+
+    def load(self, conn: sqlite3.Connection, first_id: Optional[int] = None,
+             last_id: Optional[int] = None,
+             since: Optional[datetime.date] = None) -> Dict[int, List[int]]:
+        """Выполнения привычек с id в [first_id, last_id], упорядоченные по дате"""
+        conditions, params = [], []
+        if first_id is not None:
+            conditions.append("habit_id >= ?")
+            params.append(first_id)
+        if last_id is not None:
+            conditions.append("habit_id <= ?")
+            params.append(last_id)
+        if since is not None:
+            conditions.append("date >= ?")
+            params.append(since.isoformat())
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        completions: Dict[int, List[int]] = defaultdict(list)
+        for habit_id, date in conn.execute(
+            f"SELECT habit_id, date FROM completions{where} ORDER BY habit_id, date", params
+        ):
+            completions[habit_id].append(datetime.date.fromisoformat(date).toordinal())
+        return completions
+
+    def load_one(self, conn: sqlite3.Connection, habit_id: int) -> List[int]:
+        return [
+            datetime.date.fromisoformat(date).toordinal()
+            for date, in conn.execute(
+                "SELECT date FROM completions WHERE habit_id=? ORDER BY date", (habit_id,)
+            )
+        ]
+
+    def add(self, conn: sqlite3.Connection, habit_id: int, ordinals: Iterable[int]) -> int:
+        """Добавить выполнения, возвращает число действительно добавленных"""
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO completions (habit_id, date) VALUES (?, ?)",
+            [(habit_id, datetime.date.fromordinal(o).isoformat()) for o in sorted(ordinals)]
+        )
+        return max(cursor.rowcount, 0)
+
+    def remove(self, conn: sqlite3.Connection, habit_id: int, ordinals: Iterable[int]) -> int:
+        cursor = conn.executemany(
+            "DELETE FROM completions WHERE habit_id=? AND date=?",
+            [(habit_id, datetime.date.fromordinal(o).isoformat()) for o in ordinals]
+        )
+        return max(cursor.rowcount, 0)
+
+    def existing(self, conn: sqlite3.Connection, habit_ids: List[int], first: int, last: int,
+                 chunk_size: int) -> Set[Tuple[int, int]]:
+        """(habit_id, номер дня) уже записанных выполнений привычек за [first, last]"""
+        found = set()
+        for chunk in _chunks(habit_ids, chunk_size):
+            placeholders = ", ".join("?" * len(chunk))
+            for habit_id, date in conn.execute(
+                f"SELECT habit_id, date FROM completions "
+                f"WHERE habit_id IN ({placeholders}) AND date BETWEEN ? AND ?",
+                [*chunk, datetime.date.fromordinal(first).isoformat(),
+                 datetime.date.fromordinal(last).isoformat()]
+            ):
+                found.add((habit_id, datetime.date.fromisoformat(date).toordinal()))
+        return found
+
+    def bulk_insert(self, conn: sqlite3.Connection,
+                    completions: Iterable[Tuple[int, List[int]]], chunk_size: int = 450) -> int:
+        """Выполнения многих привычек одним executemany: [(habit_id, номера дней)].
+        Возвращает число добавленных выполнений.
+        """
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO completions (habit_id, date) VALUES (?, ?)",
+            ((habit_id, datetime.date.fromordinal(o).isoformat())
+             for habit_id, ordinals in completions for o in ordinals)
+        )
+        return max(cursor.rowcount, 0)
+
+    def aggregates_for(self, conn: sqlite3.Connection, habit_ids: List[int],
+                       chunk_size: int) -> Dict[int, Tuple[int, int, int, int]]:
+        """{habit_id: (число выполнений, серия до последнего выполнения,
+        самая длинная серия, номер дня последнего выполнения)}
+        для привычек, у которых есть выполнения; один запрос на chunk_size id.
+        """
+        aggregates = {}
+        for chunk in _chunks(habit_ids, chunk_size):
+            placeholders = ", ".join("?" * len(chunk))
+            # Серии - "острова" подряд идущих дат: у дат одной серии
+            # разность julianday(date) - ROW_NUMBER() одинакова
+            rows = conn.execute(f"""
+                WITH islands AS (
+                    SELECT habit_id, MAX(date) AS run_end, COUNT(*) AS run_length
+                    FROM (
+                        SELECT habit_id, date,
+                               julianday(date) - ROW_NUMBER() OVER (
+                                   PARTITION BY habit_id ORDER BY date
+                               ) AS grp
+                        FROM completions
+                        WHERE habit_id IN ({placeholders})
+                    )
+                    GROUP BY habit_id, grp
+                ), ranked AS (
+                    SELECT habit_id, run_end, run_length,
+                           MAX(run_end) OVER (PARTITION BY habit_id) AS last_date
+                    FROM islands
+                )
+                SELECT habit_id,
+                       SUM(run_length),
+                       MAX(CASE WHEN run_end = last_date THEN run_length ELSE 0 END),
+                       MAX(run_length),
+                       MAX(last_date)
+                FROM ranked
+                GROUP BY habit_id
+            """, chunk)
+            for habit_id, count, current, longest, last_date in rows:
+                last = datetime.date.fromisoformat(last_date).toordinal()
+                aggregates[habit_id] = (count, current, longest, last)
+        return aggregates
+
+
+class BitmapCompletionStore:
+    name = STORAGE_BITMAP
+    table = "completion_bitmaps"
+
+    def load(self, conn: sqlite3.Connection, first_id: Optional[int] = None,
+             last_id: Optional[int] = None,
+             since: Optional[datetime.date] = None) -> Dict[int, List[int]]:
+        conditions, params = [], []
+        if first_id is not None:
+            conditions.append("habit_id >= ?")
+            params.append(first_id)
+        if last_id is not None:
+            conditions.append("habit_id <= ?")
+            params.append(last_id)
+        if since is not None:
+            conditions.append("year >= ?")
+            params.append(since.year)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        since_ordinal = since.toordinal() if since is not None else None
+
+        completions: Dict[int, List[int]] = defaultdict(list)
+        for habit_id, year, bits in conn.execute(
+            f"SELECT habit_id, year, bits FROM completion_bitmaps{where} ORDER BY habit_id, year",
+            params
+        ):
+            ordinals = _decode(year, bits)
+            if since_ordinal is not None and year == since.year:
+                ordinals = [o for o in ordinals if o >= since_ordinal]
+            completions[habit_id].extend(ordinals)
+        return completions
+
+    def load_one(self, conn: sqlite3.Connection, habit_id: int) -> List[int]:
+        ordinals = []
+        for year, bits in conn.execute(
+            "SELECT year, bits FROM completion_bitmaps WHERE habit_id=? ORDER BY year",
+            (habit_id,)
+        ):
+            ordinals.extend(_decode(year, bits))
+        return ordinals
+
+    def _update(self, conn: sqlite3.Connection, habit_id: int,
+                ordinals: Iterable[int], set_bits: bool) -> int:
+        changed = 0
+        for year, year_ordinals in _group_by_year(ordinals).items():
+            row = conn.execute(
+                "SELECT bits FROM completion_bitmaps WHERE habit_id=? AND year=?",
+                (habit_id, year)
+            ).fetchone()
+            if row is None and not set_bits:
+                continue
+            before = int.from_bytes(row[0], "little") if row else 0
+            mask = _mask(year, year_ordinals)
+            after = before | mask if set_bits else before & ~mask
+            if after == before:
+                continue
+            changed += abs(after.bit_count() - before.bit_count())
+
+            if after:
+                conn.execute(
+                    "INSERT INTO completion_bitmaps (habit_id, year, bits) VALUES (?, ?, ?) "
+                    "ON CONFLICT (habit_id, year) DO UPDATE SET bits=excluded.bits",
+                    (habit_id, year, after.to_bytes(YEAR_BYTES, "little"))
+                )
+            else:
+                conn.execute(
+                    "DELETE FROM completion_bitmaps WHERE habit_id=? AND year=?",
+                    (habit_id, year)
+                )
+        return changed
+
+    def add(self, conn: sqlite3.Connection, habit_id: int, ordinals: Iterable[int]) -> int:
+        return self._update(conn, habit_id, ordinals, set_bits=True)
+
+    def remove(self, conn: sqlite3.Connection, habit_id: int, ordinals: Iterable[int]) -> int:
+        return self._update(conn, habit_id, ordinals, set_bits=False)
+
+    def existing(self, conn: sqlite3.Connection, habit_ids: List[int], first: int, last: int,
+                 chunk_size: int) -> Set[Tuple[int, int]]:
+        found = set()
+        first_year = datetime.date.fromordinal(first).year
+        last_year = datetime.date.fromordinal(last).year
+        for chunk in _chunks(habit_ids, chunk_size):
+            placeholders = ", ".join("?" * len(chunk))
+            for habit_id, year, bits in conn.execute(
+                f"SELECT habit_id, year, bits FROM completion_bitmaps "
+                f"WHERE habit_id IN ({placeholders}) AND year BETWEEN ? AND ?",
+                [*chunk, first_year, last_year]
+            ):
+                found.update((habit_id, o) for o in _decode(year, bits) if first <= o <= last)
+        return found
+
+    def bulk_insert(self, conn: sqlite3.Connection,
+                    completions: Iterable[Tuple[int, List[int]]], chunk_size: int = 450) -> int:
+        """Маски всех пар (привычка, год) объединяются с уже записанными
+        картами и пишутся одним executemany
+        """
+        masks: Dict[Tuple[int, int], int] = defaultdict(int)
+        for habit_id, ordinals in completions:
+            for year, year_ordinals in _group_by_year(ordinals).items():
+                masks[habit_id, year] |= _mask(year, year_ordinals)
+        if not masks:
+            return 0
+
+        before: Dict[Tuple[int, int], int] = {}
+        for chunk in _chunks(sorted({habit_id for habit_id, _ in masks}), chunk_size):
+            placeholders = ", ".join("?" * len(chunk))
+            for habit_id, year, bits in conn.execute(
+                f"SELECT habit_id, year, bits FROM completion_bitmaps "
+                f"WHERE habit_id IN ({placeholders})", chunk
+            ):
+                if (habit_id, year) in masks:
+                    before[habit_id, year] = int.from_bytes(bits, "little")
+
+        rows, inserted = [], 0
+        for (habit_id, year), mask in masks.items():
+            old = before.get((habit_id, year), 0)
+            new = old | mask
+            if new != old:
+                inserted += new.bit_count() - old.bit_count()
+                rows.append((habit_id, year, new.to_bytes(YEAR_BYTES, "little")))
+        conn.executemany(
+            "INSERT INTO completion_bitmaps (habit_id, year, bits) VALUES (?, ?, ?) "
+            "ON CONFLICT (habit_id, year) DO UPDATE SET bits=excluded.bits", rows
+        )
+        return inserted
+
+    def aggregates_for(self, conn: sqlite3.Connection, habit_ids: List[int],
+                       chunk_size: int) -> Dict[int, Tuple[int, int, int, int]]:
+        completions: Dict[int, List[int]] = defaultdict(list)
+        for chunk in _chunks(habit_ids, chunk_size):
+            placeholders = ", ".join("?" * len(chunk))
+            for habit_id, year, bits in conn.execute(
+                f"SELECT habit_id, year, bits FROM completion_bitmaps "
+                f"WHERE habit_id IN ({placeholders}) ORDER BY habit_id, year",
+                chunk
+            ):
+                completions[habit_id].extend(_decode(year, bits))
+        return {
+            habit_id: aggregate(ordinals)
+            for habit_id, ordinals in completions.items() if ordinals
+        }
+
+
+STORES = {
+    STORAGE_ROWS: RowCompletionStore,
+    STORAGE_BITMAP: BitmapCompletionStore,
+}
+
+def get_store(name: str):
+    try:
+        return STORES[name]()
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный способ хранения выполнений: {name}. Доступны: {', '.join(STORES)}"
+        )
@@ -0,0 +1,440 @@
+"""
+Экспорт и импорт привычек с выполнениями.
+
+Форматы:
+csv      - строка на привычку, даты выполнений через пробел в колонке completions;
+jsonl    - JSON-объект на привычку в каждой строке;
+columnar - двоичный колоночный формат: группы строк по EXPORT_BATCH привычек,
+           внутри группы столбцы подряд, номера дней выполнений хранятся
+           разностями, группа сжата zlib.
+
+Экспорт читает привычки страницами и отдает байты по странице, импорт
+разбирает файл генератором и пишет пачками через executemany в одной
+транзакции, поэтому память не зависит от размера файла.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from core.models import CompletionSet, Habit, HabitStatus
+from core.storage import aggregate
+
+FORMATS = ("csv", "jsonl", "columnar")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "columnar": "application/octet-stream",
+}
+
+EXTENSIONS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".habits": "columnar",
+}
+
+# Привычек на страницу экспорта и на пачку executemany при импорте
+EXPORT_BATCH = 500
+IMPORT_BATCH = 1000
+
+CSV_COLUMNS = ["id", "name", "description", "target_days", "creation_date", "status", "completions"]
+
+# Заголовок колоночного файла; коды статусов - индексы в COLUMNAR_STATUSES
+COLUMNAR_MAGIC = b"HABITCOL"
+COLUMNAR_VERSION = 1
+COLUMNAR_STATUSES = ["active", "completed", "archived"]
+# Больше стольких байт одна группа после распаковки не занимает
+MAX_COLUMNAR_BYTES = 64 * 1024 * 1024
+
+def format_for(path: str) -> str:
+    """Формат по расширению файла"""
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return EXTENSIONS[extension]
+    except KeyError:
+        raise ValueError(
+            f"Не удалось определить формат по расширению '{extension}'. "
+            f"Доступны: {', '.join(EXTENSIONS)}"
+        )
+
+def _check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}. Доступны: {', '.join(FORMATS)}")
+
+def iter_pages(db, batch_size: int = EXPORT_BATCH) -> Iterator[List[Habit]]:
+    """Привычки с выполнениями страницами по batch_size в порядке id"""
+    after = None
+    while True:
+        habits = db.load_habits(after=after, limit=batch_size)
+        if not habits:
+            return
+        yield habits
+        after = habits[-1].id
+
+def _record(habit: Habit) -> dict:
+    return {
+        "id": habit.id,
+        "name": habit.name,
+        "description": habit.description,
+        "target_days": habit.target_days,
+        "creation_date": habit.creation_date.isoformat(),
+        "status": habit.status.value,
+        "completions": habit.completions.isoformats()
+    }
+
+def _csv_page(habits: List[Habit]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for habit in habits:
+        writer.writerow([
+            habit.id, habit.name, habit.description, habit.target_days,
+            habit.creation_date.isoformat(), habit.status.value,
+            " ".join(habit.completions.isoformats())
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+def _jsonl_page(habits: List[Habit]) -> bytes:
+    return "".join(
+        json.dumps(_record(habit), ensure_ascii=False) + "\n" for habit in habits
+    ).encode("utf-8")
+
+def _column_bytes(data: bytes) -> bytes:
+    """Столбец в файле: длина в байтах и сами данные"""
+    return struct.pack("<I", len(data)) + data
+
+def _column(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return _column_bytes(values.tobytes())
+
+def _text_column(values: List[str]) -> bytes:
+    """Строки - два столбца: длины в байтах и склеенный UTF-8"""
+    encoded = [value.encode("utf-8") for value in values]
+    return _column(array("i", map(len, encoded))) + _column_bytes(b"".join(encoded))
+
+def _columnar_page(habits: List[Habit]) -> bytes:
+    """Группа строк: число привычек, размер и сжатые столбцы"""
+    counts, deltas = array("i"), array("i")
+    for habit in habits:
+        ordinals = habit.completions.ordinals
+        counts.append(len(ordinals))
+        deltas.extend(b - a for a, b in zip([0] + ordinals, ordinals))
+    payload = zlib.compress(b"".join([
+        _column(array("i", (habit.id for habit in habits))),
+        _column(array("i", (habit.target_days for habit in habits))),
+        _column(array("i", (habit.creation_date.toordinal() for habit in habits))),
+        _column_bytes(bytes(COLUMNAR_STATUSES.index(habit.status.value) for habit in habits)),
+        _text_column([habit.name for habit in habits]),
+        _text_column([habit.description for habit in habits]),
+        _column(counts),
+        _column(deltas),
+    ]))
+    return struct.pack("<II", len(habits), len(payload)) + payload
+
+# (начало файла, кодирование страницы привычек, конец файла)
+ENCODERS = {
+    "csv": ((",".join(CSV_COLUMNS) + "\n").encode("utf-8"), _csv_page, b""),
+    "jsonl": (b"", _jsonl_page, b""),
+    # Пустая группа - конец колоночного файла
+    "columnar": (COLUMNAR_MAGIC + struct.pack("<H", COLUMNAR_VERSION),
+                 _columnar_page, struct.pack("<II", 0, 0)),
+}
+
+def encoder(fmt: str):
+    """(начало файла, функция страница -> байты, конец файла) для формата fmt.
+    Нужен там, где страницы читаются не генератором, например асинхронно.
+    """
+    _check_format(fmt)
+    return ENCODERS[fmt]
+
+def encode_pages(pages: Iterable[List[Habit]], fmt: str) -> Iterator[bytes]:
+    header, encode_page, footer = encoder(fmt)
+    if header:
+        yield header
+    for page in pages:
+        yield encode_page(page)
+    if footer:
+        yield footer
+
+def export_stream(db, fmt: str, batch_size: int = EXPORT_BATCH) -> Iterator[bytes]:
+    """Все привычки в формате fmt кусками байтов, по куску на страницу"""
+    _check_format(fmt)
+    return encode_pages(iter_pages(db, batch_size), fmt)
+
+def export_file(db, path: str, fmt: Optional[str] = None,
+                batch_size: int = EXPORT_BATCH) -> dict:
+    """Выгрузить все привычки в файл; формат по умолчанию - по расширению"""
+    fmt = fmt or format_for(path)
+    _check_format(fmt)
+    report = {"habits": 0, "completions": 0, "bytes": 0}
+    
+    def counted(pages):
+        for page in pages:
+            report["habits"] += len(page)
+            report["completions"] += sum(len(habit.completions) for habit in page)
+            yield page
+    
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        for chunk in encode_pages(counted(iter_pages(db, batch_size)), fmt):
+            f.write(chunk)
+            report["bytes"] += len(chunk)
+    report["seconds"] = time.perf_counter() - start
+    report["output"] = path
+    return report
+
+def _parse_date(value: str, where: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: некорректная дата '{value}'")
+
+def _habit_from_record(record: dict, where: str) -> Habit:
+    if not isinstance(record, dict):
+        raise ValueError(f"{where}: ожидается объект привычки")
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError(f"{where}: не указано название привычки")
+    try:
+        habit_id = int(record["id"]) if record.get("id") not in (None, "") else None
+        target_days = int(record["target_days"]) if record.get("target_days") not in (None, "") else 7
+        status = HabitStatus(record.get("status") or "active")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{where}: {e}")
+    if target_days < 0:
+        raise ValueError(f"{where}: target_days не может быть отрицательным")
+    
+    completions = record.get("completions") or []
+    if isinstance(completions, str):
+        completions = completions.split()
+    creation_date = record.get("creation_date")
+    return Habit(
+        id=habit_id,
+        name=name,
+        description=record.get("description") or "",
+        target_days=target_days,
+        creation_date=_parse_date(creation_date, where) if creation_date else datetime.date.today(),
+        status=status,
+        completions=CompletionSet.from_ordinals(
+            _parse_date(date, where).toordinal() for date in completions
+        )
+    )
+
+def _text(stream: BinaryIO) -> io.TextIOWrapper:
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+def _read_csv(stream: BinaryIO) -> Iterator[Habit]:
+    text = _text(stream)
+    try:
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or "name" not in reader.fieldnames:
+            raise ValueError("CSV: в заголовке нет колонки name")
+        for record in reader:
+            yield _habit_from_record(record, f"Строка {reader.line_num}")
+    finally:
+        text.detach()
+
+def _read_jsonl(stream: BinaryIO) -> Iterator[Habit]:
+    text = _text(stream)
+    try:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Строка {number}: некорректный JSON: {e}")
+            yield _habit_from_record(record, f"Строка {number}")
+    finally:
+        text.detach()
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Колоночный файл обрезан")
+    return data
+
+def _decompress(data: bytes, group: int) -> bytes:
+    """Распаковать группу, не выделяя больше MAX_COLUMNAR_BYTES"""
+    decompressor = zlib.decompressobj()
+    try:
+        payload = decompressor.decompress(data, MAX_COLUMNAR_BYTES)
+    except zlib.error:
+        raise ValueError(f"Группа {group}: поврежденные данные")
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Группа {group}: больше {MAX_COLUMNAR_BYTES} байт после распаковки")
+    if decompressor.unused_data or not decompressor.eof:
+        raise ValueError(f"Группа {group}: поврежденные данные")
+    return payload
+
+def _read_columns(payload: bytes) -> Iterator[bytes]:
+    position = 0
+    while position < len(payload):
+        size, = struct.unpack_from("<I", payload, position)
+        position += 4
+        yield payload[position:position + size]
+        position += size
+
+def _int_column(data: bytes) -> array:
+    values = array("i")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _split_text(lengths: array, data: bytes) -> List[str]:
+    values, position = [], 0
+    for length in lengths:
+        values.append(data[position:position + length].decode("utf-8"))
+        position += length
+    return values
+
+def _read_columnar(stream: BinaryIO) -> Iterator[Habit]:
+    header = stream.read(len(COLUMNAR_MAGIC) + 2)
+    if header[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+        raise ValueError("Файл не в колоночном формате привычек")
+    version, = struct.unpack("<H", header[len(COLUMNAR_MAGIC):])
+    if version != COLUMNAR_VERSION:
+        raise ValueError(f"Неподдерживаемая версия колоночного формата: {version}")
+    
+    group = 0
+    while True:
+        rows, size = struct.unpack("<II", _read_exact(stream, 8))
+        if rows == 0:
+            return
+        group += 1
+        payload = _decompress(_read_exact(stream, size), group)
+        try:
+            columns = list(_read_columns(payload))
+            (ids, targets, created, statuses, name_lengths, names,
+             description_lengths, descriptions, counts, deltas) = columns
+        except (struct.error, ValueError):
+            raise ValueError(f"Группа {group}: поврежденные данные")
+        
+        ids, targets, created = _int_column(ids), _int_column(targets), _int_column(created)
+        names = _split_text(_int_column(name_lengths), names)
+        descriptions = _split_text(_int_column(description_lengths), descriptions)
+        counts, deltas = _int_column(counts), _int_column(deltas)
+        if not all(len(column) == rows for column in
+                   (ids, targets, created, statuses, names, descriptions, counts)):
+            raise ValueError(f"Группа {group}: столбцы разной длины")
+        if max(statuses) >= len(COLUMNAR_STATUSES):
+            raise ValueError(f"Группа {group}: неизвестный код статуса")
+        if min(targets) < 0:
+            raise ValueError(f"Группа {group}: target_days не может быть отрицательным")
+        
+        position = 0
+        for i in range(rows):
+            ordinals, ordinal = [], 0
+            for delta in deltas[position:position + counts[i]]:
+                ordinal += delta
+                ordinals.append(ordinal)
+            position += counts[i]
+            yield Habit(
+                id=ids[i],
+                name=names[i],
+                description=descriptions[i],
+                target_days=targets[i],
+                creation_date=datetime.date.fromordinal(created[i]),
+                status=HabitStatus(COLUMNAR_STATUSES[statuses[i]]),
+                completions=CompletionSet.from_ordinals(ordinals)
+            )
+
+READERS = {
+    "csv": _read_csv,
+    "jsonl": _read_jsonl,
+    "columnar": _read_columnar,
+}
+
+def read_habits(stream: BinaryIO, fmt: str) -> Iterator[Habit]:
+    """Разобрать привычки из двоичного потока; ошибки формата - ValueError"""
+    _check_format(fmt)
+    return READERS[fmt](stream)
+
+def import_habits(db, habits: Iterable[Habit], replace: bool = False,
+                  batch_size: int = IMPORT_BATCH) -> dict:
+    """Записать привычки с выполнениями одной транзакцией.
+    
+    replace=False добавляет привычки с новыми id, replace=True удаляет
+    все привычки и сохраняет id из файла. Счетчики и серии считаются
+    сразу по выполнениям. При любой ошибке БД остается без изменений.
+    """
+    start = time.perf_counter()
+    report = {"habits": 0, "completions": 0}
+    with db.pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Новые id не повторяют id удаленных привычек, а при замене
+        # revision растет, чтобы версии и кеши по (id, revision) обновились
+        next_id = conn.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='habits'), 0), "
+            "COALESCE((SELECT MAX(id) FROM habits), 0)) + 1"
+        ).fetchone()[0]
+        revision = 0
+        if replace:
+            revision = conn.execute(
+                "SELECT COALESCE(SUM(revision), 0) + 1 FROM habits"
+            ).fetchone()[0]
+            conn.execute("DELETE FROM habits")
+        
+        rows, completions = [], []
+        
+        def flush():
+            conn.executemany(
+                "INSERT INTO habits (id, name, description, target_days, creation_date, status, "
+                "completion_count, current_streak, longest_streak, last_completed, revision) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            report["completions"] += db.store.bulk_insert(conn, completions)
+            report["habits"] += len(rows)
+            rows.clear()
+            completions.clear()
+        
+        try:
+            for habit in habits:
+                if replace and habit.id is not None:
+                    habit_id = habit.id
+                else:
+                    habit_id = next_id
+                next_id = max(next_id, habit_id + 1)
+                
+                ordinals = habit.completions.ordinals
+                count, current, longest, last = aggregate(ordinals) if ordinals else (0, 0, 0, None)
+                rows.append((
+                    habit_id, habit.name, habit.description, habit.target_days,
+                    habit.creation_date.isoformat(), habit.status.value, count, current, longest,
+                    datetime.date.fromordinal(last).isoformat() if last else None, revision
+                ))
+                if ordinals:
+                    completions.append((habit_id, ordinals))
+                if len(rows) >= batch_size:
+                    flush()
+            if rows:
+                flush()
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Импорт отменен: {e}")
+    db.notify_change()
+    
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+def import_stream(db, stream: BinaryIO, fmt: str, replace: bool = False) -> dict:
+    return import_habits(db, read_habits(stream, fmt), replace=replace)
+
+def import_file(db, path: str, fmt: Optional[str] = None, replace: bool = False) -> dict:
+    """Загрузить привычки из файла; формат по умолчанию - по расширению"""
+    fmt = fmt or format_for(path)
+    with open(path, "rb") as f:
+        report = import_stream(db, f, fmt, replace=replace)
+    report["input"] = path
+    return report
@@ -1,3 +1,4 @@
+import os
 import sys
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QTableWidget, QTableWidgetItem,
@@ -5,14 +6,25 @@ from PySide6.QtWidgets import (
     QMenuBar, QMenu, QMessageBox, QHBoxLayout, QTextEdit,
     QDialog, QDialogButtonBox, QDateEdit, QSpinBox, QComboBox, QFileDialog
 )
-from PySide6.QtCore import Qt, QDate
+from PySide6.QtCore import Qt, QDate, QThread, Signal
 from PySide6.QtGui import QAction
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
 import datetime
 from core.database import Database
 from core.models import Habit, HabitStatus
 from core.logger import logger, log_habit_created, log_habit_completed, log_habit_deleted
+from core.charts import export_charts
+from core.transfer import export_file, import_file
 from core.plotter import HabitPlotter
 
+# Фильтры диалога выбора файла и расширения форматов core.transfer
+DATA_FILE_EXTENSIONS = {
+    "JSON Lines (*.jsonl)": ".jsonl",
+    "CSV (*.csv)": ".csv",
+    "Колоночный формат (*.habits)": ".habits",
+}
+DATA_FILE_FILTERS = ";;".join(DATA_FILE_EXTENSIONS)
+
 class AddHabitDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -58,11 +70,60 @@ class AddHabitDialog(QDialog):
             "target_days": self.target_input.value()
         }
 
+class ExportChartsThread(QThread):
+    """Экспорт графиков в фоне: окно не блокируется, пока работают процессы"""
+    progress = Signal(int)
+    done = Signal(dict)
+    failed = Signal(str)
+    
+    def __init__(self, db: Database, output: str, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.output = output
+    
+    def run(self):
+        try:
+            self.done.emit(export_charts(self.db, self.output, progress=self.progress.emit))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class TransferThread(QThread):
+    """Экспорт или импорт данных в фоне: func(*args) возвращает отчет"""
+    done = Signal(dict)
+    failed = Signal(str)
+    
+    def __init__(self, func, *args, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self.args = args
+    
+    def run(self):
+        try:
+            self.done.emit(self.func(*self.args))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class ChartDialog(QDialog):
+    """Окно с графиком matplotlib, встроенным через FigureCanvasQTAgg"""
+    
+    def __init__(self, fig, title: str, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.canvas = FigureCanvasQTAgg(fig)
+        layout = QVBoxLayout()
+        layout.addWidget(NavigationToolbar2QT(self.canvas, self))
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        self.resize(1000, 500)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = Database()
-        self.plotter = HabitPlotter(self.db)
+        # Графики прогресса и сравнения строятся один раз и обновляются на месте
+        self.plotter = HabitPlotter(self.db, persistent=True)
+        self.chart_dialogs = {}
+        self.progress_habit_id = None
         self.init_ui()
         self.load_habits()
     
@@ -124,10 +185,18 @@ class MainWindow(QMainWindow):
         # Меню Файл
         file_menu = menubar.addMenu("Файл")
         
-        export_action = QAction("Экспорт данных", self)
+        export_action = QAction("Экспорт данных...", self)
         export_action.triggered.connect(self.export_data)
         file_menu.addAction(export_action)
         
+        import_action = QAction("Импорт данных...", self)
+        import_action.triggered.connect(self.import_data)
+        file_menu.addAction(import_action)
+        
+        export_charts_action = QAction("Экспорт графиков...", self)
+        export_charts_action.triggered.connect(self.export_charts)
+        file_menu.addAction(export_charts_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction("Выход", self)
@@ -141,6 +210,10 @@ class MainWindow(QMainWindow):
         refresh_action.triggered.connect(self.load_habits)
         view_menu.addAction(refresh_action)
         
+        heatmap_action = QAction("Календарь выполнений", self)
+        heatmap_action.triggered.connect(self.show_heatmap)
+        view_menu.addAction(heatmap_action)
+        
         # Меню Помощь
         help_menu = menubar.addMenu("Помощь")
         
@@ -149,18 +222,19 @@ class MainWindow(QMainWindow):
         help_menu.addAction(about_action)
     
     def load_habits(self):
-        habits = self.db.load_habits()
+        # Таблице нужны только счетчики, хранящиеся в строке привычки
+        habits = self.db.cache.habit_summaries()
         self.table.setRowCount(len(habits))
         
         for i, habit in enumerate(habits):
-            self.table.setItem(i, 0, QTableWidgetItem(str(habit.id or "")))
-            self.table.setItem(i, 1, QTableWidgetItem(habit.name))
-            self.table.setItem(i, 2, QTableWidgetItem(habit.description))
-            self.table.setItem(i, 3, QTableWidgetItem(str(habit.target_days)))
-            self.table.setItem(i, 4, QTableWidgetItem(str(len(habit.completions))))
+            self.table.setItem(i, 0, QTableWidgetItem(str(habit["id"])))
+            self.table.setItem(i, 1, QTableWidgetItem(habit["name"]))
+            self.table.setItem(i, 2, QTableWidgetItem(habit["description"]))
+            self.table.setItem(i, 3, QTableWidgetItem(str(habit["target_days"])))
+            self.table.setItem(i, 4, QTableWidgetItem(str(habit["completions_count"])))
             
             # Прогресс
-            progress = habit.get_completion_rate()
+            progress = habit["completion_rate"]
             progress_item = QTableWidgetItem(f"{progress:.1%}")
             if progress >= 1.0:
                 progress_item.setBackground(Qt.green)
@@ -169,8 +243,9 @@ class MainWindow(QMainWindow):
             self.table.setItem(i, 5, progress_item)
             
             # Серия
-            streak_item = QTableWidgetItem(str(habit.get_streak()))
-            if habit.get_streak() > 0:
+            streak = habit["streak"]
+            streak_item = QTableWidgetItem(str(streak))
+            if streak > 0:
                 streak_item.setBackground(Qt.green)
             self.table.setItem(i, 6, streak_item)
         
@@ -191,7 +266,7 @@ class MainWindow(QMainWindow):
             )
             
             try:
-                self.db.save_habit(habit)
+                self.db.cache.save_habit(habit)
                 log_habit_created(habit.name)
                 self.log_text.append(f"[{datetime.datetime.now()}] Добавлена привычка: {habit.name}")
                 self.load_habits()
@@ -206,20 +281,20 @@ class MainWindow(QMainWindow):
             return
         
         habit_id = int(self.table.item(selected_row, 0).text())
-        habits = self.db.load_habits()
-        
-        for habit in habits:
-            if habit.id == habit_id:
-                success = habit.mark_completed()
-                if success:
-                    self.db.save_habit(habit)
-                    log_habit_completed(habit.name)
-                    self.log_text.append(f"[{datetime.datetime.now()}] Привычка '{habit.name}' выполнена")
-                    self.load_habits()
-                    QMessageBox.information(self, "Успех", f"Привычка '{habit.name}' отмечена как выполненная")
-                else:
-                    QMessageBox.information(self, "Информация", "Эта привычка уже была отмечена сегодня")
-                break
+        habit = self.db.cache.get_habit(habit_id)
+        if habit is None:
+            return
+        
+        success = habit.mark_completed()
+        if success:
+            self.db.cache.save_habit(habit)
+            log_habit_completed(habit.name)
+            self.log_text.append(f"[{datetime.datetime.now()}] Привычка '{habit.name}' выполнена")
+            self.load_habits()
+            self.refresh_charts(habit)
+            QMessageBox.information(self, "Успех", f"Привычка '{habit.name}' отмечена как выполненная")
+        else:
+            QMessageBox.information(self, "Информация", "Эта привычка уже была отмечена сегодня")
     
     def delete_habit(self):
         selected_row = self.table.currentRow()
@@ -238,7 +313,7 @@ class MainWindow(QMainWindow):
         
         if reply == QMessageBox.Yes:
             try:
-                self.db.delete_habit(habit_id)
+                self.db.cache.delete_habit(habit_id)
                 log_habit_deleted(habit_name)
                 self.log_text.append(f"[{datetime.datetime.now()}] Удалена привычка: {habit_name}")
                 self.load_habits()
@@ -246,49 +321,160 @@ class MainWindow(QMainWindow):
                 logger.error(f"Ошибка при удалении привычки: {e}")
                 QMessageBox.critical(self, "Ошибка", f"Не удалось удалить привычку: {str(e)}")
     
+    def show_chart(self, fig, title: str):
+        """Показать фигуру в окне. Окно постоянной фигуры плоттера
+        переиспользуется, разовые окна удаляются при закрытии
+        """
+        dialog = self.chart_dialogs.get(id(fig))
+        if dialog is None:
+            dialog = ChartDialog(fig, title, self)
+            if fig in (self.plotter.progress_figure, self.plotter.totals_figure):
+                self.chart_dialogs[id(fig)] = dialog
+                self.plotter.attach_canvas(fig)
+            else:
+                dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.setWindowTitle(title)
+        dialog.show()
+        dialog.raise_()
+    
+    def refresh_charts(self, habit: Habit):
+        """Обновить открытые графики после изменения привычки"""
+        progress = self.chart_dialogs.get(id(self.plotter.progress_figure))
+        if progress is not None and progress.isVisible() and self.progress_habit_id == habit.id:
+            self.plotter.plot_habit_progress(habit)
+        totals = self.chart_dialogs.get(id(self.plotter.totals_figure))
+        if totals is not None and totals.isVisible():
+            self.plot_totals()
+    
+    def plot_totals(self):
+        habits = self.db.cache.habit_summaries()
+        return self.plotter.plot_habit_totals(
+            [h["name"] for h in habits],
+            [h["completions_count"] for h in habits],
+            [h["target_days"] for h in habits]
+        )
+    
     def show_plots(self):
-        habits = self.db.load_habits()
-        if not habits:
+        selected_row = self.table.currentRow()
+        if selected_row >= 0:
+            # График для выбранной привычки
+            habit_id = int(self.table.item(selected_row, 0).text())
+            habit = self.db.cache.get_habit(habit_id)
+            if habit is not None:
+                self.progress_habit_id = habit.id
+                self.show_chart(self.plotter.plot_habit_progress(habit), f"Прогресс: {habit.name}")
+            return
+        
+        if self.table.rowCount() == 0:
             QMessageBox.information(self, "Информация", "Нет привычек для отображения графиков")
             return
         
+        # График для всех привычек: хватает счетчиков из строк привычек
+        self.show_chart(self.plot_totals(), "Сравнение привычек")
+    
+    def show_heatmap(self):
         selected_row = self.table.currentRow()
         if selected_row >= 0:
-            # График для выбранной привычки
+            # Календарь выбранной привычки
             habit_id = int(self.table.item(selected_row, 0).text())
-            for habit in habits:
-                if habit.id == habit_id:
-                    fig = self.plotter.plot_habit_progress(habit)
-                    fig.show()
-                    break
-        else:
-            # График для всех привычек
-            fig = self.plotter.plot_all_habits(habits)
-            fig.show()
+            habit = self.db.cache.get_habit(habit_id)
+            if habit is not None:
+                self.show_chart(self.plotter.plot_habit_heatmap(habit), f"Календарь: {habit.name}")
+            return
+        
+        # Матрица всех привычек за год
+        self.show_chart(self.plotter.plot_habits_heatmap(), "Календарь выполнений")
     
     def export_data(self):
-        habits = self.db.load_habits()
-        if not habits:
+        if self.table.rowCount() == 0:
             QMessageBox.information(self, "Информация", "Нет данных для экспорта")
             return
         
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "Экспорт данных", "", "CSV Files (*.csv);;All Files (*)"
+        filename, selected = QFileDialog.getSaveFileName(
+            self, "Экспорт данных", "", DATA_FILE_FILTERS
         )
+        if not filename:
+            return
+        if not os.path.splitext(filename)[1]:
+            filename += DATA_FILE_EXTENSIONS.get(selected, ".jsonl")
+        
+        self.transfer_thread = TransferThread(export_file, self.db, filename, parent=self)
+        self.transfer_thread.done.connect(self.on_data_exported)
+        self.transfer_thread.failed.connect(self.on_transfer_failed)
+        self.statusBar().showMessage("Экспорт данных...")
+        self.transfer_thread.start()
+    
+    def import_data(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Импорт данных", "", DATA_FILE_FILTERS
+        )
+        if not filename:
+            return
         
-        if filename:
-            try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write("Название;Описание;Цель;Выполнено;Прогресс;Серия\n")
-                    for habit in habits:
-                        progress = habit.get_completion_rate()
-                        f.write(f"{habit.name};{habit.description};{habit.target_days};"
-                               f"{len(habit.completions)};{progress:.1%};{habit.get_streak()}\n")
-                
-                QMessageBox.information(self, "Успех", f"Данные экспортированы в {filename}")
-            except Exception as e:
-                logger.error(f"Ошибка при экспорте данных: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать данные: {str(e)}")
+        answer = QMessageBox.question(
+            self, "Импорт данных",
+            "Заменить все привычки данными из файла?\n\n"
+            "Да - заменить, Нет - добавить к существующим",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No
+        )
+        if answer == QMessageBox.Cancel:
+            return
+        
+        self.transfer_thread = TransferThread(import_file, self.db, filename, None,
+                                              answer == QMessageBox.Yes, parent=self)
+        self.transfer_thread.done.connect(self.on_data_imported)
+        self.transfer_thread.failed.connect(self.on_transfer_failed)
+        self.statusBar().showMessage("Импорт данных...")
+        self.transfer_thread.start()
+    
+    def on_data_exported(self, report: dict):
+        self.statusBar().clearMessage()
+        message = (f"Экспортировано привычек: {report['habits']}, "
+                   f"выполнений: {report['completions']} -> {report['output']}")
+        self.log_text.append(f"[{datetime.datetime.now()}] {message}")
+        QMessageBox.information(self, "Успех", message)
+    
+    def on_data_imported(self, report: dict):
+        self.statusBar().clearMessage()
+        self.load_habits()
+        message = (f"Импортировано привычек: {report['habits']}, "
+                   f"выполнений: {report['completions']} из {report['input']}")
+        self.log_text.append(f"[{datetime.datetime.now()}] {message}")
+        QMessageBox.information(self, "Успех", message)
+    
+    def on_transfer_failed(self, error: str):
+        self.statusBar().clearMessage()
+        logger.error(f"Ошибка при экспорте/импорте данных: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось выполнить операцию: {error}")
+    
+    def export_charts(self):
+        if self.table.rowCount() == 0:
+            QMessageBox.information(self, "Информация", "Нет привычек для экспорта графиков")
+            return
+        
+        directory = QFileDialog.getExistingDirectory(self, "Каталог для графиков")
+        if not directory:
+            return
+        
+        self.export_thread = ExportChartsThread(self.db, directory, self)
+        self.export_thread.progress.connect(
+            lambda done: self.statusBar().showMessage(f"Экспорт графиков: {done}")
+        )
+        self.export_thread.done.connect(self.on_charts_exported)
+        self.export_thread.failed.connect(self.on_charts_export_failed)
+        self.export_thread.start()
+    
+    def on_charts_exported(self, report: dict):
+        self.statusBar().clearMessage()
+        message = (f"Графиков: {report['habits']} за {report['seconds']:.1f} с "
+                   f"({report['per_second']:.1f} в секунду) -> {report['output']}")
+        self.log_text.append(f"[{datetime.datetime.now()}] {message}")
+        QMessageBox.information(self, "Успех", message)
+    
+    def on_charts_export_failed(self, error: str):
+        self.statusBar().clearMessage()
+        logger.error(f"Ошибка при экспорте графиков: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать графики: {error}")
     
     def show_about(self):
         QMessageBox.about(self, "О программе",
@@ -87,13 +87,126 @@ def run_tests():
         print("pytest не установлен. Установите: pip install pytest")
         return 1
 
+def run_convert_storage(db_path: str, storage: str):
+    """Перевод хранения выполнений в другой формат (rows / bitmap)"""
+    import time
+    from core.database import Database
+    
+    if not os.path.exists(db_path):
+        print(f"Файл БД не найден: {db_path}")
+        return 1
+    
+    size_before = os.path.getsize(db_path)
+    db = Database(db_path)
+    source = db.storage
+    if source == storage:
+        print(f"Выполнения уже хранятся как '{storage}'")
+        db.close()
+        return 0
+    
+    start = time.perf_counter()
+    moved = db.convert_storage(storage)
+    elapsed = time.perf_counter() - start
+    db.close()
+    size_after = os.path.getsize(db_path)
+    
+    logger.info(f"Хранение выполнений переведено: {source} -> {storage}, перенесено {moved}")
+    print(f"✅ {source} -> {storage}: перенесено выполнений: {moved} за {elapsed:.2f} с")
+    print(f"   Размер БД: {size_before / 1024:.1f} КиБ -> {size_after / 1024:.1f} КиБ")
+    return 0
+
+def run_repair_stats(db_path: str):
+    """Пересчет кешированных счетчиков и серий привычек по выполнениям"""
+    from core.database import Database
+    
+    if not os.path.exists(db_path):
+        print(f"Файл БД не найден: {db_path}")
+        return 1
+    
+    db = Database(db_path)
+    fixed = db.recompute_aggregates()
+    db.close()
+    
+    logger.info(f"Пересчитаны счетчики привычек, исправлено: {fixed}")
+    print(f"✅ Счетчики и серии пересчитаны, исправлено привычек: {fixed}")
+    return 0
+
+def run_export_charts(db_path: str, output: str, fmt: str, dpi: int, workers=None):
+    """Графики прогресса всех привычек в каталог или один PDF"""
+    from core.charts import RENDER_WORKERS, export_charts
+    from core.database import Database
+    
+    if not os.path.exists(db_path):
+        print(f"Файл БД не найден: {db_path}")
+        return 1
+    
+    db = Database(db_path)
+    try:
+        report = export_charts(db, output, fmt=fmt, dpi=dpi, workers=workers or RENDER_WORKERS,
+                               progress=lambda done: print(f"\r   Готово: {done}", end="", flush=True))
+    finally:
+        db.close()
+    print()
+    
+    logger.info(f"Экспортированы графики: {report['habits']} в {output}")
+    print(f"✅ Графиков: {report['habits']} за {report['seconds']:.1f} с "
+          f"({report['per_second']:.1f} в секунду, процессов: {report['workers']}) -> {output}")
+    return 0
+
+def run_export_data(db_path: str, output: str, fmt=None):
+    """Выгрузка привычек с выполнениями в CSV, JSON Lines или колоночный файл"""
+    from core.database import Database
+    from core.transfer import export_file
+    
+    if not os.path.exists(db_path):
+        print(f"Файл БД не найден: {db_path}")
+        return 1
+    
+    db = Database(db_path)
+    try:
+        report = export_file(db, output, fmt)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        db.close()
+    
+    logger.info(f"Экспортировано привычек: {report['habits']} в {output}")
+    print(f"✅ Привычек: {report['habits']}, выполнений: {report['completions']}, "
+          f"{report['bytes'] / 1024:.1f} КиБ за {report['seconds']:.2f} с -> {output}")
+    return 0
+
+def run_import_data(db_path: str, source: str, fmt=None, replace: bool = False):
+    """Загрузка привычек из файла экспорта одной транзакцией"""
+    from core.database import Database
+    from core.transfer import import_file
+    
+    if not os.path.exists(source):
+        print(f"Файл не найден: {source}")
+        return 1
+    
+    db = Database(db_path)
+    try:
+        report = import_file(db, source, fmt, replace=replace)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        db.close()
+    
+    logger.info(f"Импортировано привычек: {report['habits']} из {source}")
+    print(f"✅ Привычек: {report['habits']}, выполнений: {report['completions']} "
+          f"за {report['seconds']:.2f} с")
+    return 0
+
 def check_requirements():
     """Проверка установленных зависимостей"""
     required = [
         ("fastapi", "fastapi"),
         ("uvicorn", "uvicorn[standard]"),
         ("sqlalchemy", "sqlalchemy"),
-        ("pydantic", "pydantic")
+        ("pydantic", "pydantic"),
+        ("numpy", "numpy")
     ]
     
     missing = []
@@ -122,13 +235,22 @@ def main():
   python run.py --mode desktop     # Запуск десктопного приложения
   python run.py --mode both        # Запуск обоих режимов
   python run.py --mode test        # Запуск тестов
+  python run.py --mode convert-storage --storage bitmap
+                                   # Хранить выполнения битовыми картами
+  python run.py --mode repair-stats  # Пересчет счетчиков и серий
+  python run.py --mode export-charts --output charts/
+                                   # Графики всех привычек (или --output report.pdf)
+  python run.py --mode export-data --output habits.jsonl
+                                   # Выгрузка привычек (.csv, .jsonl или .habits)
+  python run.py --mode import-data --input habits.jsonl [--replace]
   python run.py --help            # Показать эту справку
         """
     )
     
     parser.add_argument(
         '--mode', 
-        choices=['desktop', 'web', 'both', 'test'], 
+        choices=['desktop', 'web', 'both', 'test', 'convert-storage', 'repair-stats',
+                 'export-charts', 'export-data', 'import-data'], 
         default='web',
         help='Режим запуска (по умолчанию: web)'
     )
@@ -153,6 +275,56 @@ def main():
         help='Порт для веб-сервера (по умолчанию: 8000)'
     )
     
+    parser.add_argument(
+        '--db',
+        default='habits.db',
+        help='Файл БД для служебных режимов (по умолчанию: habits.db)'
+    )
+    
+    parser.add_argument(
+        '--storage',
+        choices=['rows', 'bitmap'],
+        help='Новый способ хранения выполнений для --mode convert-storage'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Каталог или .pdf-файл для --mode export-charts (по умолчанию: charts), '
+             'файл для --mode export-data'
+    )
+    
+    parser.add_argument(
+        '--input',
+        help='Файл для --mode import-data'
+    )
+    
+    parser.add_argument(
+        '--replace',
+        action='store_true',
+        help='Для --mode import-data: заменить все привычки, сохранив id из файла'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['png', 'svg', 'pdf', 'csv', 'jsonl', 'columnar'],
+        help='Формат графиков для --mode export-charts (по умолчанию: png) или данных '
+             'для export-data/import-data (по умолчанию: по расширению файла)'
+    )
+    
+    parser.add_argument(
+        '--dpi',
+        type=int,
+        default=300,
+        help='Разрешение графиков для --mode export-charts (по умолчанию: 300)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Число процессов для --mode export-charts (по умолчанию: CHART_RENDER_WORKERS; '
+             'общий .pdf рисует один процесс)'
+    )
+    
     parser.add_argument(
         '--check-deps',
         action='store_true',
@@ -191,6 +363,27 @@ def main():
         return run_both()
     elif args.mode == 'test':
         return run_tests()
+    elif args.mode == 'convert-storage':
+        if not args.storage:
+            parser.error("--mode convert-storage требует --storage rows|bitmap")
+        return run_convert_storage(args.db, args.storage)
+    elif args.mode == 'repair-stats':
+        return run_repair_stats(args.db)
+    elif args.mode == 'export-charts':
+        if args.format not in (None, 'png', 'svg', 'pdf'):
+            parser.error("--mode export-charts поддерживает --format png|svg|pdf")
+        return run_export_charts(args.db, args.output or 'charts', args.format or 'png',
+                                 args.dpi, args.workers)
+    elif args.mode in ('export-data', 'import-data'):
+        if args.format not in (None, 'csv', 'jsonl', 'columnar'):
+            parser.error(f"--mode {args.mode} поддерживает --format csv|jsonl|columnar")
+        if args.mode == 'export-data':
+            if not args.output:
+                parser.error("--mode export-data требует --output <файл>")
+            return run_export_data(args.db, args.output, args.format)
+        if not args.input:
+            parser.error("--mode import-data требует --input <файл>")
+        return run_import_data(args.db, args.input, args.format, args.replace)
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -1,4 +1,8 @@
 import pytest
+import asyncio
+import base64
+import datetime
+import json
 import tempfile
 import os
 import sys
@@ -8,6 +12,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from web.main import app
 from core.database import Database
+from core.models import Habit
+from web.routers import transfer as transfer_router
+from web.routers.analytics import MAX_HEATMAP_DAYS, MAX_HEATMAP_HABITS, MAX_TIMESERIES_DAYS
 
 @pytest.fixture
 def client():
@@ -28,10 +35,12 @@ def test_db():
     
     # Восстанавливаем оригинальную БД
     app.state.db = original_db
+    test_db.close()
     
-    # Удаляем тестовую БД
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    # Удаляем тестовую БД вместе с файлами WAL-журнала
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 def test_root_endpoint(client):
     response = client.get("/")
@@ -76,6 +85,368 @@ def test_mark_completion(client, test_db):
     assert response.status_code == 200
     assert "message" in response.json()
 
+def test_get_habits_pagination_and_fields(client, test_db):
+    for i in range(3):
+        client.post("/api/habits", json={"name": f"Привычка {i}"})
+    
+    response = client.get("/api/habits", params={"limit": 2, "fields": "id,name"})
+    assert response.status_code == 200
+    page = response.json()
+    assert [set(item) for item in page] == [{"id", "name"}, {"id", "name"}]
+    cursor = response.headers["X-Next-Cursor"]
+    
+    response = client.get("/api/habits", params={"limit": 2, "after": cursor})
+    assert [item["name"] for item in response.json()] == ["Привычка 2"]
+    assert "X-Next-Cursor" not in response.headers
+    
+    assert client.get("/api/habits", params={"fields": "secret"}).status_code == 400
+
+def test_get_habits_streaming(client, test_db):
+    for i in range(5):
+        habit_id = client.post("/api/habits", json={"name": f"Поток {i}"}).json()["id"]
+        if i % 2:
+            client.post(f"/api/habits/{habit_id}/complete")
+    expected = client.get("/api/habits").json()
+    
+    response = client.get("/api/habits?stream=ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+    assert client.get("/api/habits?stream=json").json() == expected
+    assert client.get("/api/habits?stream=json&fields=id,streak&after=2").json() == [
+        {"id": h["id"], "streak": h["streak"]} for h in expected[2:]
+    ]
+    assert client.get("/api/habits?stream=xml").status_code == 422
+    assert test_db.pool_stats()["in_use"] == 0
+
+def test_get_habits_cached_streak(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Серия", "target_days": 2}).json()["id"]
+    client.post(f"/api/habits/{habit_id}/complete")
+    
+    response = client.get("/api/habits", params={"fields": "id,completion_rate,streak"})
+    assert response.json() == [{"id": habit_id, "completion_rate": 0.5, "streak": 1}]
+
+def test_analytics_timeseries(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Аналитика"}).json()["id"]
+    client.post(f"/api/habits/{habit_id}/complete")
+    
+    response = client.get("/api/v2/analytics/timeseries", params={"bucket": "month"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert data["series"][-1]["count"] == 1
+    
+    params = {"start": "2024-02-01", "end": "2024-01-01"}
+    assert client.get("/api/v2/analytics/timeseries", params=params).status_code == 400
+    assert client.get("/api/v2/analytics/timeseries", params={"bucket": "year"}).status_code == 422
+    
+    today = datetime.date.today()
+    longest = {"start": (today - datetime.timedelta(days=MAX_TIMESERIES_DAYS - 1)).isoformat(),
+               "end": today.isoformat(), "bucket": "month"}
+    assert client.get("/api/v2/analytics/timeseries", params=longest).status_code == 200
+    too_long = {"start": "1000-01-01", "end": "2999-12-31"}
+    assert client.get("/api/v2/analytics/timeseries", params=too_long).status_code == 422
+
+def test_analytics_heatmap(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Календарь"}).json()["id"]
+    client.post(f"/api/habits/{habit_id}/complete")
+    
+    today = datetime.date.today()
+    params = {"start": (today - datetime.timedelta(days=9)).isoformat(), "end": today.isoformat()}
+    data = client.get("/api/v2/analytics/heatmap", params=params).json()
+    assert data["habit_ids"] == [habit_id]
+    assert data["days"] == 10
+    # Сегодня - последний, десятый бит строки
+    assert base64.b64decode(data["data"]) == bytes([0, 0b10])
+
+def test_analytics_heatmap_limits(client, test_db):
+    first = client.post("/api/habits", json={"name": "Первая"}).json()["id"]
+    second = client.post("/api/habits", json={"name": "Вторая"}).json()["id"]
+    
+    response = client.get("/api/v2/analytics/heatmap", params={"limit": 1})
+    assert response.json()["habit_ids"] == [first]
+    cursor = response.headers["x-next-cursor"]
+    response = client.get("/api/v2/analytics/heatmap", params={"limit": 1, "after": cursor})
+    assert response.json()["habit_ids"] == [second]
+    
+    today = datetime.date.today()
+    too_long = {"start": (today - datetime.timedelta(days=MAX_HEATMAP_DAYS)).isoformat(),
+                "end": today.isoformat()}
+    assert client.get("/api/v2/analytics/heatmap", params=too_long).status_code == 422
+    too_many = ",".join(str(i) for i in range(MAX_HEATMAP_HABITS + 1))
+    response = client.get("/api/v2/analytics/heatmap", params={"habit_ids": too_many})
+    assert response.status_code == 422
+
+def test_habit_chart_etag(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "График"}).json()["id"]
+    url = f"/api/v2/charts/habit/{habit_id}.png"
+    
+    response = client.get(url, params={"width": 400, "height": 200})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    etag = response.headers["etag"]
+    
+    cached = client.get(url, params={"width": 400, "height": 200},
+                        headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    
+    # После отметки выполнения картинка другая
+    client.post(f"/api/habits/{habit_id}/complete")
+    response = client.get(url, params={"width": 400, "height": 200},
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    
+    assert client.get("/api/v2/charts/habit/9999.png").status_code == 404
+    assert client.get(f"/api/v2/charts/habit/{habit_id}.gif").status_code == 422
+    assert client.get("/api/v2/charts/overview.png").status_code == 200
+
+def test_read_endpoints_etag(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Условный"}).json()["id"]
+    urls = ["/api/habits", f"/api/habits/{habit_id}", "/api/stats",
+            "/api/v2/habits/active", f"/api/v2/completions/habit/{habit_id}"]
+    etags = {}
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert "max-age" in response.headers["cache-control"]
+        etags[url] = response.headers["etag"]
+        cached = client.get(url, headers={"If-None-Match": f'"other", W/{etags[url]}'})
+        assert cached.status_code == 304
+        assert cached.content == b""
+    
+    # Разные запросы - разные ETag, даже при одной версии данных
+    assert client.get("/api/habits", params={"fields": "id"}).headers["etag"] != etags["/api/habits"]
+    
+    client.post(f"/api/habits/{habit_id}/complete")
+    for url in urls:
+        assert client.get(url, headers={"If-None-Match": etags[url]}).status_code == 200
+    
+    # Изменение другой привычки не меняет ETag первой
+    etag = client.get(f"/api/habits/{habit_id}").headers["etag"]
+    client.post("/api/habits", json={"name": "Другая"})
+    assert client.get(f"/api/habits/{habit_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/habits/9999").status_code == 404
+
+def test_response_compression(client, test_db):
+    today = datetime.date.today()
+    for i in range(5):
+        habit = Habit(name=f"Сжатие {i}")
+        for day in range(100):
+            habit.mark_completed(today - datetime.timedelta(days=day))
+        test_db.save_habit(habit)
+    
+    plain = client.get("/api/habits", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    compressed = client.get("/api/habits", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in compressed.headers["vary"].lower()
+    assert int(compressed.headers["content-length"]) < len(plain.content) // 5
+    assert compressed.json() == plain.json()
+    
+    # Сжатый ответ - другое представление: ETag слабый, но 304 по нему работает
+    assert compressed.headers["etag"] == "W/" + plain.headers["etag"]
+    assert client.get("/api/habits", headers={"Accept-Encoding": "gzip",
+                                              "If-None-Match": compressed.headers["etag"]}).status_code == 304
+    
+    streamed = client.get("/api/habits", params={"stream": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert [json.loads(line) for line in streamed.text.splitlines()] == plain.json()
+    
+    # Короткие ответы не сжимаются
+    small = client.get("/api/stats", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+def test_export_import(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Экспорт", "target_days": 5}).json()["id"]
+    client.post(f"/api/habits/{habit_id}/complete")
+    
+    for fmt in ("csv", "jsonl", "columnar"):
+        response = client.get(f"/api/v2/export?format={fmt}")
+        assert response.status_code == 200
+        assert "attachment" in response.headers["content-disposition"]
+        
+        response = client.post(f"/api/v2/import?format={fmt}&replace=true", content=response.content)
+        assert response.status_code == 200
+        assert response.json()["habits"] == 1
+        assert response.json()["completions"] == 1
+    
+    lines = client.get("/api/v2/export").text.splitlines()
+    assert len(lines) == 1 and '"Экспорт"' in lines[0]
+    
+    response = client.post("/api/v2/import", content=b'{"name": ""}\n')
+    assert response.status_code == 400
+    record = json.dumps({"name": "Отрицательная цель", "target_days": -3}).encode()
+    response = client.post("/api/v2/import", content=record + b"\n")
+    assert response.status_code == 400
+    assert len(client.get("/api/habits").json()) == 1
+    
+    # target_days=0 принимает API - такой экспорт тоже импортируется
+    client.post("/api/habits", json={"name": "Без цели", "target_days": 0})
+    for fmt in ("csv", "jsonl", "columnar"):
+        exported = client.get(f"/api/v2/export?format={fmt}").content
+        response = client.post(f"/api/v2/import?format={fmt}&replace=true", content=exported)
+        assert response.status_code == 200
+        assert [h["target_days"] for h in client.get("/api/habits").json()] == [5, 0]
+
+def test_import_body_limit(client, test_db, monkeypatch):
+    monkeypatch.setattr(transfer_router, "MAX_IMPORT_SIZE", 16)
+    body = json.dumps({"name": "Длинное название привычки"}).encode() + b"\n"
+    response = client.post("/api/v2/import", content=body)
+    assert response.status_code == 413
+    # Без Content-Length размер считается по мере чтения
+    response = client.post("/api/v2/import", content=iter([body[:10], body[10:]]))
+    assert response.status_code == 413
+    assert client.get("/api/habits").json() == []
+
+def test_bulk_completions(client, test_db):
+    habit_id = test_db.save_habit(Habit(name="Синхронизация"))
+    revision = test_db.get_revision(habit_id)
+    response = client.post("/api/v2/completions/bulk", json={"items": [
+        {"habit_id": habit_id, "date": "2024-03-01"},
+        {"habit_id": habit_id, "date": "2024-03-02"},
+        {"habit_id": habit_id, "date": "2024-03-01"},
+        {"habit_id": 9999, "date": "2024-03-01"},
+    ]})
+    assert response.status_code == 200
+    assert response.json() == {
+        "inserted": 2, "duplicate": 1, "not_found": 1,
+        "statuses": ["inserted", "inserted", "duplicate", "not_found"]
+    }
+    assert test_db.get_revision(habit_id) > revision
+    assert test_db.get_habit_stats(habit_id)["completions_count"] == 2
+    
+    bad = client.post("/api/v2/completions/bulk", json={"items": [{"habit_id": habit_id, "date": "март"}]})
+    assert bad.status_code == 422
+
+def test_v2_read_model(client, test_db):
+    today = datetime.date.today().isoformat()
+    first = client.post("/api/habits", json={"name": "Первая"}).json()["id"]
+    second = client.post("/api/habits", json={"name": "Вторая"}).json()["id"]
+    client.post(f"/api/habits/{second}/complete")
+    
+    # Выполнения одной привычки не строят модель чтения
+    assert client.get(f"/api/v2/completions/habit/{second}").json()["completions"] == [today]
+    assert client.get("/health").json()["read_model"]["built"] == False
+    
+    response = client.get(f"/api/v2/completions/date/{today}")
+    assert response.status_code == 200
+    assert [c["habit_id"] for c in response.json()["completions"]] == [second]
+    assert [h["id"] for h in client.get("/api/v2/habits/active").json()] == [first, second]
+    
+    # Запись сбрасывает устаревшие привычки в индексах
+    client.post(f"/api/v2/completions/habit/{first}", json={"date": today})
+    client.delete(f"/api/v2/completions/habit/{second}/date/{today}")
+    client.delete(f"/api/habits/{second}")
+    assert [c["habit_id"] for c in client.get(f"/api/v2/completions/date/{today}").json()["completions"]] == [first]
+    assert [h["id"] for h in client.get("/api/v2/habits/active").json()] == [first]
+    assert client.get(f"/api/v2/completions/habit/{first}").json()["completions"] == [today]
+    assert client.get("/health").json()["read_model"]["rebuilds"] == 1
+
+def test_api_app_serves_v2(test_db):
+    from web.api import api_app
+    original_db = api_app.state.db
+    api_app.state.db = test_db
+    try:
+        api_client = TestClient(api_app)
+        habit_id = api_client.post("/api/habits", json={"name": "API"}).json()["id"]
+        assert api_client.get("/api/v2/habits/active").json()[0]["id"] == habit_id
+        assert api_client.get("/api/v2/analytics/timeseries").status_code == 200
+        etag = api_client.get(f"/api/habits/{habit_id}").headers["etag"]
+        assert api_client.get(f"/api/habits/{habit_id}", headers={"If-None-Match": etag}).status_code == 304
+    finally:
+        api_app.state.db = original_db
+
+def test_get_habit_not_found(client, test_db):
+    response = client.get("/api/habits/9999")
+    assert response.status_code == 404
+    
+    response = client.post("/api/habits/9999/complete")
+    assert response.status_code == 404
+
+def test_stats(client, test_db):
+    habit_id = client.post("/api/habits", json={"name": "Статистика", "target_days": 2}).json()["id"]
+    client.post(f"/api/habits/{habit_id}/complete")
+    
+    response = client.get("/api/stats")
+    assert response.status_code == 200
+    assert response.json() == {
+        "total_habits": 1,
+        "active_habits": 1,
+        "total_completions": 1,
+        "average_completion_rate": 0.5,
+        "most_completed_habit": "Статистика"
+    }
+
+def test_events_stream(test_db):
+    from web.events import get_broker
+    
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/api/v2/events", "raw_path": b"/api/v2/events", "root_path": "",
+            "query_string": b"", "headers": [], "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 80),
+        }
+        chunks = asyncio.Queue()
+        disconnected = asyncio.Event()
+        requested = False
+        
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+        
+        async def send(message):
+            if message["type"] == "http.response.start":
+                await chunks.put(dict(message["headers"])[b"content-type"])
+            elif message.get("body"):
+                await chunks.put(message["body"])
+        
+        async def read_events(last_type):
+            body = b""
+            while f"event: {last_type}".encode() not in body:
+                body += await asyncio.wait_for(chunks.get(), 5)
+            events = []
+            for block in body.decode().strip().split("\n\n"):
+                event_type, data = block.split("\n")
+                events.append((event_type[len("event: "):], json.loads(data[len("data: "):])))
+            return events
+        
+        task = asyncio.create_task(app(scope, receive, send))
+        assert (await asyncio.wait_for(chunks.get(), 5)).startswith(b"text/event-stream")
+        assert (await asyncio.wait_for(chunks.get(), 5)).startswith(b"retry:")
+        assert get_broker(test_db).clients == 1
+        
+        # Записи идут из других потоков, как из пула БД
+        habit_id = await loop.run_in_executor(None, test_db.save_habit, Habit(name="Живая"))
+        events = await read_events("stats_changed")
+        assert [event_type for event_type, _ in events] == ["habit_created", "stats_changed"]
+        assert events[0][1]["habit"]["name"] == "Живая"
+        assert events[1][1]["stats"]["total_habits"] == 1
+        
+        today = datetime.date.today()
+        await loop.run_in_executor(None, test_db.add_completion, habit_id, today)
+        events = await read_events("stats_changed")
+        assert events[0] == ("completion_added", {
+            "habit_id": habit_id, "dates": [today.isoformat()],
+            "habit": {**events[0][1]["habit"], "completions_count": 1, "streak": 1}
+        })
+        
+        await loop.run_in_executor(None, test_db.delete_habit, habit_id)
+        events = await read_events("stats_changed")
+        assert events[0] == ("habit_deleted", {"habit_id": habit_id})
+        
+        disconnected.set()
+        await asyncio.wait_for(task, 5)
+        assert get_broker(test_db).clients == 0
+    
+    asyncio.run(scenario())
+
 def test_web_interface(client, test_db):
     response = client.get("/web")
     assert response.status_code == 200
@@ -1,14 +1,28 @@
 import pytest
+import asyncio
 import datetime
+import io
+import sqlite3
+import struct
 import tempfile
+import threading
 import os
 import sys
 
 # Добавляем путь к проекту
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from core.models import Habit, HabitStatus
-from core.database import Database
+from core import analytics, migrations, transfer
+from core.models import CompletionSet, Habit, HabitStatus
+from core.async_database import AsyncDatabase
+from core.cache import HabitCache
+from core.charts import ChartCache, chart_etag, export_charts, pack_batch, render_habit, render_overview
+from core.database import (COMPLETION_ADDED, COMPLETION_REMOVED, DATA_RELOADED, HABIT_CREATED,
+                           HABIT_DELETED, HABIT_UPDATED, Database)
+from core.migrations import LATEST_VERSION, get_version, migrate
+from core.plotter import MPL_EPOCH, HabitPlotter, aggregate_totals, decimate
+from core.pool import ConnectionPool
+from core.storage import STORAGE_BITMAP, STORAGE_ROWS, YEAR_BYTES, compute_streaks
 
 class TestHabitModel:
     def test_habit_creation(self):
@@ -39,19 +53,213 @@ class TestHabitModel:
         habit.mark_completed(today - datetime.timedelta(days=1))
         assert habit.get_streak() == 2
 
+class TestCompletionSet:
+    def test_sorted_and_unique(self):
+        day = datetime.date(2024, 3, 10)
+        completions = CompletionSet([day, day - datetime.timedelta(days=2), day])
+        assert completions.add(day - datetime.timedelta(days=1)) == True
+        assert completions.add(day) == False
+        assert list(completions) == [
+            datetime.date(2024, 3, 8), datetime.date(2024, 3, 9), datetime.date(2024, 3, 10)
+        ]
+        assert completions[-1] == day
+        assert day in completions
+        assert len(completions) == 3
+    
+    def test_discard_and_remove(self):
+        day = datetime.date(2024, 3, 10)
+        completions = CompletionSet([day])
+        assert completions.discard(day) == True
+        assert completions.discard(day) == False
+        assert completions == []
+        with pytest.raises(ValueError):
+            completions.remove(day)
+    
+    def test_list_api(self):
+        # Вызовы, которые принимал список дат
+        day = datetime.date(2024, 3, 10)
+        completions = CompletionSet()
+        completions.append(day)
+        completions.append(day)
+        completions.append(datetime.datetime(2024, 3, 8, 9, 30))
+        completions.append("2024-03-09")
+        assert completions == [datetime.date(2024, 3, 8), datetime.date(2024, 3, 9), day]
+        completions.remove("2024-03-09")
+        completions.remove(datetime.datetime(2024, 3, 8, 21, 0))
+        assert completions == [day]
+        with pytest.raises(TypeError):
+            completions.append(20240310)
+    
+    def test_streak_ending(self):
+        day = datetime.date(2024, 3, 10)
+        completions = CompletionSet(day - datetime.timedelta(days=i) for i in (0, 1, 2, 4))
+        assert completions.streak_ending(day) == 3
+        assert completions.streak_ending(day - datetime.timedelta(days=1)) == 0
+        assert CompletionSet().streak_ending(day) == 0
+    
+    def test_habit_keeps_public_api(self):
+        today = datetime.date.today()
+        habit = Habit(name="Слоты", completions=[today, today - datetime.timedelta(days=1)])
+        assert isinstance(habit.completions, CompletionSet)
+        assert habit.to_dict()["completions"] == [
+            (today - datetime.timedelta(days=1)).isoformat(), today.isoformat()
+        ]
+        assert habit.to_dict()["streak"] == 2
+        with pytest.raises(AttributeError):
+            habit.unknown_attribute = 1
+
+class TestStorage:
+    def test_compute_streaks(self):
+        assert compute_streaks([], 10) == (0, 0)
+        assert compute_streaks([1, 2, 3, 7, 8, 10], 10) == (1, 3)
+        assert compute_streaks([5, 6, 7], 7) == (3, 3)
+        assert compute_streaks([5, 6, 7], 8) == (0, 3)
+    
+    def test_bitmap_year_size(self):
+        # Последний день високосного года помещается в битовую карту
+        last_day = datetime.date(2024, 12, 31)
+        offset = last_day.toordinal() - datetime.date(2024, 1, 1).toordinal()
+        assert offset // 8 < YEAR_BYTES
+
+class TestAnalytics:
+    def test_calendar_grid(self):
+        # 2024-01-03 - среда
+        start = datetime.date(2024, 1, 3)
+        row = analytics.completion_row([start.toordinal(), start.toordinal() + 5], start,
+                                       start + datetime.timedelta(days=6))
+        grid = analytics.calendar_grid(row, start)
+        assert grid.shape == (7, 2)
+        assert grid[:, 0].tolist() == [-1, -1, 1, 0, 0, 0, 0]
+        assert grid[:, 1].tolist() == [1, 0, -1, -1, -1, -1, -1]
+    
+    def test_bucket_starts(self):
+        start, end = datetime.date(2024, 1, 3), datetime.date(2024, 3, 1)
+        weeks = analytics.bucket_starts(start, end, "week")
+        assert datetime.date.fromordinal(int(weeks[1])) == datetime.date(2024, 1, 8)
+        months = [datetime.date.fromordinal(int(o)) for o in analytics.bucket_starts(start, end, "month")]
+        assert months == [start, datetime.date(2024, 2, 1), datetime.date(2024, 3, 1)]
+        with pytest.raises(ValueError):
+            analytics.bucket_starts(start, end, "year")
+
+class TestCharts:
+    def test_chart_cache_lru(self):
+        cache = ChartCache(max_entries=2)
+        cache.put(("a",), b"1")
+        cache.put(("b",), b"2")
+        assert cache.get(("a",)) == b"1"
+        cache.put(("c",), b"3")
+        
+        assert cache.get(("b",)) is None
+        assert cache.get(("c",)) == b"3"
+        assert cache.stats() == {"entries": 2, "max_entries": 2, "bytes": 2, "hits": 2, "misses": 1}
+        assert chart_etag(("a", 1)) != chart_etag(("a", 2))
+    
+    def test_render_habit(self):
+        today = datetime.date.today().toordinal()
+        png = render_habit("График", 7, [today - 1, today], width=400, height=200, dpi=50)
+        assert png.startswith(b"\x89PNG")
+        svg = render_overview(["А", "Б"], [1, 2], [7, 7], fmt="svg")
+        assert b"<svg" in svg
+    
+    def test_pack_batch(self):
+        habits = [
+            Habit(id=1, name="А", target_days=7, completions=CompletionSet.from_ordinals([5, 6])),
+            Habit(id=2, name="Б", target_days=30),
+            Habit(id=3, name="В", target_days=7, completions=CompletionSet.from_ordinals([9])),
+        ]
+        ids, names, targets, offsets, ordinals = pack_batch(habits)
+        assert list(ids) == [1, 2, 3]
+        assert names == ["А", "Б", "В"]
+        assert list(targets) == [7, 30, 7]
+        assert list(offsets) == [0, 2, 2, 3]
+        assert list(ordinals) == [5, 6, 9]
+    
+    def test_export_charts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "export.db"))
+            for i in range(3):
+                habit = Habit(name=f"Привычка {i}", target_days=7)
+                habit.mark_completed()
+                db.save_habit(habit)
+            
+            done = []
+            report = export_charts(db, os.path.join(tmp, "charts"), dpi=20, workers=1,
+                                   batch_size=2, progress=done.append)
+            assert report["habits"] == 3
+            assert done == [2, 3]
+            assert sorted(os.listdir(os.path.join(tmp, "charts"))) == [
+                "habit_1.png", "habit_2.png", "habit_3.png"
+            ]
+            
+            done = []
+            report = export_charts(db, os.path.join(tmp, "charts.pdf"), batch_size=2,
+                                   progress=done.append)
+            assert report["habits"] == 3
+            assert done == [2, 3]
+            with open(os.path.join(tmp, "charts.pdf"), "rb") as f:
+                content = f.read()
+            assert content.startswith(b"%PDF-")
+            assert content.count(b"/Type /Page ") + content.count(b"/Type /Page\n") == 3
+            # Страницы векторные, без растровых картинок
+            assert b"/Subtype /Image" not in content
+            db.close()
+
+class TestPlotter:
+    def test_decimate_keeps_last_point(self):
+        ordinals = list(range(737000, 737000 + 5000))
+        x, y = decimate(ordinals, max_points=100)
+        assert len(x) == 100
+        assert (x[-1], y[-1]) == (ordinals[-1] - MPL_EPOCH, 5000)
+        assert decimate([], 100)[0].size == 0
+    
+    def test_aggregate_totals(self):
+        names, completed, targets = aggregate_totals(
+            ["a", "b", "c", "d"], [1, 5, 3, 2], [7, 7, 7, 7], max_bars=3
+        )
+        assert names == ["b", "c", "Остальные (2)"]
+        assert completed == [5, 3, 2]
+        assert targets == [7, 7, 7]
+    
+    def test_persistent_figures_updated_in_place(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        plotter = HabitPlotter(persistent=True)
+        habit = Habit(name="Графики", target_days=10)
+        habit.mark_completed(datetime.date.today() - datetime.timedelta(days=1))
+        fig = plotter.plot_habit_progress(habit)
+        FigureCanvasAgg(fig)
+        plotter.attach_canvas(fig)
+        fig.canvas.draw()
+        
+        habit.mark_completed()
+        assert plotter.plot_habit_progress(habit) is fig
+        line = fig.axes[0].lines[0]
+        assert list(line.get_ydata()) == [1, 2]
+        assert [bar.get_height() for bar in fig.axes[1].patches] == [2, 10]
+        
+        totals = plotter.plot_habit_totals(["a", "b"], [1, 2], [7, 7])
+        assert plotter.plot_habit_totals(["a", "b"], [3, 2], [7, 7]) is totals
+        assert [bar.get_height() for bar in totals.axes[0].patches][:2] == [3, 2]
+        # Фигуры не попадают в глобальное состояние pyplot
+        assert plt.get_fignums() == []
+        assert HabitPlotter().plot_habit_progress(habit) is not HabitPlotter().plot_habit_progress(habit)
+
 class TestDatabase:
-    @pytest.fixture
-    def temp_db(self):
-        """Фикстура для временной БД"""
+    @pytest.fixture(params=[STORAGE_ROWS, STORAGE_BITMAP])
+    def temp_db(self, request):
+        """Фикстура для временной БД (с каждым способом хранения выполнений)"""
         with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
             db_path = tmp.name
         
-        db = Database(db_path)
+        db = Database(db_path, storage=request.param)
         yield db
+        db.close()
         
-        # Удаляем временную БД
-        if os.path.exists(db_path):
-            os.unlink(db_path)
+        # Удаляем временную БД вместе с файлами WAL-журнала
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
     
     def test_save_and_load_habit(self, temp_db):
         habit = Habit(name="БД тест", target_days=14)
@@ -65,6 +273,324 @@ class TestDatabase:
         assert habits[0].name == "БД тест"
         assert len(habits[0].completions) == 1
     
+    def test_load_habits_groups_completions(self, temp_db):
+        today = datetime.date.today()
+        first = Habit(name="Первая")
+        first.mark_completed(today)
+        first.mark_completed(today - datetime.timedelta(days=2))
+        second = Habit(name="Вторая")
+        third = Habit(name="Третья")
+        third.mark_completed(today)
+        for habit in (first, second, third):
+            temp_db.save_habit(habit)
+        
+        habits = temp_db.load_habits()
+        assert [h.name for h in habits] == ["Первая", "Вторая", "Третья"]
+        assert habits[0].completions == [today - datetime.timedelta(days=2), today]
+        assert habits[1].completions == []
+        assert habits[2].completions == [today]
+    
+    def test_save_habit_writes_only_changes(self, temp_db):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        habit = Habit(name="Дифф")
+        habit.mark_completed(yesterday)
+        temp_db.save_habit(habit)
+        assert habit.get_completion_changes() == (set(), set())
+        
+        habit.mark_completed(today)
+        habit.unmark_completed(yesterday)
+        assert habit.get_completion_changes() == ({today}, {yesterday})
+        temp_db.save_habit(habit)
+        
+        assert temp_db.load_habits()[0].completions == [today]
+    
+    def test_completion_changes_survive_reload(self, temp_db):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        habit_id = temp_db.save_habit(Habit(name="Пути изменений"))
+        
+        habit = temp_db.get_habit(habit_id)
+        habit.mark_completed(yesterday)
+        habit.mark_completed(today)
+        temp_db.save_habit(habit)
+        assert temp_db.get_habit(habit_id).completions == [yesterday, today]
+        
+        habit = temp_db.get_habit(habit_id)
+        habit.unmark_completed(yesterday)
+        temp_db.save_habit(habit)
+        assert temp_db.get_habit(habit_id).completions == [today]
+        
+        # Методы списка дат тоже попадают в изменения для save_habit
+        habit = temp_db.get_habit(habit_id)
+        habit.completions.append(yesterday)
+        temp_db.save_habit(habit)
+        assert temp_db.get_habit(habit_id).completions == [yesterday, today]
+        
+        habit = temp_db.get_habit(habit_id)
+        habit.completions.remove(today)
+        habit.completions.append(datetime.datetime.combine(today, datetime.time(8, 0)))
+        habit.completions.remove(yesterday.isoformat())
+        temp_db.save_habit(habit)
+        assert temp_db.get_habit(habit_id).completions == [today]
+        
+        copy = temp_db.get_habit(habit_id).copy()
+        copy.completions.append(yesterday)
+        temp_db.save_habit(copy)
+        assert temp_db.get_habit(habit_id).completions == [yesterday, today]
+    
+    def test_add_and_remove_completion(self, temp_db):
+        habit_id = temp_db.save_habit(Habit(name="Точечно"))
+        today = datetime.date.today()
+        
+        assert temp_db.add_completion(habit_id, today) == True
+        assert temp_db.add_completion(habit_id, today) == False
+        assert temp_db.load_habits()[0].completions == [today]
+        
+        assert temp_db.remove_completion(habit_id, today) == True
+        assert temp_db.remove_completion(habit_id, today) == False
+        assert temp_db.load_habits()[0].completions == []
+    
+    def test_load_habits_keyset_pagination(self, temp_db):
+        today = datetime.date.today()
+        for i in range(5):
+            habit = Habit(name=f"Страница {i}")
+            habit.mark_completed(today - datetime.timedelta(days=10))
+            habit.mark_completed(today)
+            temp_db.save_habit(habit)
+        
+        first = temp_db.load_habits(limit=2)
+        second = temp_db.load_habits(after=first[-1].id, limit=2)
+        rest = temp_db.load_habits(after=second[-1].id, limit=2)
+        assert [h.name for h in first + second + rest] == [f"Страница {i}" for i in range(5)]
+        assert temp_db.load_habits(after=rest[-1].id, limit=2) == []
+        
+        assert all(h.completions == [] for h in temp_db.load_habits(with_completions=False))
+        recent = temp_db.load_habits(completions_since=today - datetime.timedelta(days=1))
+        assert all(h.completions == [today] for h in recent)
+    
+    def test_get_habit(self, temp_db):
+        habit = Habit(name="По ключу", target_days=10)
+        habit.mark_completed()
+        habit_id = temp_db.save_habit(habit)
+        temp_db.save_habit(Habit(name="Другая"))
+        
+        loaded = temp_db.get_habit(habit_id)
+        assert loaded.name == "По ключу"
+        assert loaded.target_days == 10
+        assert loaded.completions == [datetime.date.today()]
+        assert temp_db.get_habit(9999) is None
+    
+    def test_summary_stats_empty(self, temp_db):
+        assert temp_db.get_summary_stats() == {
+            "total_habits": 0,
+            "active_habits": 0,
+            "total_completions": 0,
+            "average_completion_rate": 0,
+            "most_completed_habit": None
+        }
+    
+    def test_summary_stats_matches_python(self, temp_db):
+        today = datetime.date.today()
+        for i, (target, done) in enumerate([(7, 3), (2, 5), (10, 5), (0, 1), (30, 0)]):
+            habit = Habit(name=f"Привычка {i}", target_days=target)
+            if i == 2:
+                habit.status = HabitStatus.ARCHIVED
+            for day in range(done):
+                habit.mark_completed(today - datetime.timedelta(days=day))
+            temp_db.save_habit(habit)
+        
+        habits = temp_db.load_habits()
+        expected = {
+            "total_habits": len(habits),
+            "active_habits": len([h for h in habits if h.status.value == "active"]),
+            "total_completions": sum(len(h.completions) for h in habits),
+            "average_completion_rate": round(
+                sum(h.get_completion_rate() for h in habits) / len(habits), 2),
+            "most_completed_habit": max(habits, key=lambda h: len(h.completions)).name
+        }
+        assert temp_db.get_summary_stats() == expected
+        assert expected["most_completed_habit"] == "Привычка 1"
+    
+    def test_habit_stats_streaks(self, temp_db):
+        today = datetime.date.today()
+        habit = Habit(name="Серии", target_days=8)
+        # Серия из 3 дней, заканчивающаяся сегодня, и более ранняя серия из 4 дней
+        for days_ago in (0, 1, 2, 5, 6, 7, 8):
+            habit.mark_completed(today - datetime.timedelta(days=days_ago))
+        habit_id = temp_db.save_habit(habit)
+        
+        assert temp_db.get_habit_stats(habit_id) == {
+            "id": habit_id,
+            "completions_count": 7,
+            "target_days": 8,
+            "completion_rate": 7 / 8,
+            "current_streak": 3,
+            "longest_streak": 4
+        }
+        assert temp_db.get_habit_stats(habit_id)["current_streak"] == habit.get_streak()
+        assert temp_db.get_habit_stats(9999) == {}
+    
+    def test_stats_for_many_habits(self, temp_db):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        old = Habit(name="Вчера")
+        old.mark_completed(yesterday)
+        old_id = temp_db.save_habit(old)
+        empty_id = temp_db.save_habit(Habit(name="Пусто", target_days=0))
+        
+        stats = temp_db.get_stats_for([old_id, empty_id, 9999])
+        assert set(stats) == {old_id, empty_id}
+        assert stats[old_id]["current_streak"] == 0
+        assert stats[old_id]["longest_streak"] == 1
+        assert stats[empty_id]["completions_count"] == 0
+        assert stats[empty_id]["completion_rate"] == 0
+    
+    def test_aggregates_maintained_incrementally(self, temp_db):
+        today = datetime.date.today()
+        habit_id = temp_db.save_habit(Habit(name="Счетчики", target_days=4))
+        for days_ago in (3, 1, 0):
+            temp_db.add_completion(habit_id, today - datetime.timedelta(days=days_ago))
+        
+        summary = temp_db.load_habit_summaries()[0]
+        assert summary["completions_count"] == 3
+        assert summary["completion_rate"] == 3 / 4
+        assert summary["streak"] == 2
+        assert summary["longest_streak"] == 2
+        assert summary["last_completed"] == today.isoformat()
+        
+        # Отметка задним числом соединяет серии
+        temp_db.add_completion(habit_id, today - datetime.timedelta(days=2))
+        assert temp_db.get_habit_stats(habit_id)["current_streak"] == 4
+        
+        temp_db.remove_completion(habit_id, today)
+        stats = temp_db.get_habit_stats(habit_id)
+        assert stats["completions_count"] == 3
+        assert stats["current_streak"] == 0
+        assert stats["longest_streak"] == 3
+        assert temp_db.recompute_aggregates() == 0
+    
+    def test_aggregates_after_save_habit(self, temp_db):
+        today = datetime.date.today()
+        habit = Habit(name="Сохранение")
+        habit.mark_completed(today - datetime.timedelta(days=1))
+        habit_id = temp_db.save_habit(habit)
+        habit.mark_completed(today)
+        habit.unmark_completed(today - datetime.timedelta(days=1))
+        temp_db.save_habit(habit)
+        
+        summary = temp_db.load_habit_summaries()[0]
+        assert summary["completions_count"] == 1
+        assert summary["streak"] == habit.get_streak() == 1
+        assert temp_db.recompute_aggregates([habit_id]) == 0
+    
+    def test_recompute_aggregates_repairs_drift(self, temp_db):
+        habit = Habit(name="Расхождение")
+        habit.mark_completed()
+        habit_id = temp_db.save_habit(habit)
+        empty_id = temp_db.save_habit(Habit(name="Пусто"))
+        with temp_db.pool.connection() as conn:
+            conn.execute(
+                "UPDATE habits SET completion_count=10, current_streak=5, longest_streak=5"
+            )
+        revision = temp_db.get_revision(habit_id)
+        
+        assert temp_db.recompute_aggregates() == 2
+        stats = temp_db.get_stats_for([habit_id, empty_id])
+        assert stats[habit_id]["completions_count"] == 1
+        assert stats[habit_id]["current_streak"] == 1
+        assert stats[empty_id]["longest_streak"] == 0
+        # Исправленные счетчики видны клиентам: ETag и кеш графиков меняются
+        assert temp_db.get_revision(habit_id) == revision + 1
+        assert temp_db.recompute_aggregates() == 0
+        assert temp_db.get_revision(habit_id) == revision + 1
+    
+    def test_analytics_timeseries(self, temp_db):
+        first = Habit(name="Первая")
+        for date in ("2024-01-30", "2024-01-31", "2024-02-01", "2024-02-05"):
+            first.mark_completed(datetime.date.fromisoformat(date))
+        first_id = temp_db.save_habit(first)
+        second = Habit(name="Вторая")
+        for date in ("2024-01-31", "2023-12-31"):
+            second.mark_completed(datetime.date.fromisoformat(date))
+        second_id = temp_db.save_habit(second)
+        start, end = datetime.date(2024, 1, 29), datetime.date(2024, 2, 5)
+        
+        counts = analytics.day_counts(temp_db, start, end)
+        assert counts.tolist() == [0, 1, 2, 1, 0, 0, 0, 1]
+        
+        weeks = analytics.timeseries(temp_db, start, end, "week")
+        assert weeks["total"] == 5
+        assert [(b["start"], b["days"], b["count"]) for b in weeks["series"]] == [
+            ("2024-01-29", 7, 4), ("2024-02-05", 1, 1)
+        ]
+        # Только первая привычка: выполнение второй 31 января не считается
+        first_weeks = analytics.timeseries(temp_db, start, end, "week", habit_ids=[first_id])
+        assert [b["count"] for b in first_weeks["series"]] == [3, 1]
+        
+        months = analytics.timeseries(temp_db, datetime.date(2023, 12, 15), end, "month",
+                                      habit_ids=[second_id])
+        assert [(b["start"], b["end"], b["count"]) for b in months["series"]] == [
+            ("2023-12-15", "2023-12-31", 1),
+            ("2024-01-01", "2024-01-31", 1),
+            ("2024-02-01", "2024-02-05", 0)
+        ]
+        assert analytics.timeseries(temp_db, start, end, habit_ids=[])["total"] == 0
+        with pytest.raises(ValueError):
+            analytics.timeseries(temp_db, end, start)
+    
+    def test_habits_heatmap_labels(self, temp_db, monkeypatch):
+        first_id = temp_db.save_habit(Habit(name="Первая"))
+        temp_db.save_habit(Habit(name="Не на графике"))
+        second_id = temp_db.save_habit(Habit(name="Вторая"))
+        
+        # Подписи читаются только для нарисованных привычек
+        def load_all(*args, **kwargs):
+            raise AssertionError("load_habit_summaries читает все привычки")
+        monkeypatch.setattr(temp_db, "load_habit_summaries", load_all)
+        fig = HabitPlotter(temp_db).plot_habits_heatmap(habit_ids=[second_id, first_id])
+        labels = [label.get_text() for label in fig.axes[0].get_yticklabels()]
+        assert labels == ["Вторая", "Первая"]
+    
+    def test_analytics_completion_matrix(self, temp_db):
+        start = datetime.date(2023, 12, 30)
+        first = Habit(name="Первая")
+        for date in ("2023-12-31", "2024-01-01", "2024-01-03"):
+            first.mark_completed(datetime.date.fromisoformat(date))
+        first_id = temp_db.save_habit(first)
+        empty_id = temp_db.save_habit(Habit(name="Пусто"))
+        end = datetime.date(2024, 1, 3)
+        
+        ids, matrix = analytics.completion_matrix(temp_db, start, end)
+        assert ids == [first_id, empty_id]
+        assert matrix.tolist() == [[False, True, True, False, True], [False] * 5]
+        
+        ids, matrix = analytics.completion_matrix(temp_db, start, end, [empty_id, 9999, first_id])
+        assert ids == [empty_id, first_id]
+        assert matrix[1].tolist() == [False, True, True, False, True]
+        assert (matrix[1] == analytics.completion_row(first.completions.ordinals, start, end)).all()
+    
+    def test_revision_changes_on_writes(self, temp_db):
+        habit = Habit(name="Версии")
+        habit_id = temp_db.save_habit(habit)
+        versions = {temp_db.habits_version()}
+        revision = temp_db.get_revision(habit_id)
+        
+        temp_db.add_completion(habit_id, datetime.date.today())
+        assert temp_db.get_revision(habit_id) > revision
+        assert temp_db.add_completion(habit_id, datetime.date.today()) is False
+        revision = temp_db.get_revision(habit_id)
+        versions.add(temp_db.habits_version())
+        
+        habit.name = "Новое имя"
+        temp_db.save_habit(habit)
+        assert temp_db.get_revision(habit_id) > revision
+        versions.add(temp_db.habits_version())
+        temp_db.delete_habit(habit_id)
+        versions.add(temp_db.habits_version())
+        
+        assert len(versions) == 4
+        assert temp_db.get_revision(habit_id) is None
+    
     def test_delete_habit(self, temp_db):
         habit = Habit(name="Для удаления")
         habit_id = temp_db.save_habit(habit)
@@ -73,6 +599,385 @@ class TestDatabase:
         
         temp_db.delete_habit(habit_id)
         assert len(temp_db.load_habits()) == 0
+    
+    def test_delete_habit_cascades_completions(self, temp_db):
+        habit = Habit(name="Каскад")
+        habit.mark_completed()
+        habit_id = temp_db.save_habit(habit)
+        
+        temp_db.delete_habit(habit_id)
+        with temp_db.pool.connection() as conn:
+            count = conn.execute(f"SELECT COUNT(*) FROM {temp_db.store.table}").fetchone()[0]
+        assert count == 0
+    
+    def test_schema_migrated(self, temp_db):
+        with temp_db.pool.connection() as conn:
+            assert get_version(conn) == LATEST_VERSION
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index'"
+            )}
+        assert {"idx_completions_date", "idx_habits_status"} <= indexes
+    
+    def test_legacy_database_upgraded_in_place(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "legacy.db")
+            conn = sqlite3.connect(db_path)
+            migrate(conn, target_version=1)
+            conn.execute("PRAGMA user_version = 0")
+            conn.execute(
+                "INSERT INTO habits (name, target_days, creation_date, status) "
+                "VALUES ('Старая', 7, '2024-01-01', 'active')"
+            )
+            conn.executemany(
+                "INSERT INTO completions (habit_id, date) VALUES (?, ?)",
+                [(1, "2024-01-02"), (1, "2024-01-03"), (42, "2024-01-03")]
+            )
+            conn.commit()
+            conn.close()
+            
+            db = Database(db_path)
+            habits = db.load_habits()
+            stats = db.get_habit_stats(1)
+            with db.pool.connection() as conn:
+                version = get_version(conn)
+                table_sql = conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE name='completions'"
+                ).fetchone()[0]
+            db.close()
+        
+        assert version == LATEST_VERSION
+        assert "WITHOUT ROWID" in table_sql
+        assert [h.name for h in habits] == ["Старая"]
+        assert habits[0].completions == [datetime.date(2024, 1, 2), datetime.date(2024, 1, 3)]
+        # Кешированные счетчики посчитаны по перенесенным выполнениям
+        assert stats["completions_count"] == 2
+        assert stats["longest_streak"] == 2
+    
+    def test_async_database(self, temp_db):
+        async_db = AsyncDatabase(temp_db)
+        
+        async def scenario():
+            habit_id = await async_db.save_habit(Habit(name="Асинхронно"))
+            await async_db.add_completion(habit_id, datetime.date.today())
+            return await async_db.get_habit(habit_id)
+        
+        habit = asyncio.run(scenario())
+        assert habit.name == "Асинхронно"
+        assert habit.completions == [datetime.date.today()]
+        assert async_db.db_path == temp_db.db_path
+        
+        # Потоков столько же, сколько соединений в пуле этой БД
+        small_db = Database(temp_db.db_path, pool_size=2)
+        assert AsyncDatabase(small_db)._executor._max_workers == 2
+        small_db.close()
+    
+    def test_convert_storage(self, temp_db):
+        today = datetime.date.today()
+        habit = Habit(name="Перенос")
+        # Выполнения за три года, включая 29 февраля и границы лет
+        dates = [datetime.date(2024, 1, 1), datetime.date(2024, 2, 29),
+                 datetime.date(2024, 12, 31), datetime.date(2025, 1, 1), today]
+        for date in dates:
+            habit.mark_completed(date)
+        habit_id = temp_db.save_habit(habit)
+        before = temp_db.get_habit(habit_id)
+        
+        target = STORAGE_BITMAP if temp_db.storage == STORAGE_ROWS else STORAGE_ROWS
+        assert temp_db.convert_storage(target) == len(before.completions)
+        assert temp_db.storage == target
+        assert temp_db.get_habit(habit_id).completions == before.completions
+        assert temp_db.get_summary_stats()["total_completions"] == len(before.completions)
+        
+        # Способ хранения запоминается в самой БД
+        reopened = Database(temp_db.db_path)
+        assert reopened.storage == target
+        with pytest.raises(ValueError):
+            Database(temp_db.db_path, storage=STORAGE_ROWS if target == STORAGE_BITMAP else STORAGE_BITMAP)
+        reopened.close()
+    
+    @pytest.mark.parametrize("fmt", transfer.FORMATS)
+    def test_export_import_round_trip(self, temp_db, fmt):
+        today = datetime.date.today()
+        for i in range(5):
+            # target_days=0 допускает и API
+            habit = Habit(name=f'Привычка; "{i}"', description="a,b\nc", target_days=10 if i else 0,
+                          status=HabitStatus.ARCHIVED if i == 4 else HabitStatus.ACTIVE)
+            for day in range(0, 30, i + 1):
+                habit.mark_completed(today - datetime.timedelta(days=day))
+            temp_db.save_habit(habit)
+        original = [h.to_dict() for h in temp_db.load_habits()]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "habits.data")
+            report = transfer.export_file(temp_db, path, fmt, batch_size=2)
+            assert report["habits"] == 5
+            assert report["completions"] == sum(len(h["completions"]) for h in original)
+            
+            # Замена сохраняет id, добавление создает привычки с новыми id
+            imported = transfer.import_file(temp_db, path, fmt, replace=True)
+            assert imported["habits"] == 5
+            assert [h.to_dict() for h in temp_db.load_habits()] == original
+            assert temp_db.recompute_aggregates() == 0
+            
+            transfer.import_file(temp_db, path, fmt)
+            habits = temp_db.load_habits()
+            assert [h.id for h in habits] == list(range(1, 11))
+            assert habits[5].completions == habits[0].completions
+            assert temp_db.get_summary_stats()["total_completions"] == 2 * report["completions"]
+    
+    def test_import_columnar_limits(self, temp_db, monkeypatch):
+        habit = Habit(name="Сжатая")
+        for day in range(100):
+            habit.mark_completed(datetime.date(2024, 1, 1) + datetime.timedelta(days=day))
+        temp_db.save_habit(habit)
+        data = b"".join(transfer.export_stream(temp_db, "columnar"))
+        
+        # Группа, которая распаковывается больше лимита, не читается целиком
+        monkeypatch.setattr(transfer, "MAX_COLUMNAR_BYTES", 64)
+        with pytest.raises(ValueError, match="после распаковки"):
+            transfer.import_stream(temp_db, io.BytesIO(data), "columnar")
+        monkeypatch.undo()
+        
+        # Лишние байты после сжатого потока группы
+        header = len(transfer.COLUMNAR_MAGIC) + 2
+        rows, size = struct.unpack_from("<II", data, header)
+        start = header + 8
+        group = data[start:start + size] + b"\0"
+        broken = data[:header] + struct.pack("<II", rows, size + 1) + group + data[start + size:]
+        with pytest.raises(ValueError, match="поврежденные"):
+            transfer.import_stream(temp_db, io.BytesIO(broken), "columnar")
+        assert [h.name for h in temp_db.load_habits()] == ["Сжатая"]
+    
+    def test_add_completions_bulk(self, temp_db):
+        today = datetime.date.today()
+        first = Habit(name="Первая")
+        first.mark_completed(today - datetime.timedelta(days=1))
+        first_id = temp_db.save_habit(first)
+        second_id = temp_db.save_habit(Habit(name="Вторая"))
+        
+        statuses = temp_db.add_completions([
+            (first_id, today),
+            (first_id, today - datetime.timedelta(days=1)),
+            (second_id, datetime.date(2023, 12, 31)),
+            (second_id, datetime.date(2024, 1, 1)),
+            (9999, today),
+            (first_id, today),
+        ])
+        assert statuses == ["inserted", "duplicate", "inserted", "inserted", "not_found", "duplicate"]
+        assert temp_db.get_habit(second_id).completions == [datetime.date(2023, 12, 31),
+                                                           datetime.date(2024, 1, 1)]
+        stats = temp_db.get_stats_for([first_id, second_id])
+        assert stats[first_id]["completions_count"] == 2
+        assert stats[first_id]["current_streak"] == 2
+        assert stats[second_id]["longest_streak"] == 2
+        assert temp_db.recompute_aggregates() == 0
+        assert temp_db.add_completions([]) == []
+    
+    def test_read_model(self, temp_db):
+        today = datetime.date.today()
+        first = Habit(name="Первая")
+        first.mark_completed(today)
+        first_id = temp_db.save_habit(first)
+        second_id = temp_db.save_habit(Habit(name="Вторая", status=HabitStatus.ARCHIVED))
+        model = temp_db.read_model
+        
+        assert [h.id for h in model.completed_on(today)] == [first_id]
+        assert [h.id for h in model.with_status("archived")] == [second_id]
+        assert model.stats()["rebuilds"] == 1
+        
+        temp_db.add_completions([(second_id, today)])
+        temp_db.remove_completion(first_id, today)
+        assert [h.id for h in model.completed_on(today)] == [second_id]
+        assert model.get(first_id).completions == []
+        temp_db.delete_habit(second_id)
+        assert model.completed_on(today) == []
+        assert model.get(second_id) is None
+        assert model.stats()["rebuilds"] == 1
+        
+        model.invalidate()
+        assert model.get(first_id).name == "Первая"
+        assert model.stats()["rebuilds"] == 2
+    
+    def test_habit_cache(self, temp_db):
+        cache = HabitCache(temp_db, max_entries=2)
+        ids = [cache.save_habit(Habit(name=f"Кеш {i}")) for i in range(3)]
+        # Запись через кеш сразу кладет привычку в него, старейшая вытесняется
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+        
+        habit = cache.get_habit(ids[2])
+        assert cache.stats()["hits"] == 1
+        habit.mark_completed()
+        assert cache.get_habit(ids[2]).completions == []
+        version = cache.version
+        cache.save_habit(habit)
+        assert cache.version == version + 1
+        assert len(cache.get_habit(ids[2]).completions) == 1
+        
+        assert cache.get_habit(ids[0]).name == "Кеш 0"
+        assert cache.stats()["misses"] == 1
+        assert cache.summary_stats()["total_completions"] == 1
+        assert cache.summary_stats() is cache.summary_stats()
+        
+        # Запись в обход кеша через тот же Database сбрасывает привычку
+        temp_db.add_completion(ids[0], datetime.date.today())
+        assert len(cache.get_habit(ids[0]).completions) == 1
+        assert cache.summary_stats()["total_completions"] == 2
+        cache.delete_habit(ids[0])
+        assert cache.get_habit(ids[0]) is None
+        cache.close()
+    
+    def test_habit_cache_sees_other_writers(self, temp_db):
+        habit_id = temp_db.save_habit(Habit(name="Общая"))
+        assert temp_db.cache.get_habit(habit_id).name == "Общая"
+        assert temp_db.read_model.get(habit_id).name == "Общая"
+        
+        # Второй объект Database на том же файле - как desktop в --mode both
+        other = Database(temp_db.db_path)
+        try:
+            habit = other.get_habit(habit_id)
+            habit.name = "Переименована"
+            other.save_habit(habit)
+        finally:
+            other.close()
+        
+        assert temp_db.cache.get_habit(habit_id).name == "Переименована"
+        assert temp_db.read_model.get(habit_id).name == "Переименована"
+        assert temp_db.cache.stats()["external_changes"] == 1
+    
+    def test_habit_cache_check_during_own_writes(self, temp_db):
+        habit_id = temp_db.save_habit(Habit(name="Гонка"))
+        received = []
+        temp_db.subscribe_events(received.extend)
+        done = threading.Event()
+        
+        def check():
+            while not done.is_set():
+                temp_db.cache.check()
+        
+        # check() в другом потоке между commit и invalidate записи
+        # не должен принимать ее за чужую
+        checker = threading.Thread(target=check)
+        checker.start()
+        try:
+            start = datetime.date(2024, 1, 1)
+            for day in range(300):
+                temp_db.add_completion(habit_id, start + datetime.timedelta(days=day))
+        finally:
+            done.set()
+            checker.join()
+        
+        assert temp_db.cache.stats()["external_changes"] == 0
+        assert DATA_RELOADED not in {event["type"] for event in received}
+        assert len(temp_db.cache.get_habit(habit_id).completions) == 300
+    
+    def test_write_events(self, temp_db):
+        received = []
+        temp_db.subscribe_events(received.extend)
+        today = datetime.date.today()
+        
+        habit = Habit(name="События")
+        habit_id = temp_db.save_habit(habit)
+        habit.mark_completed(today)
+        temp_db.save_habit(habit)
+        temp_db.add_completions([(habit_id, today - datetime.timedelta(days=1)), (habit_id, today)])
+        temp_db.remove_completion(habit_id, today)
+        temp_db.add_completion(habit_id, today)
+        temp_db.delete_habit(habit_id)
+        temp_db.notify_change()
+        
+        assert [(event["type"], event.get("dates")) for event in received] == [
+            (HABIT_CREATED, None),
+            (HABIT_UPDATED, None),
+            (COMPLETION_ADDED, [today.isoformat()]),
+            (COMPLETION_ADDED, [(today - datetime.timedelta(days=1)).isoformat()]),
+            (COMPLETION_REMOVED, [today.isoformat()]),
+            (COMPLETION_ADDED, [today.isoformat()]),
+            (HABIT_DELETED, None),
+            (DATA_RELOADED, None),
+        ]
+        assert all(event["habit_id"] == habit_id for event in received[:-1])
+        assert temp_db.get_habit_summaries([habit_id, 9999]) == {}
+    
+    def test_iter_habits_matches_load_habits(self, temp_db):
+        today = datetime.date.today()
+        for i in range(6):
+            habit = Habit(name=f"Курсор {i}")
+            if i % 2:
+                for day in range(i):
+                    habit.mark_completed(today - datetime.timedelta(days=day * 2))
+            temp_db.save_habit(habit)
+        
+        assert list(temp_db.iter_habits()) == [h.to_dict() for h in temp_db.load_habits()]
+        assert list(temp_db.iter_habits(with_completions=False)) == temp_db.load_habit_summaries()
+        since = today - datetime.timedelta(days=3)
+        assert [h["completions"] for h in temp_db.iter_habits(after=2, limit=3, completions_since=since)] == [
+            h.completions.isoformats() for h in temp_db.load_habits(after=2, limit=3, completions_since=since)
+        ]
+        
+        # Страницы по batch_size; между ними соединение свободно
+        assert list(temp_db.iter_habits(batch_size=2)) == list(temp_db.iter_habits())
+        assert [h["id"] for h in temp_db.iter_habits(after=1, limit=3, batch_size=2)] == [2, 3, 4]
+        rows = temp_db.iter_habits(batch_size=2)
+        next(rows)
+        assert temp_db.pool_stats()["in_use"] == 0
+        with temp_db.pool.connection() as conn:
+            assert not conn.in_transaction
+        rows.close()
+    
+    def test_import_is_atomic(self, temp_db):
+        temp_db.save_habit(Habit(name="Было"))
+        lines = [
+            '{"name": "Новая", "completions": ["2024-01-01"]}',
+            '{"name": "Ошибка", "completions": ["2024-13-01"]}',
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "broken.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            with pytest.raises(ValueError, match="Строка 2"):
+                transfer.import_file(temp_db, path, replace=True)
+        assert [h.name for h in temp_db.load_habits()] == ["Было"]
+        with pytest.raises(ValueError):
+            transfer.format_for("habits.xml")
+    
+    def test_concurrent_migration(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "legacy.db")
+            first = sqlite3.connect(db_path)
+            migrate(first, target_version=1)
+            second = sqlite3.connect(db_path)
+            
+            # Второй процесс прочитал версию 1 до того, как первый обновил схему
+            migrate(first)
+            stale = iter([1])
+            real_get_version = migrations.get_version
+            monkeypatch.setattr(migrations, "get_version",
+                                lambda conn: next(stale, None) or real_get_version(conn))
+            assert migrate(second) == LATEST_VERSION
+            assert get_version(second) == LATEST_VERSION
+            first.close()
+            second.close()
+    
+    def test_connection_pool(self, temp_db):
+        with temp_db.pool.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        
+        temp_db.load_habits()
+        stats = temp_db.pool_stats()
+        assert stats["connections"] == 1
+        assert stats["in_use"] == 0
+        assert stats["checkouts"] >= 3
+    
+    def test_connection_pool_timeout(self, temp_db):
+        pool = ConnectionPool(temp_db.db_path, size=1, timeout=0.01)
+        conn = pool.acquire()
+        with pytest.raises(TimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        assert pool.stats()["timeouts"] == 1
+        pool.close()
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
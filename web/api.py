@@ -1,26 +1,38 @@
 """
 Альтернативный API файл (можно использовать вместо web/main.py)
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from core.charts import shutdown_render_pool
 from web.main import (
-    get_habits, create_habit, get_habit, 
+    db, get_habits, create_habit, get_habit, 
     delete_habit, complete_habit, get_stats
 )
+from web.compression import CompressionMiddleware
+from web.dependencies import data_etag, habit_etag
+from web.routers import include_v2_routers
+from web.serialization import DEFAULT_RESPONSE_CLASS
 
 # Создаем отдельное FastAPI приложение для API
 api_app = FastAPI(
     title="Habit Tracker API Only",
     description="Только API без веб-интерфейса",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DEFAULT_RESPONSE_CLASS
 )
+api_app.add_middleware(CompressionMiddleware)
+
+# Та же БД, что и у основного приложения: ее модель чтения общая
+api_app.state.db = db
 
 # Подключаем те же эндпоинты
-api_app.get("/api/habits")(get_habits)
+api_app.get("/api/habits", dependencies=[Depends(data_etag)])(get_habits)
 api_app.post("/api/habits")(create_habit)
-api_app.get("/api/habits/{habit_id}")(get_habit)
+api_app.get("/api/habits/{habit_id}", dependencies=[Depends(habit_etag)])(get_habit)
 api_app.delete("/api/habits/{habit_id}")(delete_habit)
 api_app.post("/api/habits/{habit_id}/complete")(complete_habit)
-api_app.get("/api/stats")(get_stats)
+api_app.get("/api/stats", dependencies=[Depends(data_etag)])(get_stats)
+include_v2_routers(api_app)
+api_app.add_event_handler("shutdown", shutdown_render_pool)
 
 @api_app.get("/")
 async def api_root():
@@ -32,6 +44,8 @@ async def api_root():
             "GET /api/habits/{id}",
             "DELETE /api/habits/{id}",
             "POST /api/habits/{id}/complete",
-            "GET /api/stats"
+            "GET /api/stats",
+            "/api/v2/habits, /api/v2/completions, /api/v2/analytics, /api/v2/charts, "
+            "/api/v2/export, /api/v2/import, /api/v2/events"
         ]
     }
\ No newline at end of file
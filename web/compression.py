@@ -0,0 +1,152 @@
+"""
+Сжатие ответов: Brotli, если установлен пакет brotli и клиент его
+принимает, иначе gzip.
+
+В отличие от GZipMiddleware из Starlette, каждая часть потокового ответа
+сжимается и сбрасывается клиенту сразу (sync flush), поэтому потоковые
+списки не теряют время до первого байта. Уже сжатые форматы и поток
+событий text/event-stream отдаются как есть.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ответы меньше этого размера (байт) не сжимаются
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+# Типы, которые не сжимаются: уже сжатые или требующие немедленной доставки
+SKIP_TYPES = ("image/png", "application/octet-stream", "text/event-stream")
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = GZIP_LEVEL):
+        # wbits=31 - формат gzip с заголовком и контрольной суммой
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush)
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compressor.process(data)
+        return out + (self._compressor.finish() if final else self._compressor.flush())
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещенных (q=0)"""
+    encodings = set()
+    for part in accept_encoding.split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.add(name.lower())
+    return encodings
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoder(self, scope: Scope):
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in encodings:
+            return BrotliEncoder(self.brotli_quality)
+        if "gzip" in encodings:
+            return GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        encoder = self._encoder(scope) if scope["type"] == "http" else None
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, encoder, self.minimum_size)(scope, receive, send)
+
+class CompressionResponder:
+    """Сжатие одного ответа. Решение принимается по заголовкам и первой
+    части тела: короткие ответы целиком и неподходящие типы не сжимаются
+    """
+
+    def __init__(self, app: ASGIApp, encoder, minimum_size: int):
+        self.app = app
+        self.encoder = encoder
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.start: Optional[Message] = None
+        # None - решение еще не принято
+        self.compress: Optional[bool] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.start["headers"])
+        if "content-encoding" in headers:
+            return False
+        if headers.get("content-type", "").split(";")[0].strip() in SKIP_TYPES:
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Заголовки отправляются вместе с первой частью тела
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compress is None:
+            self.compress = self._should_compress(body, more_body)
+            if self.compress:
+                headers = MutableHeaders(raw=self.start["headers"])
+                headers["Content-Encoding"] = self.encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                # Сжатое представление отличается побайтно: ETag становится слабым
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = self.encoder.compress(body, final=True)
+                    headers["Content-Length"] = str(len(body))
+                    await self.send(self.start)
+                    await self.send({"type": "http.response.body", "body": body})
+                    return
+            await self.send(self.start)
+
+        if self.compress:
+            body = self.encoder.compress(body, final=not more_body)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+        else:
+            await self.send(message)
@@ -0,0 +1,60 @@
+"""
+Зависимости FastAPI, общие для приложения и роутеров
+"""
+import datetime
+import hashlib
+import os
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, Response
+from core import cache
+from core.async_database import AsyncDatabase
+
+# Сколько секунд браузер и прокси могут отдавать ответ без перепроверки;
+# по умолчанию каждый раз спрашивают сервер и получают 304
+CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", "0"))
+CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}, must-revalidate"
+
+# БД берется из состояния приложения, обработавшего запрос, поэтому
+# роутеры не импортируют web.main и работают в любом приложении
+def get_db(request: Request) -> AsyncDatabase:
+    return AsyncDatabase(request.app.state.db)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с одним из перечисленных в If-None-Match
+    (сравнение слабое, как требует RFC 9110 для этого заголовка)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _conditional(request: Request, response: Response, *version) -> str:
+    """ETag по версии данных и запросу: 304, если он уже есть у клиента.
+    В ключ входит дата - серии в ответах считаются от сегодняшнего дня
+    """
+    key = (request.url.path, request.url.query, datetime.date.today().isoformat(), *version)
+    etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return etag
+
+async def data_etag(request: Request, response: Response,
+                    db: AsyncDatabase = Depends(get_db)) -> str:
+    """Условный GET для ответов, зависящих от всех привычек.
+    Версия берется из памяти (HabitCache), поэтому 304 отдается
+    до загрузки данных обработчиком
+    """
+    return _conditional(request, response, await db.run(cache.data_version))
+
+async def habit_etag(habit_id: int, request: Request, response: Response,
+                     db: AsyncDatabase = Depends(get_db)) -> Optional[str]:
+    """Условный GET для ответов об одной привычке - по ее revision.
+    Несуществующую привычку пропускает: 404 отдает обработчик
+    """
+    revision = await db.run(cache.habit_revision, habit_id)
+    if revision is None:
+        return None
+    return _conditional(request, response, "habit", habit_id, revision)
@@ -0,0 +1,132 @@
+"""
+Рассылка изменений данных открытым страницам (Server-Sent Events).
+
+EventBroker подписан на Database.subscribe_events. События записи
+дополняются сводкой затронутых привычек и общей статистикой один раз
+и раздаются очередям всех подключенных клиентов. Пока клиентов нет,
+подписка ничего не читает из БД.
+"""
+import asyncio
+import threading
+import weakref
+from typing import Dict, List, Tuple
+
+from core.database import (COMPLETION_ADDED, COMPLETION_REMOVED, DATA_RELOADED,
+                           HABIT_CREATED, HABIT_DELETED, HABIT_UPDATED, Database)
+from core.logger import logger
+
+STATS_CHANGED = "stats_changed"
+
+# Если одна запись затронула больше привычек, клиентам уходит DATA_RELOADED
+MAX_EVENT_HABITS = 200
+# Событий в очереди медленного клиента; при переполнении - DATA_RELOADED
+MAX_PENDING_EVENTS = 1000
+
+Event = Tuple[str, dict]
+
+class EventBroker:
+    def __init__(self, db: Database):
+        # Слабая ссылка: брокер хранится в _brokers, пока жива сама БД
+        self._db = weakref.ref(db)
+        self._lock = threading.Lock()
+        self._queues: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self.published = 0
+        self.dropped = 0
+        db.subscribe_events(self.publish)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Очередь событий (тип, данные) для текущего цикла событий"""
+        queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        with self._lock:
+            self._queues[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._queues.pop(queue, None)
+
+    @property
+    def clients(self) -> int:
+        with self._lock:
+            return len(self._queues)
+
+    def publish(self, events: List[dict]):
+        """Подписчик Database: вызывается в потоке, сделавшем запись"""
+        with self._lock:
+            targets = list(self._queues.items())
+        if not targets:
+            return
+        try:
+            messages = self._expand(events)
+        except Exception as e:
+            # Запись уже сохранена - ошибка рассылки не должна ее провалить
+            logger.error(f"Ошибка при подготовке событий: {e}")
+            messages = [(DATA_RELOADED, {})]
+        with self._lock:
+            self.published += len(messages)
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, messages)
+            except RuntimeError:
+                # Цикл клиента уже закрыт
+                self.unsubscribe(queue)
+
+    def _deliver(self, queue: asyncio.Queue, messages: List[Event]):
+        """Вызывается в цикле событий клиента"""
+        if queue.qsize() + len(messages) > queue.maxsize:
+            # Клиент не успевает: вместо пропущенных событий - перезагрузка
+            with self._lock:
+                self.dropped += queue.qsize() + len(messages)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait((DATA_RELOADED, {}))
+            return
+        for message in messages:
+            queue.put_nowait(message)
+
+    def _expand(self, events: List[dict]) -> List[Event]:
+        """События записи -> сообщения клиентам со сводками привычек"""
+        db = self._db()
+        ids = {event["habit_id"] for event in events if "habit_id" in event}
+        if any(event["type"] == DATA_RELOADED for event in events) or len(ids) > MAX_EVENT_HABITS:
+            return [(DATA_RELOADED, {})]
+
+        summaries = db.get_habit_summaries(
+            event["habit_id"] for event in events if event["type"] != HABIT_DELETED
+        )
+        messages = []
+        for event in events:
+            event_type, habit_id = event["type"], event["habit_id"]
+            if event_type == HABIT_DELETED:
+                messages.append((event_type, {"habit_id": habit_id}))
+                continue
+            summary = summaries.get(habit_id)
+            if summary is None:
+                # Привычку уже удалили - об этом придет свое событие
+                continue
+            if event_type in (HABIT_CREATED, HABIT_UPDATED):
+                messages.append((event_type, {"habit": summary}))
+            elif event_type in (COMPLETION_ADDED, COMPLETION_REMOVED):
+                messages.append((event_type, {"habit_id": habit_id, "dates": event["dates"],
+                                              "habit": summary}))
+        messages.append((STATS_CHANGED, {"stats": db.cache.summary_stats()}))
+        return messages
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": len(self._queues),
+                "published": self.published,
+                "dropped": self.dropped
+            }
+
+_brokers: "weakref.WeakKeyDictionary[Database, EventBroker]" = weakref.WeakKeyDictionary()
+_brokers_lock = threading.Lock()
+
+def get_broker(db: Database) -> EventBroker:
+    """Общий EventBroker этой БД; создается при первом обращении"""
+    with _brokers_lock:
+        broker = _brokers.get(db)
+        if broker is None:
+            broker = _brokers[db] = EventBroker(db)
+        return broker
@@ -1,22 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import datetime
+from core import cache, read_model
+from core.async_database import AsyncDatabase
 from core.database import Database
 from core.models import Habit
 from core.logger import logger
+from web.compression import CompressionMiddleware
+from web.pagination import MAX_PAGE_SIZE, load_page, parse_fields, stream_page
+from web.serialization import DEFAULT_RESPONSE_CLASS, trusted_response
+from core.charts import shutdown_render_pool
+from web.dependencies import data_etag, get_db, habit_etag
+from web.events import get_broker
+from web.routers import include_v2_routers
 
 app = FastAPI(
     title="Habit Tracker API",
     description="Веб-версия трекера привычек",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DEFAULT_RESPONSE_CLASS
 )
+app.add_middleware(CompressionMiddleware)
 
 # Инициализация БД
 db = Database()
 app.state.db = db
 
+include_v2_routers(app)
+app.add_event_handler("shutdown", shutdown_render_pool)
+
 # Pydantic модели
 class HabitCreate(BaseModel):
     name: str
@@ -34,9 +48,17 @@ class HabitResponse(BaseModel):
     completion_rate: float
     streak: int
 
-# Зависимость для получения БД
-def get_db():
-    return app.state.db
+# Элемент списка: при fields= возвращаются только запрошенные поля
+class HabitListItem(BaseModel):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    target_days: Optional[int] = None
+    creation_date: Optional[str] = None
+    status: Optional[str] = None
+    completions: Optional[List[str]] = None
+    completion_rate: Optional[float] = None
+    streak: Optional[int] = None
 
 # Основные endpoints
 @app.get("/")
@@ -48,16 +70,36 @@ async def root():
         "web_interface": "/web"
     }
 
-@app.get("/api/habits", response_model=List[HabitResponse])
-async def get_habits(db: Database = Depends(get_db)):
-    """Получить все привычки"""
-    habits = db.load_habits()
-    return [habit.to_dict() for habit in habits]
+@app.get("/api/habits", response_model=List[HabitListItem], response_model_exclude_unset=True,
+         dependencies=[Depends(data_etag)])
+async def get_habits(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    after: Optional[int] = Query(None, description="Курсор: id последней привычки предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Поля через запятую, например id,name,streak"),
+    completions_since: Optional[datetime.date] = Query(
+        None, description="Вернуть выполнения начиная с даты (процент и серия - по всей истории)"
+    ),
+    stream: Optional[str] = Query(
+        None, pattern="^(ndjson|json)$",
+        description="Отдавать потоком: ndjson - объект на строку, json - массив"
+    ),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Получить привычки. Курсор следующей страницы - в заголовке X-Next-Cursor.
+    С stream= список отдается потоком без проверки моделью ответа.
+    """
+    if stream is not None:
+        streaming = stream_page(db, stream, parse_fields(fields), limit, after, completions_since)
+        streaming.headers.update(response.headers)
+        return streaming
+    page = await load_page(db, response, parse_fields(fields), limit, after, completions_since)
+    return trusted_response(page, response)
 
 @app.post("/api/habits", response_model=HabitResponse)
 async def create_habit(
     habit_data: HabitCreate, 
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Создать новую привычку"""
     habit = Habit(
@@ -67,7 +109,7 @@ async def create_habit(
     )
     
     try:
-        habit_id = db.save_habit(habit)
+        habit_id = await db.run(cache.save_habit, habit)
         habit.id = habit_id
         logger.info(f"Создана привычка через API: {habit.name}")
         return habit.to_dict()
@@ -75,27 +117,26 @@ async def create_habit(
         logger.error(f"Ошибка при создании привычки: {e}")
         raise HTTPException(status_code=500, detail="Не удалось создать привычку")
 
-@app.get("/api/habits/{habit_id}", response_model=HabitResponse)
+@app.get("/api/habits/{habit_id}", response_model=HabitResponse, dependencies=[Depends(habit_etag)])
 async def get_habit(
     habit_id: int, 
-    db: Database = Depends(get_db)
+    response: Response,
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Получить конкретную привычку"""
-    habits = db.load_habits()
-    for habit in habits:
-        if habit.id == habit_id:
-            return habit.to_dict()
-    
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
+    return trusted_response(habit.to_dict(), response)
 
 @app.delete("/api/habits/{habit_id}")
 async def delete_habit(
     habit_id: int, 
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Удалить привычку"""
     try:
-        db.delete_habit(habit_id)
+        await db.run(cache.delete_habit, habit_id)
         logger.info(f"Удалена привычка через API: ID {habit_id}")
         return {"message": "Привычка удалена"}
     except Exception as e:
@@ -105,52 +146,42 @@ async def delete_habit(
 @app.post("/api/habits/{habit_id}/complete")
 async def complete_habit(
     habit_id: int, 
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Отметить выполнение привычки"""
-    habits = db.load_habits()
-    for habit in habits:
-        if habit.id == habit_id:
-            if habit.mark_completed():
-                db.save_habit(habit)
-                logger.info(f"Привычка выполнена через API: {habit.name}")
-                return {
-                    "message": "Привычка отмечена как выполненная",
-                    "date": datetime.date.today().isoformat()
-                }
-            else:
-                return {
-                    "message": "Привычка уже была выполнена сегодня",
-                    "date": datetime.date.today().isoformat()
-                }
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
     
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
+    if habit.mark_completed():
+        await db.run(cache.save_habit, habit)
+        logger.info(f"Привычка выполнена через API: {habit.name}")
+        return {
+            "message": "Привычка отмечена как выполненная",
+            "date": datetime.date.today().isoformat()
+        }
+    else:
+        return {
+            "message": "Привычка уже была выполнена сегодня",
+            "date": datetime.date.today().isoformat()
+        }
 
-@app.get("/api/stats")
-async def get_stats(db: Database = Depends(get_db)):
+@app.get("/api/stats", dependencies=[Depends(data_etag)])
+async def get_stats(response: Response, db: AsyncDatabase = Depends(get_db)):
     """Получить общую статистику"""
-    habits = db.load_habits()
-    
-    total_habits = len(habits)
-    active_habits = len([h for h in habits if h.status.value == "active"])
-    total_completions = sum(len(h.completions) for h in habits)
-    
-    avg_completion_rate = 0
-    if habits:
-        avg_completion_rate = sum(h.get_completion_rate() for h in habits) / len(habits)
-    
-    return {
-        "total_habits": total_habits,
-        "active_habits": active_habits,
-        "total_completions": total_completions,
-        "average_completion_rate": round(avg_completion_rate, 2),
-        "most_completed_habit": max(habits, key=lambda h: len(h.completions)).name if habits else None
-    }
+    return trusted_response(await db.run(cache.summary_stats), response)
 
 @app.get("/health")
-async def health_check():
+async def health_check(db: AsyncDatabase = Depends(get_db)):
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.datetime.now().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "db_pool": await db.pool_stats(),
+        "read_model": await db.run(read_model.stats),
+        "cache": await db.run(cache.stats),
+        "events": get_broker(db.db).stats()
+    }
 
 @app.get("/web", response_class=HTMLResponse)
 async def web_interface():
@@ -239,49 +270,141 @@ async def web_interface():
             <div id="habits-list">
                 <!-- Список привычек будет здесь -->
             </div>
+            
+            <h3>Сравнение привычек</h3>
+            <img id="overview-chart" alt="Сравнение привычек" style="max-width: 100%">
+            
+            <h3>Календарь выполнений за год</h3>
+            <canvas id="heatmap" width="730" height="0"></canvas>
         </div>
         
         <script>
+            // Сводки привычек по id; карточки обновляются по событиям /api/v2/events
+            const habits = new Map();
+            const live = !!window.EventSource;
+            
+            function escapeHtml(text) {
+                const element = document.createElement('span');
+                element.textContent = text;
+                return element.innerHTML;
+            }
+            
+            function renderHabit(habit) {
+                habits.set(habit.id, habit);
+                let habitElement = document.getElementById(`habit-${habit.id}`);
+                if (!habitElement) {
+                    habitElement = document.createElement('div');
+                    habitElement.className = 'habit-item';
+                    habitElement.id = `habit-${habit.id}`;
+                    // Карточки идут в порядке id
+                    const next = [...document.getElementById('habits-list').children]
+                        .find(element => parseInt(element.id.slice(6)) > habit.id);
+                    document.getElementById('habits-list').insertBefore(habitElement, next || null);
+                }
+                
+                const progress = Math.min(habit.completion_rate * 100, 100);
+                const progressBar = `
+                    <div style="width: 100%; background: #ddd; border-radius: 3px; margin: 5px 0;">
+                        <div style="width: ${progress}%; background: #2ecc71; height: 20px; border-radius: 3px;"></div>
+                    </div>
+                `;
+                
+                habitElement.innerHTML = `
+                    <div>
+                        <strong>${escapeHtml(habit.name)}</strong><br>
+                        <small>${escapeHtml(habit.description || 'Нет описания')}</small><br>
+                        ${progressBar}
+                        <small>${habit.completions_count}/${habit.target_days} дней (${progress.toFixed(1)}%) | Серия: ${habit.streak}</small>
+                    </div>
+                    <div>
+                        <button onclick="completeHabit(${habit.id})">✅ Выполнено</button>
+                        <button onclick="deleteHabit(${habit.id})" style="background: #e74c3c">🗑️ Удалить</button>
+                    </div>
+                `;
+            }
+            
+            function removeHabit(habitId) {
+                habits.delete(habitId);
+                const habitElement = document.getElementById(`habit-${habitId}`);
+                if (habitElement) {
+                    habitElement.remove();
+                }
+            }
+            
+            function renderStats(stats) {
+                document.getElementById('total-habits').textContent = stats.total_habits;
+                document.getElementById('total-completions').textContent = stats.total_completions;
+                // Параметр v меняется вместе с данными, иначе браузер покажет старую картинку
+                document.getElementById('overview-chart').src =
+                    `/api/v2/charts/overview.png?v=${stats.total_habits}-${stats.total_completions}`;
+            }
+            
+            // Полная загрузка: при открытии, переподключении и событии reload
             async function loadHabits() {
                 const response = await fetch('/api/habits');
-                const habits = await response.json();
+                const loaded = await response.json();
                 
-                // Обновляем статистику
                 const statsResponse = await fetch('/api/stats');
-                const stats = await statsResponse.json();
-                document.getElementById('total-habits').textContent = stats.total_habits;
-                document.getElementById('total-completions').textContent = stats.total_completions;
+                renderStats(await statsResponse.json());
                 
-                // Отображаем привычки
-                const habitsList = document.getElementById('habits-list');
-                habitsList.innerHTML = '';
+                document.getElementById('habits-list').innerHTML = '';
+                habits.clear();
+                loaded.forEach(habit => renderHabit({...habit, completions_count: habit.completions.length}));
                 
-                habits.forEach(habit => {
-                    const habitElement = document.createElement('div');
-                    habitElement.className = 'habit-item';
-                    
-                    const progress = Math.min(habit.completion_rate * 100, 100);
-                    const progressBar = `
-                        <div style="width: 100%; background: #ddd; border-radius: 3px; margin: 5px 0;">
-                            <div style="width: ${progress}%; background: #2ecc71; height: 20px; border-radius: 3px;"></div>
-                        </div>
-                    `;
-                    
-                    habitElement.innerHTML = `
-                        <div>
-                            <strong>${habit.name}</strong><br>
-                            <small>${habit.description || 'Нет описания'}</small><br>
-                            ${progressBar}
-                            <small>${habit.completions.length}/${habit.target_days} дней (${progress.toFixed(1)}%) | Серия: ${habit.streak}</small>
-                        </div>
-                        <div>
-                            <button onclick="completeHabit(${habit.id})">✅ Выполнено</button>
-                            <button onclick="deleteHabit(${habit.id})" style="background: #e74c3c">🗑️ Удалить</button>
-                        </div>
-                    `;
-                    
-                    habitsList.appendChild(habitElement);
+                loadHeatmap();
+            }
+            
+            // Календарь перерисовывается не чаще раза в секунду
+            let heatmapTimer = null;
+            function scheduleHeatmap() {
+                clearTimeout(heatmapTimer);
+                heatmapTimer = setTimeout(loadHeatmap, 1000);
+            }
+            
+            // Матрица привычки x дни: одна битовая строка на всех
+            async function loadHeatmap() {
+                const response = await fetch('/api/v2/analytics/heatmap');
+                const heatmap = await response.json();
+                const bits = Uint8Array.from(atob(heatmap.data), c => c.charCodeAt(0));
+                
+                const canvas = document.getElementById('heatmap');
+                const cell = Math.max(1, Math.floor(canvas.width / heatmap.days));
+                const rowHeight = 6;
+                canvas.height = heatmap.habit_ids.length * rowHeight;
+                const ctx = canvas.getContext('2d');
+                ctx.fillStyle = '#ebedf0';
+                ctx.fillRect(0, 0, canvas.width, canvas.height);
+                ctx.fillStyle = '#2e7d32';
+                
+                for (let i = 0; i < heatmap.habit_ids.length * heatmap.days; i++) {
+                    if (bits[i >> 3] & (1 << (i & 7))) {
+                        const row = Math.floor(i / heatmap.days);
+                        ctx.fillRect((i % heatmap.days) * cell, row * rowHeight, cell, rowHeight - 1);
+                    }
+                }
+            }
+            
+            function listen() {
+                const events = new EventSource('/api/v2/events');
+                // После обрыва события могли потеряться - перечитываем все
+                events.onopen = loadHabits;
+                
+                const onHabit = message => {
+                    renderHabit(JSON.parse(message.data).habit);
+                    scheduleHeatmap();
+                };
+                events.addEventListener('habit_created', onHabit);
+                events.addEventListener('habit_updated', onHabit);
+                events.addEventListener('completion_added', onHabit);
+                events.addEventListener('completion_removed', onHabit);
+                events.addEventListener('habit_deleted', message => {
+                    removeHabit(JSON.parse(message.data).habit_id);
+                    scheduleHeatmap();
+                });
+                events.addEventListener('stats_changed', message => {
+                    renderStats(JSON.parse(message.data).stats);
                 });
+                events.addEventListener('reload', loadHabits);
             }
             
             async function addHabit() {
@@ -303,14 +426,15 @@ async def web_interface():
                 });
                 
                 document.getElementById('habit-name').value = '';
-                loadHabits();
+                // С событиями страницу обновит habit_created
+                if (!live) loadHabits();
             }
             
             async function completeHabit(habitId) {
                 await fetch(`/api/habits/${habitId}/complete`, {
                     method: 'POST'
                 });
-                loadHabits();
+                if (!live) loadHabits();
             }
             
             async function deleteHabit(habitId) {
@@ -318,12 +442,16 @@ async def web_interface():
                     await fetch(`/api/habits/${habitId}`, {
                         method: 'DELETE'
                     });
-                    loadHabits();
+                    if (!live) loadHabits();
                 }
             }
             
-            // Загружаем привычки при загрузке страницы
-            loadHabits();
+            // Без EventSource - загрузка один раз и после каждого действия
+            if (live) {
+                listen();
+            } else {
+                loadHabits();
+            }
         </script>
     </body>
     </html>
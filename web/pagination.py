@@ -0,0 +1,122 @@
+"""
+Общие параметры списков привычек: keyset-пагинация и выбор полей
+"""
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from itertools import islice
+from typing import AsyncIterator, List, Optional
+import datetime
+from core.async_database import AsyncDatabase
+from web.serialization import dumps
+
+# Поля Habit.to_dict(), которые можно запросить через fields=
+HABIT_FIELDS = (
+    "id", "name", "description", "target_days", "creation_date",
+    "status", "completions", "completion_rate", "streak"
+)
+
+MAX_PAGE_SIZE = 1000
+
+# Потоковая выдача: привычек на одно обращение к курсору и форматы
+STREAM_BATCH = 200
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Разобрать fields=id,name,... Возвращает None, если нужны все поля"""
+    if not fields:
+        return None
+
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in HABIT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(HABIT_FIELDS)}"
+        )
+    return selected
+
+def parse_ids(ids: str) -> List[int]:
+    """Разобрать список id через запятую (ids=1,2,3)"""
+    try:
+        return [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids должен быть списком чисел через запятую")
+
+def needs_completions(fields: Optional[List[str]]) -> bool:
+    # Процент и серия хранятся в строке привычки, выполнения нужны только для списка дат
+    return fields is None or "completions" in fields
+
+def project(data: dict, fields: Optional[List[str]]) -> dict:
+    if fields is None:
+        return data
+    return {name: data[name] for name in fields}
+
+async def load_page(db: AsyncDatabase, response: Response, fields: Optional[List[str]],
+                    limit: Optional[int], after: Optional[int],
+                    completions_since: Optional[datetime.date]) -> List[dict]:
+    """Страница привычек с выбранными полями. Без поля completions
+    таблица выполнений не читается. Если страница заполнена целиком,
+    курсор следующей передается в X-Next-Cursor.
+    """
+    if not needs_completions(fields):
+        rows = await db.load_habit_summaries(after=after, limit=limit)
+    else:
+        habits = await db.load_habits(after=after, limit=limit, completions_since=completions_since)
+        rows = [habit.to_dict() for habit in habits]
+        if completions_since is not None:
+            # Процент и серия - по всей истории, а не по обрезанным выполнениям
+            cached = {row["id"]: row for row in await db.load_habit_summaries(after=after, limit=limit)}
+            for row in rows:
+                if row["id"] in cached:
+                    row["completion_rate"] = cached[row["id"]]["completion_rate"]
+                    row["streak"] = cached[row["id"]]["streak"]
+
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return [project(row, fields) for row in rows]
+
+
+def _next_rows(db, rows, size: int) -> List[dict]:
+    return list(islice(rows, size))
+
+async def _stream_chunks(db: AsyncDatabase, rows, fields: Optional[List[str]],
+                         fmt: str) -> AsyncIterator[bytes]:
+    first = True
+    try:
+        if fmt == "json":
+            yield b"["
+        while True:
+            # Страница в STREAM_BATCH привычек читается в пуле потоков БД
+            batch = await db.run(_next_rows, rows, STREAM_BATCH)
+            if not batch:
+                break
+            if fmt == "ndjson":
+                yield b"".join(dumps(project(row, fields)) + b"\n" for row in batch)
+            else:
+                chunk = b",".join(dumps(project(row, fields)) for row in batch)
+                yield chunk if first else b"," + chunk
+            first = False
+        if fmt == "json":
+            yield b"]"
+    finally:
+        # Если генератор еще читает страницу в потоке БД, он закроется
+        # при сборке мусора; соединение между страницами не занято
+        try:
+            rows.close()
+        except ValueError:
+            pass
+
+def stream_page(db: AsyncDatabase, fmt: str, fields: Optional[List[str]],
+                limit: Optional[int], after: Optional[int],
+                completions_since: Optional[datetime.date]) -> StreamingResponse:
+    """Привычки потоком NDJSON или JSON-массива: страницы читаются из БД
+    и сериализуются по мере отправки, без списка всех привычек в памяти
+    """
+    rows = db.db.iter_habits(after=after, limit=limit,
+                             with_completions=needs_completions(fields),
+                             completions_since=completions_since,
+                             batch_size=STREAM_BATCH)
+    return StreamingResponse(_stream_chunks(db, rows, fields, fmt), media_type=STREAM_FORMATS[fmt])
@@ -0,0 +1,13 @@
+"""
+Роутеры API v2. БД берут из app.state.db через web.dependencies.get_db,
+поэтому подключаются к любому приложению FastAPI
+"""
+from fastapi import FastAPI
+from web.routers import analytics, charts, completions, events, habits, transfer
+
+ROUTERS = (habits.router, completions.router, analytics.router, charts.router, transfer.router,
+           events.router)
+
+def include_v2_routers(app: FastAPI):
+    for router in ROUTERS:
+        app.include_router(router)
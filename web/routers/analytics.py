@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import Optional
+import base64
+import datetime
+import numpy as np
+from core import analytics
+from core.async_database import AsyncDatabase
+from web.dependencies import data_etag, get_db
+from web.pagination import parse_ids
+
+router = APIRouter(prefix="/api/v2/analytics", tags=["analytics v2"])
+
+# Ряд строится по дням периода: не больше стольких дней за запрос
+MAX_TIMESERIES_DAYS = 366 * 20
+# Матрица тепловой карты строится в памяти: не больше стольких дней
+# и привычек за запрос (следующие привычки - по курсору X-Next-Cursor)
+MAX_HEATMAP_DAYS = 366 * 5
+MAX_HEATMAP_HABITS = 500
+
+def _period(start: Optional[datetime.date], end: Optional[datetime.date], max_days: int):
+    end = end or datetime.date.today()
+    start = start or end - datetime.timedelta(days=364)
+    if end < start:
+        raise HTTPException(status_code=400, detail="Конец периода раньше начала")
+    if end.toordinal() - start.toordinal() + 1 > max_days:
+        raise HTTPException(status_code=422, detail=f"Период длиннее {max_days} дней")
+    return start, end
+
+@router.get("/timeseries", dependencies=[Depends(data_etag)])
+async def get_timeseries(
+    start: Optional[datetime.date] = Query(None, description="Начало периода (по умолчанию - год назад)"),
+    end: Optional[datetime.date] = Query(None, description="Конец периода (по умолчанию - сегодня)"),
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    habit_ids: Optional[str] = Query(None, description="id привычек через запятую (по умолчанию - все)"),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Число выполнений по дням, неделям или месяцам за период"""
+    start, end = _period(start, end, MAX_TIMESERIES_DAYS)
+    ids = parse_ids(habit_ids) if habit_ids is not None else None
+    return await db.run(analytics.timeseries, start, end, bucket, ids)
+
+@router.get("/heatmap", dependencies=[Depends(data_etag)])
+async def get_heatmap(
+    response: Response,
+    start: Optional[datetime.date] = Query(None, description="Начало периода (по умолчанию - год назад)"),
+    end: Optional[datetime.date] = Query(None, description="Конец периода (по умолчанию - сегодня)"),
+    habit_ids: Optional[str] = Query(None, description="id привычек через запятую (по умолчанию - все)"),
+    limit: int = Query(MAX_HEATMAP_HABITS, ge=1, le=MAX_HEATMAP_HABITS),
+    after: Optional[int] = None,
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Матрица выполнений привычки x дни одной битовой строкой.
+    
+    data - base64 от упакованных бит матрицы по строкам, младший бит
+    первым: день d привычки habit_ids[i] - бит i * days + d.
+    Без habit_ids привычки идут страницами по limit.
+    """
+    start, end = _period(start, end, MAX_HEATMAP_DAYS)
+    if habit_ids is not None:
+        ids = parse_ids(habit_ids)
+        if len(ids) > MAX_HEATMAP_HABITS:
+            raise HTTPException(status_code=422, detail=f"Больше {MAX_HEATMAP_HABITS} привычек")
+        found, matrix = await db.run(analytics.completion_matrix, start, end, ids)
+    else:
+        found, matrix = await db.run(analytics.completion_matrix, start, end, None, after, limit)
+        if len(found) == limit:
+            response.headers["X-Next-Cursor"] = str(found[-1])
+    bits = np.packbits(matrix, axis=None, bitorder="little")
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": matrix.shape[1],
+        "habit_ids": found,
+        "encoding": "base64",
+        "bitorder": "little",
+        "data": base64.b64encode(bits.tobytes()).decode("ascii")
+    }
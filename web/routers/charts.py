@@ -0,0 +1,81 @@
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Request, Response
+from array import array
+import asyncio
+import functools
+from core import cache as habit_cache
+from core.async_database import AsyncDatabase
+from core.charts import FORMATS, ChartCache, chart_etag, get_render_pool, render_habit, render_overview
+from web.dependencies import CACHE_CONTROL, etag_matches, get_db
+
+router = APIRouter(prefix="/api/v2/charts", tags=["charts v2"])
+
+# Готовые картинки по ключу (что, версия данных, формат, размер, dpi)
+cache = ChartCache()
+
+async def _chart_response(request: Request, key: tuple, fmt: str, render) -> Response:
+    """304 по If-None-Match, иначе картинка из кеша или из пула рендеринга"""
+    etag = chart_etag(key)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    content = cache.get(key)
+    if content is None:
+        job = await render()
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(get_render_pool(), job)
+        cache.put(key, content)
+    return Response(content=content, media_type=FORMATS[fmt], headers=headers)
+
+@router.get("/habit/{habit_id}.{fmt}")
+async def get_habit_chart(
+    request: Request,
+    habit_id: int,
+    fmt: str = Path(..., pattern="^(png|svg)$"),
+    width: int = Query(1000, ge=200, le=4000, description="Ширина в пикселях"),
+    height: int = Query(400, ge=100, le=4000, description="Высота в пикселях"),
+    dpi: int = Query(100, ge=50, le=300),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """График прогресса привычки в PNG или SVG"""
+    revision = await db.run(habit_cache.habit_revision, habit_id)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
+    
+    async def render():
+        habit = await db.run(habit_cache.get_habit, habit_id)
+        if habit is None:
+            raise HTTPException(status_code=404, detail="Привычка не найдена")
+        # В процесс рендеринга уходят только название, цель и номера дней
+        return functools.partial(render_habit, habit.name, habit.target_days,
+                                 array("i", habit.completions.ordinals), fmt, width, height, dpi)
+    
+    key = ("habit", habit_id, revision, fmt, width, height, dpi)
+    return await _chart_response(request, key, fmt, render)
+
+@router.get("/overview.png")
+async def get_overview_chart(
+    request: Request,
+    width: int = Query(1000, ge=200, le=4000, description="Ширина в пикселях"),
+    height: int = Query(600, ge=100, le=4000, description="Высота в пикселях"),
+    dpi: int = Query(100, ge=50, le=300),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Сравнение выполнения всех привычек"""
+    version = await db.run(habit_cache.data_version)
+    
+    async def render():
+        habits = await db.run(habit_cache.habit_summaries)
+        return functools.partial(render_overview,
+                                 [h["name"] for h in habits],
+                                 [h["completions_count"] for h in habits],
+                                 [h["target_days"] for h in habits],
+                                 "png", width, height, dpi)
+    
+    key = ("overview", version, "png", width, height, dpi)
+    return await _chart_response(request, key, "png", render)
+
+@router.get("/cache")
+async def get_chart_cache_stats():
+    """Заполнение кеша картинок и число попаданий"""
+    return cache.stats()
@@ -1,38 +1,51 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import datetime
-from core.database import Database
+from core import cache, read_model
+from core.async_database import AsyncDatabase
+from core.database import COMPLETION_DUPLICATE, COMPLETION_INSERTED, COMPLETION_NOT_FOUND
+from core.logger import logger
 from core.models import Habit
-from web.main import get_db
+from web.dependencies import data_etag, get_db, habit_etag
 
 router = APIRouter(prefix="/api/v2/completions", tags=["completions v2"])
 
 class CompletionCreate(BaseModel):
     date: Optional[str] = None  # Дата в формате YYYY-MM-DD
 
-@router.get("/habit/{habit_id}")
+# Пар (привычка, дата) в одном запросе /bulk
+MAX_BULK_ITEMS = 10000
+
+class BulkCompletionItem(BaseModel):
+    habit_id: int
+    date: datetime.date
+
+class BulkCompletionRequest(BaseModel):
+    items: List[BulkCompletionItem] = Field(..., max_length=MAX_BULK_ITEMS)
+
+@router.get("/habit/{habit_id}", dependencies=[Depends(habit_etag)])
 async def get_habit_completions(
     habit_id: int, 
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Получить все выполнения конкретной привычки"""
-    habits = db.load_habits()
-    for habit in habits:
-        if habit.id == habit_id:
-            return {
-                "habit_id": habit_id,
-                "habit_name": habit.name,
-                "completions": [d.isoformat() for d in habit.completions],
-                "total": len(habit.completions)
-            }
+    # Одна привычка - из кеша: модели чтения понадобилась бы загрузка всех
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
     
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
+    return {
+        "habit_id": habit_id,
+        "habit_name": habit.name,
+        "completions": [d.isoformat() for d in habit.completions],
+        "total": len(habit.completions)
+    }
 
-@router.get("/date/{date}")
+@router.get("/date/{date}", dependencies=[Depends(data_etag)])
 async def get_completions_by_date(
     date: str,
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Получить все выполнения за определенную дату"""
     try:
@@ -40,16 +53,12 @@ async def get_completions_by_date(
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте YYYY-MM-DD")
     
-    habits = db.load_habits()
-    completions = []
-    
-    for habit in habits:
-        if target_date in habit.completions:
-            completions.append({
-                "habit_id": habit.id,
-                "habit_name": habit.name,
-                "date": date
-            })
+    # Обратный индекс дата -> привычки: без загрузки всех привычек
+    habits = await db.run(read_model.completed_on, target_date)
+    completions = [
+        {"habit_id": habit.id, "habit_name": habit.name, "date": date}
+        for habit in habits
+    ]
     
     return {
         "date": date,
@@ -57,46 +66,60 @@ async def get_completions_by_date(
         "completions": completions
     }
 
+@router.post("/bulk")
+async def create_completions_bulk(
+    request: BulkCompletionRequest,
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Отметить много выполнений одной транзакцией (синхронизация с устройств).
+    statuses - статус каждой пары в порядке items: inserted, duplicate, not_found
+    """
+    statuses = await db.add_completions((item.habit_id, item.date) for item in request.items)
+    counts = {
+        status: statuses.count(status)
+        for status in (COMPLETION_INSERTED, COMPLETION_DUPLICATE, COMPLETION_NOT_FOUND)
+    }
+    logger.info(f"Пакетная отметка выполнений: {counts}")
+    return {**counts, "statuses": statuses}
+
 @router.post("/habit/{habit_id}")
 async def create_completion(
     habit_id: int,
     completion_data: Optional[CompletionCreate] = None,
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Создать отметку о выполнении с возможностью указать дату"""
-    habits = db.load_habits()
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
     
-    for habit in habits:
-        if habit.id == habit_id:
-            date = None
-            if completion_data and completion_data.date:
-                try:
-                    date = datetime.date.fromisoformat(completion_data.date)
-                except ValueError:
-                    raise HTTPException(status_code=400, detail="Неверный формат даты")
-            
-            if habit.mark_completed(date):
-                db.save_habit(habit)
-                return {
-                    "message": "Выполнение добавлено",
-                    "habit_id": habit_id,
-                    "habit_name": habit.name,
-                    "date": date.isoformat() if date else datetime.date.today().isoformat()
-                }
-            else:
-                return {
-                    "message": "Привычка уже была выполнена в эту дату",
-                    "habit_id": habit_id,
-                    "date": date.isoformat() if date else datetime.date.today().isoformat()
-                }
+    date = None
+    if completion_data and completion_data.date:
+        try:
+            date = datetime.date.fromisoformat(completion_data.date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный формат даты")
     
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
+    if habit.mark_completed(date):
+        await db.run(cache.save_habit, habit)
+        return {
+            "message": "Выполнение добавлено",
+            "habit_id": habit_id,
+            "habit_name": habit.name,
+            "date": date.isoformat() if date else datetime.date.today().isoformat()
+        }
+    else:
+        return {
+            "message": "Привычка уже была выполнена в эту дату",
+            "habit_id": habit_id,
+            "date": date.isoformat() if date else datetime.date.today().isoformat()
+        }
 
 @router.delete("/habit/{habit_id}/date/{date}")
 async def delete_completion(
     habit_id: int,
     date: str,
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Удалить отметку о выполнении за конкретную дату"""
     try:
@@ -104,19 +127,16 @@ async def delete_completion(
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат даты")
     
-    habits = db.load_habits()
-    
-    for habit in habits:
-        if habit.id == habit_id:
-            if target_date in habit.completions:
-                habit.completions.remove(target_date)
-                db.save_habit(habit)
-                return {
-                    "message": "Выполнение удалено",
-                    "habit_id": habit_id,
-                    "date": date
-                }
-            else:
-                raise HTTPException(status_code=404, detail="Выполнение не найдено")
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
     
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
\ No newline at end of file
+    if habit.unmark_completed(target_date):
+        await db.run(cache.save_habit, habit)
+        return {
+            "message": "Выполнение удалено",
+            "habit_id": habit_id,
+            "date": date
+        }
+    else:
+        raise HTTPException(status_code=404, detail="Выполнение не найдено")
\ No newline at end of file
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+import asyncio
+from core.async_database import AsyncDatabase
+from web.dependencies import get_db
+from web.events import get_broker
+from web.serialization import dumps
+
+router = APIRouter(prefix="/api/v2", tags=["events v2"])
+
+# Раз в столько секунд без событий клиенту уходит комментарий-пинг
+# (прокси не закрывают соединение) и проверяются записи других процессов
+HEARTBEAT_SECONDS = 15.0
+# Через сколько миллисекунд браузер переподключается после обрыва
+RETRY_MS = 3000
+
+def _check_external(db) -> bool:
+    return db.cache.check()
+
+def format_event(event_type: str, data: dict) -> bytes:
+    return b"event: " + event_type.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@router.get("/events")
+async def stream_events(db: AsyncDatabase = Depends(get_db)):
+    """Изменения данных потоком Server-Sent Events: habit_created,
+    habit_updated, habit_deleted, completion_added, completion_removed,
+    stats_changed; reload - изменилось слишком много, перечитайте список.
+    """
+    broker = get_broker(db.db)
+
+    async def events():
+        queue = broker.subscribe()
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            while True:
+                try:
+                    event_type, data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Запись другого процесса придет как reload
+                    await db.run(_check_external)
+                    yield b": ping\n\n"
+                    continue
+                yield format_event(event_type, data)
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # nginx не должен буферизовать поток
+        "X-Accel-Buffering": "no"
+    })
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from core.database import Database
-from core.models import Habit
-from web.main import get_db
+import datetime
+from core import cache, read_model
+from core.async_database import AsyncDatabase
+from core.models import Habit, HabitStatus
+from web.dependencies import data_etag, get_db, habit_etag
+from web.pagination import MAX_PAGE_SIZE, load_page, parse_fields, parse_ids, stream_page
+from web.serialization import trusted_response
 
 router = APIRouter(prefix="/api/v2/habits", tags=["habits v2"])
 
@@ -13,23 +17,43 @@ class HabitUpdate(BaseModel):
     description: Optional[str] = None
     target_days: Optional[int] = None
 
-@router.get("/", response_model=List[dict])
-async def get_all_habits(db: Database = Depends(get_db)):
-    """Получить все привычки (v2)"""
-    habits = db.load_habits()
-    return [habit.to_dict() for habit in habits]
+@router.get("/", response_model=List[dict], dependencies=[Depends(data_etag)])
+async def get_all_habits(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    fields: Optional[str] = None,
+    completions_since: Optional[datetime.date] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Получить привычки (v2) с пагинацией по id и выбором полей;
+    stream=ndjson|json - потоком
+    """
+    if stream is not None:
+        streaming = stream_page(db, stream, parse_fields(fields), limit, after, completions_since)
+        streaming.headers.update(response.headers)
+        return streaming
+    page = await load_page(db, response, parse_fields(fields), limit, after, completions_since)
+    return trusted_response(page, response)
+
+@router.get("/active", response_model=List[dict], dependencies=[Depends(data_etag)])
+async def get_active_habits(response: Response, db: AsyncDatabase = Depends(get_db)):
+    """Получить только активные привычки (из индекса по статусу)"""
+    habits = await db.run(read_model.habits_with_status, HabitStatus.ACTIVE.value)
+    return trusted_response([habit.to_dict() for habit in habits], response)
 
-@router.get("/active", response_model=List[dict])
-async def get_active_habits(db: Database = Depends(get_db)):
-    """Получить только активные привычки"""
-    habits = db.load_habits()
-    active_habits = [h for h in habits if h.status.value == "active"]
-    return [habit.to_dict() for habit in active_habits]
+@router.get("/stats", dependencies=[Depends(data_etag)])
+async def get_habits_statistics(ids: str, db: AsyncDatabase = Depends(get_db)):
+    """Статистика нескольких привычек за один запрос (ids=1,2,3)"""
+    habit_ids = parse_ids(ids)
+    stats = await db.get_stats_for(habit_ids)
+    return [stats[habit_id] for habit_id in dict.fromkeys(habit_ids) if habit_id in stats]
 
-@router.get("/{habit_id}/stats")
-async def get_habit_statistics(habit_id: int, db: Database = Depends(get_db)):
+@router.get("/{habit_id}/stats", dependencies=[Depends(habit_etag)])
+async def get_habit_statistics(habit_id: int, db: AsyncDatabase = Depends(get_db)):
     """Получить детальную статистику привычки"""
-    stats = db.get_habit_stats(habit_id)
+    stats = await db.run(cache.habit_stats, habit_id)
     if not stats:
         raise HTTPException(status_code=404, detail="Привычка не найдена")
     return stats
@@ -38,21 +62,20 @@ async def get_habit_statistics(habit_id: int, db: Database = Depends(get_db)):
 async def update_habit(
     habit_id: int, 
     habit_data: HabitUpdate,
-    db: Database = Depends(get_db)
+    db: AsyncDatabase = Depends(get_db)
 ):
     """Обновить информацию о привычке"""
-    habits = db.load_habits()
-    for habit in habits:
-        if habit.id == habit_id:
-            # Обновляем поля, если они предоставлены
-            if habit_data.name is not None:
-                habit.name = habit_data.name
-            if habit_data.description is not None:
-                habit.description = habit_data.description
-            if habit_data.target_days is not None:
-                habit.target_days = habit_data.target_days
-            
-            db.save_habit(habit)
-            return {"message": "Привычка обновлена", "habit": habit.to_dict()}
+    habit = await db.run(cache.get_habit, habit_id)
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Привычка не найдена")
+    
+    # Обновляем поля, если они предоставлены
+    if habit_data.name is not None:
+        habit.name = habit_data.name
+    if habit_data.description is not None:
+        habit.description = habit_data.description
+    if habit_data.target_days is not None:
+        habit.target_days = habit_data.target_days
     
-    raise HTTPException(status_code=404, detail="Привычка не найдена")
\ No newline at end of file
+    await db.run(cache.save_habit, habit)
+    return {"message": "Привычка обновлена", "habit": habit.to_dict()}
\ No newline at end of file
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+import datetime
+import tempfile
+from core import transfer
+from core.async_database import AsyncDatabase
+from core.logger import logger
+from web.dependencies import get_db
+
+router = APIRouter(prefix="/api/v2", tags=["import/export v2"])
+
+# Тело импорта до этого размера держится в памяти, дальше - во временном файле
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+# Тело импорта больше этого размера отклоняется с 413
+MAX_IMPORT_SIZE = 256 * 1024 * 1024
+
+FORMAT_PATTERN = "^(csv|jsonl|columnar)$"
+FILE_EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "columnar": "habits"}
+
+@router.get("/export")
+async def export_habits(
+    format: str = Query("jsonl", pattern=FORMAT_PATTERN),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Все привычки с выполнениями потоком: страницы читаются из БД
+    по мере отправки, ответ целиком в памяти не собирается
+    """
+    header, encode_page, footer = transfer.encoder(format)
+    
+    async def chunks():
+        if header:
+            yield header
+        after = None
+        while True:
+            habits = await db.load_habits(after=after, limit=transfer.EXPORT_BATCH)
+            if not habits:
+                break
+            yield encode_page(habits)
+            after = habits[-1].id
+        if footer:
+            yield footer
+    
+    filename = f"habits-{datetime.date.today().isoformat()}.{FILE_EXTENSIONS[format]}"
+    return StreamingResponse(
+        chunks(),
+        media_type=transfer.CONTENT_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import")
+async def import_habits(
+    request: Request,
+    format: str = Query("jsonl", pattern=FORMAT_PATTERN),
+    replace: bool = Query(False, description="Удалить все привычки и сохранить id из файла"),
+    db: AsyncDatabase = Depends(get_db)
+):
+    """Загрузить привычки из тела запроса одной транзакцией"""
+    too_large = HTTPException(status_code=413, detail=f"Тело импорта больше {MAX_IMPORT_SIZE} байт")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_IMPORT_SIZE:
+        raise too_large
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE) as body:
+        received = 0
+        async for chunk in request.stream():
+            # Content-Length может не быть (chunked) - считаем сами
+            received += len(chunk)
+            if received > MAX_IMPORT_SIZE:
+                raise too_large
+            body.write(chunk)
+        body.seek(0)
+        try:
+            report = await db.run(transfer.import_stream, body, format, replace)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Импортировано привычек: {report['habits']}, выполнений: {report['completions']}")
+    return report
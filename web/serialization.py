@@ -0,0 +1,38 @@
+"""
+Быстрая сериализация JSON: orjson, если установлен, иначе стандартный json
+"""
+import json
+import os
+from typing import Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Класс ответа по умолчанию для приложений FastAPI
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if orjson is not None else JSONResponse
+
+# VALIDATE_RESPONSES=1 возвращает проверку собственных ответов моделями
+# response_model (медленнее; для отладки)
+VALIDATE_RESPONSES = os.environ.get("VALIDATE_RESPONSES", "0") == "1"
+
+def dumps(data) -> bytes:
+    """Объект -> JSON в UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def trusted_response(data, response: Optional[Response] = None):
+    """Ответ из данных, собранных самим приложением (to_dict, сводки из БД):
+    сериализуется сразу, без проверки response_model и jsonable_encoder.
+    Заголовки, выставленные обработчиком и зависимостями в response, переносятся.
+    """
+    if VALIDATE_RESPONSES:
+        return data
+    result = DEFAULT_RESPONSE_CLASS(data)
+    if response is not None:
+        result.headers.update(response.headers)
+    return result